@@ -0,0 +1,195 @@
+import errno
+import os
+import shutil
+from manifest import hash_file
+from output import write_output
+
+CHUNK_SIZE = 1 << 20
+
+# errors that mean "this kernel/filesystem can't do that", as opposed to a
+# real I/O failure
+_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                errno.ENOTSUP, errno.EBADF, errno.ETXTBSY, errno.EPERM}
+
+def _copy_range(src_fd, dest_fd, size, copy):
+    # copy() is os.copy_file_range or os.sendfile; both take explicit offsets
+    # here, so a failure on the first call leaves both files untouched.
+    # Returns False unless all size bytes were copied: a short copy means the
+    # source changed under us, and the caller starts over with a plain copy.
+    offset = 0
+    while offset < size:
+        try:
+            sent = copy(src_fd, dest_fd, offset, size - offset)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED:
+                return False
+            raise
+        if sent == 0:
+            return False
+        offset += sent
+    return True
+
+def _copy_file_range(src_fd, dest_fd, offset, count):
+    return os.copy_file_range(src_fd, dest_fd, count, offset, offset)
+
+def _sendfile(src_fd, dest_fd, offset, count):
+    # sendfile writes at the destination's file position
+    os.lseek(dest_fd, offset, os.SEEK_SET)
+    return os.sendfile(dest_fd, src_fd, offset, count)
+
+def _copy_contents(fsrc, fdst):
+    size = os.fstat(fsrc.fileno()).st_size
+    # copy_file_range can reflink on btrfs/xfs and stays in the kernel
+    # elsewhere; sendfile is the older in-kernel path
+    if hasattr(os, 'copy_file_range') and _copy_range(fsrc.fileno(), fdst.fileno(), size, _copy_file_range):
+        return
+    if hasattr(os, 'sendfile') and _copy_range(fsrc.fileno(), fdst.fileno(), size, _sendfile):
+        return
+    # neither ran, or one stopped short; drop whatever it wrote
+    fsrc.seek(0)
+    fdst.seek(0)
+    fdst.truncate()
+    shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+def copy_file(src_file, dest_file, link=False):
+    # the copy is made under a temporary name and renamed into place, so a
+    # hardlinked or half-written destination is never modified in place
+    os.makedirs(os.path.dirname(dest_file) or '.', exist_ok=True)
+    tmp_file = f"{dest_file}.tmp{os.getpid()}"
+    try:
+        if link:
+            try:
+                os.link(src_file, tmp_file)
+            except OSError:
+                link = False
+        if not link:
+            with open(src_file, 'rb') as fsrc, open(tmp_file, 'wb') as fdst:
+                _copy_contents(fsrc, fdst)
+            shutil.copystat(src_file, tmp_file)
+        os.replace(tmp_file, dest_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def needs_copy(src_file, dest_file, previous=None, src_hash=None):
+    # rsync-style quick check: copies carry the source mtime, so a matching
+    # size and mtime means the destination is already up to date. With
+    # src_hash the contents are compared instead of the mtime.
+    src_stat = os.stat(src_file)
+    try:
+        dest_stat = os.stat(dest_file)
+    except FileNotFoundError:
+        return True
+    if src_stat.st_size != dest_stat.st_size:
+        return True
+    if src_hash is None:
+        return src_stat.st_mtime_ns != dest_stat.st_mtime_ns
+    dest_hash = None
+    if previous is not None and previous.get('mtime_ns') == dest_stat.st_mtime_ns:
+        dest_hash = previous.get('hash')
+    return src_hash != (dest_hash or hash_file(dest_file))
+
+def asset_record(src_file, rel_path, src_hash=None):
+    stat = os.stat(src_file)
+    record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'output': rel_path}
+    if src_hash is not None:
+        record['hash'] = src_hash
+    return record
+
+def walk_files(root):
+    # relative paths of every file under root, in a stable order
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            paths.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return paths
+
+def changed_files(root, paths, known):
+    # the files under root among paths (e.g. what a watcher saw change), as
+    # relative paths, or None when root has to be walked again: root itself
+    # or a directory in it appeared, went away or was moved. known are the
+    # relative paths of the files root had.
+    root = os.path.abspath(root)
+    rel_paths = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if path == root:
+            return None
+        if not path.startswith(root + os.sep):
+            continue
+        rel_path = os.path.relpath(path, root)
+        if os.path.isdir(path):
+            return None
+        if not os.path.exists(path) and rel_path not in known:
+            prefix = rel_path + os.sep
+            if any(known_path.startswith(prefix) for known_path in known):
+                return None
+        rel_paths.add(rel_path)
+    return rel_paths
+
+def remove_output(dest_dir, rel_path):
+    path = os.path.join(dest_dir, rel_path)
+    # along with any pre-compressed sibling
+    for file_path in (path, path + '.gz'):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            print(f"Deleted file: {file_path}")
+    # prune directories left empty by the removal, but never dest_dir itself
+    parent = os.path.dirname(path)
+    while os.path.abspath(parent) != os.path.abspath(dest_dir):
+        if os.listdir(parent):
+            break
+        os.rmdir(parent)
+        print(f"Deleted directory: {parent}")
+        parent = os.path.dirname(parent)
+            
+def needs_transform(record, old, dest_file):
+    # a transformed output can't be compared with its source, so the
+    # source's record from the last run decides
+    if old is None or not old.get('transformed') or not os.path.exists(dest_file):
+        return True
+    return any(old.get(key) != record.get(key) for key in ('size', 'mtime_ns', 'hash'))
+
+def transform_file(src_file, dest_file, transform):
+    with open(src_file, 'rb') as f:
+        data = f.read()
+    write_output(dest_file, transform(data))
+
+def sync_directory(src_dir, dest_dir, previous=None, checksum=False, link=False, transforms=None,
+                   changed=None):
+    # Copies only files that are new or changed and deletes only outputs of
+    # files that were synced before and have since left src_dir. previous is
+    # the asset section of the last manifest; returns the new one.
+    # transforms maps a file extension to a bytes -> bytes function (e.g. a
+    # minifier) applied instead of a plain copy. changed, when the caller
+    # knows them (see changed_files), are the only files that may differ
+    # from previous; src_dir isn't walked and the rest keep their records.
+    previous = previous or {}
+    transforms = transforms or {}
+    records = {}
+    if changed is None:
+        rel_paths = walk_files(src_dir)
+    else:
+        records.update((rel_path, record) for rel_path, record in previous.items() if rel_path not in changed)
+        rel_paths = sorted(rel_path for rel_path in changed if os.path.isfile(os.path.join(src_dir, rel_path)))
+    for rel_path in rel_paths:
+        src_file = os.path.join(src_dir, rel_path)
+        dest_file = os.path.join(dest_dir, rel_path)
+        src_hash = hash_file(src_file) if checksum else None
+        record = asset_record(src_file, rel_path, src_hash)
+        transform = transforms.get(os.path.splitext(rel_path)[1])
+        if transform is not None:
+            record['transformed'] = True
+            if needs_transform(record, previous.get(rel_path), dest_file):
+                transform_file(src_file, dest_file, transform)
+                print(f"Transformed file: {src_file} to {dest_file}")
+        elif needs_copy(src_file, dest_file, previous.get(rel_path), src_hash):
+            copy_file(src_file, dest_file, link)
+            print(f"Copied file: {src_file} to {dest_file}")
+        records[rel_path] = record
+    for rel_path, old in previous.items():
+        if rel_path not in records:
+            remove_output(dest_dir, old['output'])
+    return records
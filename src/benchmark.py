@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import main as site
+import search
+from block_markdown import block_memo, block_to_block_type, BlockType, markdown_to_blocks, markdown_to_html_node
+from htmlnode import LeafNode, ParentNode, text_leaf
+from inline_markdown import text_to_text_nodes
+from textnode import TextNode, TextType
+
+WORDS = ("the ring hobbit shire elf wizard road mountain river king "
+         "song tree tower sword star night fire stone gate mirror").split()
+
+def synthetic_paragraph(rng, words=40, links=2, images=0, urls=None):
+    # urls are the pages links may point at; without them links go to
+    # made-up /word/word paths
+    tokens = [rng.choice(WORDS) for _ in range(max(words, links + 2))]
+    # each word gets at most one kind of markup so the result always parses
+    positions = rng.sample(range(len(tokens)), links + 2)
+    bold, italic, linked = positions[0], positions[1], positions[2:]
+    tokens[bold] = f"**{tokens[bold]}**"
+    tokens[italic] = f"_{tokens[italic]}_"
+    for i in linked:
+        url = rng.choice(urls) if urls else f"/{rng.choice(WORDS)}/{rng.choice(WORDS)}"
+        tokens[i] = f"[{tokens[i]}]({url})"
+    for _ in range(images):
+        tokens.insert(rng.randrange(len(tokens) + 1), f"![{rng.choice(WORDS)}](/images/{rng.choice(WORDS)}.png)")
+    return " ".join(tokens)
+
+def synthetic_markdown(rng, paragraphs=50, list_density=0.2, links=2, images=0, urls=None):
+    blocks = [f"# {rng.choice(WORDS).title()}"]
+    for _ in range(paragraphs):
+        blocks.append(synthetic_paragraph(rng, links=links, images=images, urls=urls))
+        if rng.random() < list_density:
+            blocks.append("\n".join(f"- {synthetic_paragraph(rng, words=8, links=1, urls=urls)}"
+                                    for _ in range(5)))
+    return "\n\n".join(blocks)
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+def generate_corpus(root, pages=100, paragraphs=20, list_density=0.2, links=2,
+                    images=0, depth=2, seed=0):
+    # Writes content/, static/ and template.html under root. Pages are spread
+    # over a directory tree `depth` levels deep and link to each other, so
+    # the link check has nothing to report; returns the page paths.
+    rng = random.Random(seed)
+    dirs = [[f"d{rng.randrange(4)}" for _ in range(rng.randint(0, depth))] + [f"page{i}"]
+            for i in range(pages)]
+    urls = ['/' + '/'.join(parts) for parts in dirs]
+    paths = []
+    for parts in dirs:
+        path = os.path.join(root, 'content', *parts, 'index.md')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(synthetic_markdown(rng, paragraphs, list_density, links, images, urls))
+        paths.append(path)
+    os.makedirs(os.path.join(root, 'static', 'images'), exist_ok=True)
+    with open(os.path.join(root, 'static', 'index.css'), 'w', encoding='utf-8') as f:
+        f.write("body {\n  margin: 0 auto;\n  max-width: 40em;\n}\n" * 20)
+    for word in WORDS:
+        with open(os.path.join(root, 'static', 'images', f"{word}.png"), 'wb') as f:
+            f.write(rng.randbytes(16 * 1024))
+    with open(os.path.join(root, 'template.html'), 'w', encoding='utf-8') as f:
+        f.write(TEMPLATE)
+    return paths
+
+def best_time(function, repeat, setup=None):
+    # setup runs before each repeat, outside the timing
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bytes_per_object(factory, count):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        objects = [factory(i) for i in range(count)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # the list holding the objects is not part of the per-node cost
+    allocated -= sys.getsizeof(objects)
+    return allocated / count
+
+def bench_nodes(count=20000, repeat=5, seed=0):
+    text = "x"
+    child = LeafNode(None, text)
+    markdown = synthetic_markdown(random.Random(seed))
+    results = {
+        'bytes_per_node': {
+            'TextNode': bytes_per_object(lambda i: TextNode(text, TextType.TEXT), count),
+            'LeafNode': bytes_per_object(lambda i: LeafNode("b", text), count),
+            'text_leaf': bytes_per_object(lambda i: text_leaf(text), count),
+            'ParentNode': bytes_per_object(lambda i: ParentNode("p", [child]), count),
+        },
+        'seconds_per_node': {
+            'TextNode': best_time(lambda: [TextNode(text, TextType.TEXT) for _ in range(count)], repeat) / count,
+            'LeafNode': best_time(lambda: [LeafNode("b", text) for _ in range(count)], repeat) / count,
+            'text_leaf': best_time(lambda: [text_leaf(text) for _ in range(count)], repeat) / count,
+        },
+        'parse': {
+            'markdown_bytes': len(markdown.encode()),
+            'markdown_to_html_node_seconds': best_time(lambda: markdown_to_html_node(markdown), repeat),
+        },
+    }
+    return results
+
+@contextlib.contextmanager
+def quiet_cwd(path):
+    # run a build in path with its per-file logging swallowed
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.chdir(cwd)
+
+def bench_stages(root, paths, repeat=3):
+    markdowns = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            markdowns.append(f.read())
+    blocks = [block for markdown in markdowns for block in markdown_to_blocks(markdown)]
+    inline = [block for block in blocks if block_to_block_type(block) == BlockType.PARAGRAPH]
+    trees = [markdown_to_html_node(markdown) for markdown in markdowns]
+    template = site.Template.from_file(os.path.join(root, 'template.html'), '/')
+    dest = os.path.join(root, 'out')
+
+    def generate_pages():
+        for i, path in enumerate(paths):
+            site.build_page(path, os.path.join(dest, f"page{i}.html"), template)
+
+    # generate_page and main_full start every repeat from a cold block memo
+    # (and main_full without the on-disk render cache), so later repeats
+    # measure the same work as the first; generate_page_memo and
+    # main_full_cached measure the warm paths
+    def full_build(*options):
+        with quiet_cwd(root):
+            site.main(['--clean', *options])
+
+    def noop_build():
+        with quiet_cwd(root):
+            site.main([])
+
+    site_dir = os.path.join(root, 'docs')
+
+    search_state = os.path.join(root, '.cache', 'search', 'bench.json')
+
+    def search_index():
+        # from scratch, tokenizing every source, over the pages of the last
+        # full build
+        search.remove_search_index(site_dir)
+        if os.path.exists(search_state):
+            os.remove(search_state)
+        search.update_search_index(site_dir, search_state, os.path.join(root, 'content'),
+                                   site.load_manifest(site_dir)['pages'])
+
+    stages = {
+        'markdown_to_blocks': lambda: [markdown_to_blocks(markdown) for markdown in markdowns],
+        'text_to_text_nodes': lambda: [text_to_text_nodes(" ".join(block.split("\n"))) for block in inline],
+        'markdown_to_html_node': lambda: [markdown_to_html_node(markdown) for markdown in markdowns],
+        'to_html': lambda: [tree.to_html() for tree in trees],
+        'generate_page': generate_pages,
+        'generate_page_memo': generate_pages,
+        'main_full': lambda: full_build('--no-cache'),
+        'main_full_cached': full_build,
+        'main_noop': noop_build,
+        'search_index': search_index,
+    }
+    cold = {'generate_page', 'main_full'}
+    results = {name: best_time(stage, repeat, block_memo.clear if name in cold else None)
+               for name, stage in stages.items()}
+    shutil.rmtree(dest, ignore_errors=True)
+    shards = search.shard_sizes(site_dir)
+    return results, {
+        'markdown_bytes': sum(len(markdown.encode()) for markdown in markdowns),
+        'blocks': len(blocks),
+        'inline_paragraphs': len(inline),
+        'search_shards': len(shards),
+        'search_bytes': sum(shards.values()),
+        'search_largest_shard_bytes': max(shards.values()),
+    }
+
+def compare(results, baseline, tolerance):
+    # stages that got slower than baseline * tolerance
+    regressions = []
+    for name, seconds in results['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if before and seconds > before * tolerance:
+            regressions.append((name, before, seconds))
+    return regressions
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the site generator on a synthetic corpus")
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--paragraphs', type=int, default=20, help="paragraphs per page")
+    parser.add_argument('--list-density', type=float, default=0.2,
+                        help="chance of a list block after each paragraph")
+    parser.add_argument('--links', type=int, default=2, help="links per paragraph")
+    parser.add_argument('--images', type=int, default=0, help="images per paragraph")
+    parser.add_argument('--depth', type=int, default=2, help="maximum directory nesting of pages")
+    parser.add_argument('--count', type=int, default=20000, help="nodes per memory/time sample")
+    parser.add_argument('--repeat', type=int, default=3, help="timing repetitions (best is kept)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', metavar='DIR', help="generate the corpus in DIR and leave it there")
+    parser.add_argument('-o', '--output', help="write the JSON results here instead of stdout")
+    parser.add_argument('--baseline', help="JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="fail when a stage is slower than baseline by more than this factor")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    config = {key: getattr(args, key) for key in
+              ('pages', 'paragraphs', 'list_density', 'links', 'images', 'depth', 'seed')}
+    root = args.keep or tempfile.mkdtemp(prefix='ssg-bench-')
+    try:
+        paths = generate_corpus(root, **config)
+        stages, corpus = bench_stages(root, paths, args.repeat)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    results = {
+        'python': sys.version.split()[0],
+        'config': config,
+        'corpus': corpus,
+        'stages': stages,
+        'nodes': bench_nodes(args.count, args.repeat, args.seed),
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print(f"Regression in {name}: {before:.4f}s -> {after:.4f}s", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
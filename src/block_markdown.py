@@ -1,10 +1,16 @@
+from collections import Counter, OrderedDict
 from enum import Enum
+import mmap
 import re
 
-from htmlnode import ParentNode
-from inline_markdown import text_to_text_nodes
+from htmlnode import ParentNode, text_leaf
+from inline_markdown import node_refs, text_to_text_nodes
 from textnode import TextNode, TextType, text_node_to_html_node
 
+# bump whenever a change to the parser changes its output; cached renders
+# from other versions are then ignored
+PARSER_VERSION = 4
+
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
     HEADING = "heading"
@@ -13,32 +19,111 @@ class BlockType(Enum):
     UNORDERED_LIST = "unordered_list"
     ORDERED_LIST = "ordered_list"
 
+def iter_lines(source):
+    # lines without their trailing newline, from a str, a bytes-like object
+    # (including mmap), or any file object opened in text or binary mode
+    if isinstance(source, (str, bytes, bytearray, mmap.mmap)):
+        newline = "\n" if isinstance(source, str) else b"\n"
+        start = 0
+        while True:
+            end = source.find(newline, start)
+            line = source[start:] if end == -1 else source[start:end]
+            yield line if isinstance(line, str) else line.decode("utf-8")
+            if end == -1:
+                return
+            start = end + 1
+    for line in source:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        yield line[:-1] if line.endswith("\n") else line
+
+def _strip_block_lines(lines):
+    # line-wise equivalent of str.strip() on the joined block
+    start, end = 0, len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    if start == end:
+        return []
+    lines = lines[start:end]
+    lines[0] = lines[0].lstrip()
+    lines[-1] = lines[-1].rstrip()
+    return lines
+
+def _leading_blank(lines):
+    count = 0
+    while not lines[count].strip():
+        count += 1
+    return count
+
+def iter_block_lines(source):
+    # Blocks are separated by empty lines. Each block's lines are yielded as
+    # soon as the block closes, so a large document is never held in memory
+    # more than one block at a time.
+    run = []
+    for line in iter_lines(source):
+        if line:
+            run.append(line)
+            continue
+        if run:
+            block_lines = _strip_block_lines(run)
+            if block_lines:
+                yield block_lines
+            run = []
+    if run:
+        block_lines = _strip_block_lines(run)
+        if block_lines:
+            yield block_lines
+
+def iter_numbered_block_lines(source, first_line=1):
+    # like iter_block_lines, with the line number of each block's first line
+    # counted from first_line, for reports that point into the source
+    run = []
+    start = first_line
+    for number, line in enumerate(iter_lines(source), first_line):
+        if line:
+            if not run:
+                start = number
+            run.append(line)
+            continue
+        if run:
+            block_lines = _strip_block_lines(run)
+            if block_lines:
+                yield start + _leading_blank(run), block_lines
+            run = []
+    if run:
+        block_lines = _strip_block_lines(run)
+        if block_lines:
+            yield start + _leading_blank(run), block_lines
+
+def iter_blocks(source):
+    for lines in iter_block_lines(source):
+        yield block_type_from_lines(lines), lines
+
 def markdown_to_blocks(markdown):
-    block_strings = markdown.split("\n\n")
-    # remove whitespace from the start and end of each block
-    block_strings = [b.strip() for b in block_strings]
-    # remove any empty blocks
-    block_strings = [b for b in block_strings if b]
-    return block_strings
+    return ["\n".join(lines) for lines in iter_block_lines(markdown)]
 
 def block_to_block_type(block):
-    lines = block.split("\n")
+    return block_type_from_lines(block.split("\n"))
 
-    if block.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
+def block_type_from_lines(lines):
+    first = lines[0]
+    if first.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
         return BlockType.HEADING
-    if len(lines) > 1 and lines[0].startswith("```") and lines[-1].startswith("```"):
+    if len(lines) > 1 and first.startswith("```") and lines[-1].startswith("```"):
         return BlockType.CODE
-    if block.startswith(">"):
+    if first.startswith(">"):
         for line in lines:
             if not line.startswith(">"):
                 return BlockType.PARAGRAPH
         return BlockType.QUOTE
-    if block.startswith("- "):
+    if first.startswith("- "):
         for line in lines:
             if not line.startswith("- "):
                 return BlockType.PARAGRAPH
         return BlockType.UNORDERED_LIST
-    if block.startswith("1. "):
+    if first.startswith("1. "):
         i = 1
         for line in lines:
             if not line.startswith(f"{i}. "):
@@ -48,93 +133,216 @@ def block_to_block_type(block):
     return BlockType.PARAGRAPH
     
 def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    html_nodes = []
-    
-    for block in blocks:
-        html_node = create_html_node_from_block(block)
-        html_nodes.append(html_node)
-        
+    # markdown may be a string, a file object or an mmap
+    html_nodes = [create_html_node_from_lines(block_type, lines)
+                  for block_type, lines in iter_blocks(markdown)]
     parent_node = ParentNode("div", children=html_nodes)
     
     return parent_node
 
+class BlockMemo:
+    # Bounded LRU of rendered blocks keyed on the raw block text, so blocks
+    # repeated across pages (disclaimers, navigation lists, the same image)
+    # are parsed once per process. An entry is the block's HTML, its links
+    # and images and, once asked for, its search terms, as render_block
+    # gives them. Blocks longer than
+    # max_block_chars are rendered but not kept; they are rarely repeated
+    # and would push everything else out.
+    def __init__(self, max_entries=4096, max_block_chars=4096):
+        self.max_entries = max_entries
+        self.max_block_chars = max_block_chars
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, find_terms=None):
+        # an entry without terms is a miss when they are asked for
+        entry = self.entries.get(key)
+        if entry is None or (find_terms is not None and entry[2] is None):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        if len(key) > self.max_block_chars:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def render(self, block_type, lines, find_terms=None):
+        key = "\n".join(lines)
+        entry = self.get(key, find_terms)
+        if entry is None:
+            entry = render_block(block_type, lines, find_terms)
+            self.put(key, entry)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+# shared by every page rendered in this process
+block_memo = BlockMemo()
+
+def render_block(block_type, lines, find_terms=None):
+    # (html, refs, terms) of a block from one parse: refs are [url, line,
+    # is_image] for the links and images it renders, line counted from 0,
+    # and terms what find_terms makes of its text nodes, or None
+    nodes = []
+    html = create_html_node_from_lines(block_type, lines, nodes).to_html()
+    terms = find_terms(nodes) if find_terms is not None else None
+    return html, node_refs(lines, nodes), terms
+
+class PageFacts:
+    # what rendering a page finds out besides its HTML, collected block by
+    # block as iter_markdown_html renders them: refs are [url, line,
+    # is_image] for every link and image, lines counted from first_line,
+    # and with find_terms, terms has what it found in every block
+    def __init__(self, first_line=1, find_terms=None):
+        self.first_line = first_line
+        self.find_terms = find_terms
+        self.refs = []
+        self.terms = []
+
+    def add(self, start, refs, terms=None):
+        self.refs.extend([url, start + line, image] for url, line, image in refs)
+        if terms:
+            self.terms.extend(terms)
+
+    def term_counts(self):
+        return dict(Counter(self.terms))
+
+def iter_block_html(markdown, memo=None, facts=None):
+    # the HTML of each block of markdown, parsed and rendered as it is read
+    # and then dropped; with a BlockMemo, blocks seen before are served from
+    # it as one fragment, and with a PageFacts their refs (and terms) are
+    # collected
+    if facts is None:
+        for block_type, lines in iter_blocks(markdown):
+            if memo is not None:
+                yield memo.render(block_type, lines)[0]
+            else:
+                yield from create_html_node_from_lines(block_type, lines).iter_html()
+        return
+    for start, lines in iter_numbered_block_lines(markdown, facts.first_line):
+        block_type = block_type_from_lines(lines)
+        if memo is not None:
+            html, refs, terms = memo.render(block_type, lines, facts.find_terms)
+        else:
+            html, refs, terms = render_block(block_type, lines, facts.find_terms)
+        facts.add(start, refs, terms)
+        yield html
+
+def iter_markdown_html(markdown, memo=None, facts=None):
+    # same output as markdown_to_html_node(markdown).iter_html(), one block
+    # at a time (see iter_block_html)
+    empty = True
+    for fragment in iter_block_html(markdown, memo, facts):
+        if empty:
+            yield "<div>"
+            empty = False
+        yield fragment
+    if empty:
+        raise ValueError("ParentNode must have children to convert to HTML")
+    yield "</div>"
+
 def create_html_node_from_block(block):
-    block_type = block_to_block_type(block)
+    return create_html_node_from_lines(block_to_block_type(block), block.split("\n"))
+
+def create_html_node_from_lines(block_type, lines, nodes=None):
+    # nodes, a list, collects the text nodes the block is rendered from
     match block_type:
         case BlockType.HEADING:
-            return heading_to_html_node(block)
+            return heading_to_html_node("\n".join(lines), nodes)
         
         case BlockType.CODE:
-            return code_to_html_node(block)
+            return code_to_html_node("\n".join(lines), nodes)
         
         case BlockType.PARAGRAPH:
-            return paragraph_to_html_node(block)
+            return paragraph_lines_to_html_node(lines, nodes)
         
         case BlockType.QUOTE:
-            return quote_to_html_node(block)
+            return quote_lines_to_html_node(lines, nodes)
         
         case BlockType.UNORDERED_LIST:
-            return ulist_to_html_node(block)
+            return ulist_lines_to_html_node(lines, nodes)
         
         case BlockType.ORDERED_LIST:
-            return olist_to_html_node(block)
+            return olist_lines_to_html_node(lines, nodes)
         case _:
             raise ValueError(f"Invalid block type: {block_type}")
             
-def text_to_children(text):
+def text_to_children(text, nodes=None):
+    # bare text runs, the most common node, take text_leaf's shared empties;
+    # these trees are rendered and dropped, never added to
     text_nodes = text_to_text_nodes(text)
-    html_nodes = [text_node_to_html_node(tn) for tn in text_nodes]
+    if nodes is not None:
+        nodes.extend(text_nodes)
+    html_nodes = [text_leaf(tn.text) if tn.text_type is TextType.TEXT else text_node_to_html_node(tn)
+                  for tn in text_nodes]
     return html_nodes
 
 def paragraph_to_html_node(block):
-    lines = block.split("\n")
+    return paragraph_lines_to_html_node(block.split("\n"))
+
+def paragraph_lines_to_html_node(lines, nodes=None):
     paragraph = " ".join(lines)
-    children = text_to_children(paragraph)
+    children = text_to_children(paragraph, nodes)
     return ParentNode("p", children=children)
 
-def heading_to_html_node(block):
+def heading_to_html_node(block, nodes=None):
     level = len(block) - len(block.lstrip("#"))
     tag = f"h{level}"
     content = block.lstrip("#").strip()
-    children = text_to_children(content)
+    children = text_to_children(content, nodes)
     return ParentNode(tag, children=children)
 
-def code_to_html_node(block):
+def code_to_html_node(block, nodes=None):
     if not block.startswith("```") or not block.endswith("```"):
         raise ValueError("Invalid code block")
     text = block[4:-3]
-    raw_text_node = TextNode(text, TextType.TEXT)
-    child = text_node_to_html_node(raw_text_node)
+    if nodes is not None:
+        nodes.append(TextNode(text, TextType.TEXT))
+    child = text_leaf(text)
     code = ParentNode("code", children=[child])
     return ParentNode("pre", children=[code])
 
 def olist_to_html_node(block):
-    items = block.split("\n")
+    return olist_lines_to_html_node(block.split("\n"))
+
+def olist_lines_to_html_node(items, nodes=None):
     html_items = []
     for item in items:
         parts = item.split(". ", 1)
         text = parts[1]
-        children = text_to_children(text)
+        children = text_to_children(text, nodes)
         html_items.append(ParentNode("li", children=children))
     return ParentNode("ol", children=html_items)
 
 def ulist_to_html_node(block):
-    items = block.split("\n")
+    return ulist_lines_to_html_node(block.split("\n"))
+
+def ulist_lines_to_html_node(items, nodes=None):
     html_items = []
     for item in items:
         text = item[2:]
-        children = text_to_children(text)
+        children = text_to_children(text, nodes)
         html_items.append(ParentNode("li", children=children))
     return ParentNode("ul", children=html_items)
 
 def quote_to_html_node(block):
-    lines = block.split("\n")
+    return quote_lines_to_html_node(block.split("\n"))
+
+def quote_lines_to_html_node(lines, nodes=None):
     quote_lines = []
     for line in lines:
         if not line.startswith(">"):
             raise ValueError("Invalid quote block")
         quote_lines.append(line.lstrip("> ").rstrip())
     quote_text = " ".join(quote_lines)
-    children = text_to_children(quote_text)
+    children = text_to_children(quote_text, nodes)
     return ParentNode("blockquote", children=children)
\ No newline at end of file
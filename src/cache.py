@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from block_markdown import PARSER_VERSION
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'render')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class RenderCache:
+    # On-disk cache of rendered page content keyed by a hash of the markdown
+    # source and the parser version. Entries hold the content HTML before any
+    # basepath rewriting, so template edits and basepath switches hit it.
+    # Recency is the file mtime, bumped on every hit; prune() evicts the
+    # least recently used entries once the cache is over max_bytes.
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, version=PARSER_VERSION):
+        # version defaults to the parser's; other users of the cache pass
+        # their own
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version
+
+    def key(self, source_hash):
+        return hashlib.sha256(f"{self.version}:{source_hash}".encode()).hexdigest()
+
+    def _path(self, source_hash):
+        key = self.key(source_hash)
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, source_hash):
+        path = self._path(source_hash)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, source_hash, entry):
+        path = self._path(source_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def entries(self):
+        # (mtime_ns, size, path) for every entry
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime_ns, stat.st_size, path))
+        return found
+
+    def prune(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+class MemoryCache:
+    # Entries kept in memory in front of an optional RenderCache, for a
+    # long-running process that builds the same site again and again. Only
+    # the process that owns it sees what it keeps, so worker processes
+    # (-j) fall through to the backing cache.
+    def __init__(self, backing=None, max_entries=10000):
+        self.backing = backing
+        self.max_entries = max_entries
+        self.kept = OrderedDict()
+
+    def get(self, source_hash):
+        entry = self.kept.get(source_hash)
+        if entry is not None:
+            self.kept.move_to_end(source_hash)
+            return entry
+        if self.backing is not None:
+            entry = self.backing.get(source_hash)
+            if entry is not None:
+                self._keep(source_hash, entry)
+        return entry
+
+    def put(self, source_hash, entry):
+        self._keep(source_hash, entry)
+        if self.backing is not None:
+            self.backing.put(source_hash, entry)
+
+    def _keep(self, source_hash, entry):
+        self.kept[source_hash] = entry
+        self.kept.move_to_end(source_hash)
+        while len(self.kept) > self.max_entries:
+            self.kept.popitem(last=False)
+
+    def prune(self):
+        return self.backing.prune() if self.backing is not None else 0
+
+    def __getstate__(self):
+        # a worker process gets an empty one in front of the backing cache;
+        # the kept entries would otherwise be pickled into every worker on
+        # every build
+        state = self.__dict__.copy()
+        state['kept'] = OrderedDict()
+        return state
@@ -0,0 +1,65 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from assets import walk_files
+from output import write_output
+
+# Pre-compressed .gz siblings for static hosts that can serve them directly.
+# zlib releases the GIL, so files are compressed on a thread pool.
+
+TEXT_EXTENSIONS = ('.html', '.htm', '.css', '.js', '.mjs', '.json', '.xml', '.svg', '.txt', '.md')
+DEFAULT_MIN_RATIO = 0.9
+
+def is_text_output(rel_path):
+    # dotfiles are build state (the manifest, the search index state), not served
+    return rel_path.endswith(TEXT_EXTENSIONS) and not os.path.basename(rel_path).startswith('.')
+
+def gzip_file(path, min_ratio=DEFAULT_MIN_RATIO):
+    # writes path.gz at the highest level when it is at most min_ratio of
+    # the original size, otherwise removes any stale one; returns whether a
+    # .gz is kept. mtime=0 keeps the output identical for identical input.
+    with open(path, 'rb') as f:
+        data = f.read()
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if data and len(compressed) <= len(data) * min_ratio:
+        write_output(path + '.gz', compressed)
+        return True
+    if os.path.exists(path + '.gz'):
+        os.remove(path + '.gz')
+    return False
+
+def compress_outputs(dest_dir, previous=None, min_ratio=DEFAULT_MIN_RATIO, workers=None):
+    # Compresses every text output that changed since the last run, judged
+    # by size and mtime (outputs are only rewritten when their bytes change,
+    # so an untouched file keeps its mtime). previous is the 'compressed'
+    # section of the last manifest; returns the new one.
+    previous = previous or {}
+    records = {}
+    todo = []
+    for rel_path in walk_files(dest_dir):
+        if not is_text_output(rel_path):
+            continue
+        stat = os.stat(os.path.join(dest_dir, rel_path))
+        record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'ratio': min_ratio}
+        old = previous.get(rel_path)
+        if (old is not None and old['size'] == record['size'] and old['mtime_ns'] == record['mtime_ns']
+                and old['ratio'] == min_ratio
+                and old['gzip'] == os.path.exists(os.path.join(dest_dir, rel_path + '.gz'))):
+            record['gzip'] = old['gzip']
+        else:
+            todo.append(rel_path)
+        records[rel_path] = record
+    if todo:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            kept = executor.map(lambda rel_path: gzip_file(os.path.join(dest_dir, rel_path), min_ratio), todo)
+            for rel_path, gz in zip(todo, kept):
+                records[rel_path]['gzip'] = gz
+        print(f"Compressed {len(todo)} file(s), {sum(records[rel]['gzip'] for rel in todo)} .gz kept")
+    return records
+
+def remove_compressed(dest_dir, previous):
+    # drops the .gz files of a previous run, e.g. when compression is turned off
+    for rel_path, old in previous.items():
+        gz_path = os.path.join(dest_dir, rel_path + '.gz')
+        if old.get('gzip') and os.path.exists(gz_path):
+            os.remove(gz_path)
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+# A long-running build server, so a rebuild doesn't pay for a Python start,
+# imports and a cold parse. Between builds it keeps the manifests (and with
+# them the size/mtime of every source), the compiled template, rendered
+# pages and memoized blocks in memory. Clients send one JSON request per
+# connection over a Unix socket and get one JSON reply:
+#
+#   python3 src/daemon.py serve [build options]   e.g. serve /site/ --minify
+#   python3 src/daemon.py build [--clean]         prints what changed
+#   python3 src/daemon.py status
+#   python3 src/daemon.py stop
+#
+# The client side only imports the standard library, so it starts fast.
+
+DEFAULT_SOCKET = os.path.join('.cache', 'build.sock')
+
+def request(socket_path, message, timeout=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+def changes(old, new):
+    # what a build changed, from the manifests before and after it
+    summary = {}
+    for section in ('pages', 'assets'):
+        before, after = old[section], new[section]
+        summary[section] = {
+            'added': sorted(path for path in after if path not in before),
+            'removed': sorted(path for path in before if path not in after),
+            'changed': sorted(path for path in after if path in before
+                              and (after[path].get('hash'), after[path]['size'], after[path]['mtime_ns'])
+                              != (before[path].get('hash'), before[path]['size'], before[path]['mtime_ns'])),
+        }
+    summary['inputs'] = sorted(path for path, record in new['inputs'].items()
+                               if old['inputs'].get(path, {}).get('hash') != record['hash'])
+    return summary
+
+def format_reply(reply):
+    if 'error' in reply:
+        return f"Build server error: {reply['error']}"
+    if 'builds' in reply:
+        return (f"Build server {reply['pid']} up {reply['uptime']:.0f}s, {reply['builds']} build(s), "
+                f"targets: {', '.join(reply['targets'])}")
+    lines = [f"Built in {reply['seconds']:.3f}s" if reply['ok'] else
+             f"Build failed in {reply['seconds']:.3f}s: {reply['message']}"]
+    for dest_dir, summary in reply['changes'].items():
+        pages, assets = summary['pages'], summary['assets']
+        lines.append(f"  {dest_dir}: pages {len(pages['changed'])} changed, {len(pages['added'])} added, "
+                     f"{len(pages['removed'])} removed; assets {len(assets['changed'])} changed, "
+                     f"{len(assets['added'])} added, {len(assets['removed'])} removed")
+        if summary['inputs']:
+            lines.append(f"    template changed ({', '.join(summary['inputs'])}), every page re-rendered")
+        for section in ('pages', 'assets'):
+            for kind in ('changed', 'added', 'removed'):
+                lines.extend(f"    {kind} {path}" for path in summary[section][kind])
+    for path, error in reply['failures'].items():
+        lines.append(f"  {path}: {error}")
+    return '\n'.join(lines)
+
+class BuildServer:
+    def __init__(self, socket_path, targets, build_kwargs):
+        self.socket_path = socket_path
+        self.targets = targets
+        self.build_kwargs = build_kwargs
+        self.manifests = None
+        self.builds = 0
+        self.started = time.monotonic()
+
+    def build(self, clean=False):
+        # imported here so the client never loads the site generator
+        from main import BuildError, build_targets, load_manifest
+        before = self.manifests
+        if before is None or clean:
+            before = {dest_dir: load_manifest(dest_dir) for _, dest_dir in self.targets}
+        start = time.perf_counter()
+        failures = {}
+        message = None
+        try:
+            self.manifests = build_targets(self.targets, previous=self.manifests,
+                                           **dict(self.build_kwargs, clean=clean))
+        except BuildError as e:
+            self.manifests = e.manifest
+            failures = e.failures
+            message = str(e)
+        self.builds += 1
+        return {
+            'ok': not failures,
+            'seconds': time.perf_counter() - start,
+            'failures': failures,
+            'message': message,
+            'changes': {dest_dir: changes(before[dest_dir], self.manifests[dest_dir])
+                        for _, dest_dir in self.targets},
+        }
+
+    def handle(self, message):
+        command = message.get('command')
+        if command == 'build':
+            return self.build(bool(message.get('clean')))
+        if command == 'status':
+            return {'pid': os.getpid(), 'uptime': time.monotonic() - self.started, 'builds': self.builds,
+                    'targets': [dest_dir for _, dest_dir in self.targets]}
+        if command == 'stop':
+            return {'stopping': True}
+        return {'error': f"unknown command {command!r}"}
+
+    def listen(self):
+        # a leftover socket from a server that died is replaced; a live one
+        # is left alone
+        if os.path.exists(self.socket_path):
+            try:
+                request(self.socket_path, {'command': 'status'}, timeout=1)
+            except OSError:
+                os.remove(self.socket_path)
+            else:
+                raise RuntimeError(f"a build server is already listening on {self.socket_path}")
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen()
+        return listener
+
+    def serve(self, listener):
+        # one request at a time, on the main thread (which the page time
+        # limit's watchdog needs)
+        try:
+            while True:
+                conn, _ = listener.accept()
+                with conn:
+                    try:
+                        with conn.makefile('rb') as f:
+                            message = json.loads(f.readline())
+                        reply = self.handle(message)
+                    except Exception as e:
+                        reply = {'error': f"{type(e).__name__}: {e}"}
+                    conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+                if reply.get('stopping'):
+                    return
+        finally:
+            listener.close()
+            os.remove(self.socket_path)
+
+def serve(socket_path, argv):
+    import main as site
+    from cache import MemoryCache
+    args = site.parse_args(argv)
+    if args.watch or args.publish or args.profile:
+        sys.exit("serve doesn't support --watch, --publish or --profile")
+    build_kwargs = site.build_options(args)
+    build_kwargs['cache'] = MemoryCache(build_kwargs['cache'])
+    server = BuildServer(socket_path, args.targets, build_kwargs)
+    listener = server.listen()
+    print(format_reply(server.build(args.clean)))
+    print(f"Build server listening on {socket_path}")
+    server.serve(listener)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build server for the site generator and its client")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f"socket path (default {DEFAULT_SOCKET})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="build once, then rebuild on request")
+    serve_parser.add_argument('options', nargs=argparse.REMAINDER,
+                              help="build options, as for main.py")
+    build_parser = commands.add_parser('build', help="ask the server to rebuild and show what changed")
+    build_parser.add_argument('--clean', action='store_true', help="rebuild from an empty output")
+    commands.add_parser('status', help="show whether a server is running")
+    commands.add_parser('stop', help="stop the server")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == 'serve':
+        return serve(args.socket, args.options)
+    message = {'command': args.command}
+    if args.command == 'build':
+        message['clean'] = args.clean
+    try:
+        reply = request(args.socket, message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(f"No build server on {args.socket}; start one with: daemon.py serve")
+    if args.command == 'stop':
+        print("Build server stopped")
+        return
+    print(format_reply(reply))
+    if not reply.get('ok', 'error' not in reply):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
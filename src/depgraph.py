@@ -0,0 +1,109 @@
+import os
+import posixpath
+from urllib.parse import unquote, urlsplit
+from block_markdown import PageFacts, iter_block_html
+
+# The dependency graph lives in the build manifest: each page record lists
+# the template files it was rendered with ('deps') and every link and image
+# target of the page with its source line ('refs', from the text nodes the
+# page is rendered from), and manifest['inputs'] has a file record for
+# every template and partial. The site URLs a page links to are taken from
+# its refs and resolved against the current pages when queried, so a page
+# added later is picked up without rescanning the pages that link to it.
+
+def extract_refs(markdown, first_line=1):
+    # [url, line, is_image] for every link and image the page renders, in
+    # order of appearance, with lines counted from first_line; markdown may
+    # be a string or a file object. A build collects these as it renders
+    # the page; this renders it only for them.
+    facts = PageFacts(first_line)
+    for _ in iter_block_html(markdown, None, facts):
+        pass
+    return facts.refs
+
+def site_links(refs):
+    # the site-absolute link targets (not images) among refs, once each
+    links = {}
+    for url, _, image in refs:
+        if not image and url.startswith('/') and not url.startswith('//'):
+            links[url] = None
+    return list(links)
+
+def extract_links(markdown):
+    return site_links(extract_refs(markdown))
+
+def _url_path(url):
+    return posixpath.normpath(unquote(urlsplit(url).path))
+
+def url_index(pages):
+    # URL path -> page; a page at blog/tom/index.html answers to
+    # /blog/tom/index.html and /blog/tom
+    index = {}
+    for rel_path, record in pages.items():
+        output = '/' + record['output'].replace(os.sep, '/')
+        index[output] = rel_path
+        if posixpath.basename(output) == 'index.html':
+            index[posixpath.dirname(output)] = rel_path
+    return index
+
+def resolve_url(url, index):
+    return index.get(_url_path(url))
+
+def dependents(manifest, path):
+    # pages rendered with the template or partial at path
+    return sorted(rel_path for rel_path, record in manifest['pages'].items()
+                  if path in record.get('deps', ()))
+
+def linked_from(manifest, rel_path, index=None):
+    index = url_index(manifest['pages']) if index is None else index
+    return sorted(source for source, record in manifest['pages'].items()
+                  if any(resolve_url(url, index) == rel_path for url in site_links(record.get('refs', ()))))
+
+def strip_basepath(url, basepath):
+    # the site path of a URL as served under basepath
+    prefix = basepath.rstrip('/')
+    if prefix and (url == prefix or url.startswith(prefix + '/')):
+        return url[len(prefix):] or '/'
+    return url
+
+def find_page(manifest, target, content_dir, dest_dir, basepath='/'):
+    # the page a user-supplied path refers to: a source file, an output
+    # file, a site URL (with or without basepath) or a path relative to
+    # content_dir
+    pages = manifest['pages']
+    rel_path = os.path.relpath(target, content_dir)
+    if rel_path in pages:
+        return rel_path
+    rel_path = os.path.relpath(target, dest_dir)
+    for page, record in pages.items():
+        if record['output'] == rel_path:
+            return page
+    if target in pages:
+        return target
+    if target.startswith('/'):
+        return resolve_url(strip_basepath(target, basepath), url_index(pages))
+    return None
+
+def explain(manifest, target, content_dir='content', dest_dir='docs', basepath='/'):
+    if target in manifest['inputs']:
+        pages = dependents(manifest, target)
+        lines = [target, f"  used by {len(pages)} page(s):"]
+        lines.extend(f"    {os.path.join(content_dir, page)}" for page in pages)
+        return '\n'.join(lines)
+    rel_path = find_page(manifest, target, content_dir, dest_dir, basepath)
+    if rel_path is None:
+        return f"{target}: not a page or template input of the last build"
+    record = manifest['pages'][rel_path]
+    index = url_index(manifest['pages'])
+    lines = [os.path.join(content_dir, rel_path),
+             f"  output: {os.path.join(dest_dir, record['output'])}",
+             f"  depends on: {', '.join(record.get('deps', ())) or 'nothing'}"]
+    links = site_links(record.get('refs', ()))
+    lines.append(f"  links to {len(links)} URL(s):")
+    for url in links:
+        page = resolve_url(url, index)
+        lines.append(f"    {url} -> {os.path.join(content_dir, page) if page else 'no such page'}")
+    sources = linked_from(manifest, rel_path, index)
+    lines.append(f"  linked from {len(sources)} page(s):")
+    lines.extend(f"    {os.path.join(content_dir, source)}" for source in sources)
+    return '\n'.join(lines)
@@ -0,0 +1,71 @@
+# Optional metadata at the top of a page, between two '---' lines:
+#
+#   ---
+#   title: Why Tom Bombadil Was a Mistake
+#   date: 2024-03-01
+#   tags: [tolkien, opinion]
+#   summary: He doesn't move the plot.
+#   ---
+#
+# Only this header is read to get the metadata, never the body.
+
+FENCE = '---'
+LIST_FIELDS = ('tags',)
+
+def _parse_value(key, value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        value = value[1:-1]
+    if key in LIST_FIELDS:
+        if value.startswith('[') and value.endswith(']'):
+            value = value[1:-1]
+        return [item.strip().strip('"\'') for item in value.split(',') if item.strip()]
+    return value
+
+def parse_front_matter(lines):
+    # key: value lines; keys are case-insensitive and unknown keys are kept
+    meta = {}
+    for line in lines:
+        key, sep, value = line.partition(':')
+        if sep and key.strip() and not line.startswith((' ', '#')):
+            key = key.strip().lower()
+            meta[key] = _parse_value(key, value)
+    return meta
+
+def split_front_matter(markdown):
+    # (metadata, body) for a markdown string; a header that is never closed
+    # isn't front matter
+    if not markdown.startswith(FENCE):
+        return {}, markdown
+    lines = markdown.split('\n')
+    if lines[0].rstrip() != FENCE:
+        return {}, markdown
+    for index in range(1, len(lines)):
+        if lines[index].rstrip() == FENCE:
+            return parse_front_matter(lines[1:index]), '\n'.join(lines[index + 1:])
+    return {}, markdown
+
+def read_front_matter(f):
+    # metadata from an open text file, leaving it positioned at the start of
+    # the body
+    start = f.tell()
+    if f.readline().rstrip() != FENCE:
+        f.seek(start)
+        return {}
+    lines = []
+    while True:
+        line = f.readline()
+        if not line:
+            f.seek(start)
+            return {}
+        if line.rstrip() == FENCE:
+            return parse_front_matter(line.rstrip('\n') for line in lines)
+        lines.append(line)
+
+def page_slots(meta):
+    # template slot values besides Title and Content
+    return {
+        'Date': meta.get('date', ''),
+        'Tags': ', '.join(meta.get('tags', ())),
+        'Summary': meta.get('summary', ''),
+    }
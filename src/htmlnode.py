@@ -1,4 +1,14 @@
+from types import MappingProxyType
+
+# shared read-only empties for text_leaf, so bare text runs don't each
+# carry their own empty list and dict; nodes built through the public
+# constructors get fresh ones they can add to
+_EMPTY_CHILDREN = ()
+_EMPTY_PROPS = MappingProxyType({})
+
 class HTMLNode:
+    __slots__ = ('tag', 'value', 'children', 'props')
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
@@ -8,23 +18,51 @@ class HTMLNode:
     def to_html(self):
         raise NotImplementedError("Subclasses must implement to_html method")
     
+    def iter_html(self):
+        # Iterative serializer: walks the tree with an explicit stack and
+        # yields fragments in document order, so deep trees neither build an
+        # intermediate string per level nor hit the recursion limit.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                yield node
+            elif isinstance(node, ParentNode):
+                node._check_renderable()
+                yield f"<{node.tag}{node.props_to_html()}>"
+                stack.append(f"</{node.tag}>")
+                stack.extend(reversed(node.children))
+            else:
+                yield node.to_html()
+    
+    def write_html(self, stream):
+        stream.writelines(self.iter_html())
+    
     def props_to_html(self):
+        if not self.props:
+            return ''
         props_str = ' '.join(f'{key}="{value}"' for key, value in self.props.items())
         return f' {props_str}' if props_str else ''
     
     def __eq__(self, other):
+        # an empty list and text_leaf's empty tuple both mean "no children"
         return (self.tag == other.tag and 
                 self.value == other.value and 
-                self.children == other.children and 
+                (self.children == other.children or not (self.children or other.children)) and 
                 self.props == other.props)
     
     def __repr__(self):
         print(f"HTMLNode(tag={self.tag}, value={self.value}, children={self.children}, props={self.props})")
         
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
-        super().__init__(tag, value, children=[], props=props)
-        
+        self.tag = tag
+        self.value = value
+        self.children = []
+        self.props = props if props is not None else {}
+
     def to_html(self):
         if self.value is None:
             raise ValueError("LeafNode must have a value to convert to HTML")
@@ -36,16 +74,32 @@ class LeafNode(HTMLNode):
         return f"LeafNode(tag={self.tag}, value={self.value}, props={self.props})"
     
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
-        super().__init__(tag, value=None, children=children, props=props)
+        self.tag = tag
+        self.value = None
+        self.children = children if children is not None else []
+        self.props = props if props is not None else {}
         
-    def to_html(self):
+    def _check_renderable(self):
         if self.tag is None:
             raise ValueError("ParentNode must have a tag to convert to HTML")
         if not self.children:
             raise ValueError("ParentNode must have children to convert to HTML")
-        children_html = ''.join(child.to_html() for child in self.children)
-        return f"<{self.tag}{self.props_to_html()}>{children_html}</{self.tag}>"
+    
+    def to_html(self):
+        return ''.join(self.iter_html())
     
     def __repr__(self):
-        return f"ParentNode(tag={self.tag}, children={self.children}, props={self.props})"
\ No newline at end of file
+        return f"ParentNode(tag={self.tag}, children={self.children}, props={self.props})"
+
+def text_leaf(value, _new=object.__new__, _cls=LeafNode):
+    # fast path for the most common node, a bare run of text: equivalent to
+    # LeafNode(None, value) without the constructor call overhead
+    node = _new(_cls)
+    node.tag = None
+    node.value = value
+    node.children = _EMPTY_CHILDREN
+    node.props = _EMPTY_PROPS
+    return node
@@ -1,4 +1,6 @@
 import re
+from bisect import bisect_right
+from itertools import accumulate
 from textnode import TextNode, TextType
 
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
@@ -45,12 +47,18 @@ def split_nodes_image(old_nodes):
         if not images:
             new_nodes.append(old_node)
             continue
+        # find from a moving position rather than splitting the rest of the
+        # text again for every image, which is quadratic in their number
+        text = old_node.text
+        pos = 0
         for alt_text, url in images:
-            sections = old_node.text.split(f"![{alt_text}]({url})", 1)
-            if sections[0]:
-                new_nodes.append(TextNode(sections[0], TextType.TEXT))
+            markup = f"![{alt_text}]({url})"
+            start = text.index(markup, pos)
+            if start > pos:
+                new_nodes.append(TextNode(text[pos:start], TextType.TEXT))
             new_nodes.append(TextNode(alt_text, TextType.IMAGE, url))
-            old_node.text = sections[1]
+            pos = start + len(markup)
+        old_node.text = text[pos:]
         if old_node.text:
             new_nodes.append(TextNode(old_node.text, TextType.TEXT))
     return new_nodes
@@ -67,22 +75,117 @@ def split_nodes_link(old_nodes):
         if not links:
             new_nodes.append(old_node)
             continue
+        text = old_node.text
+        pos = 0
         for link_text, url in links:
-            sections = old_node.text.split(f"[{link_text}]({url})", 1)
-            if sections[0]:
-                new_nodes.append(TextNode(sections[0], TextType.TEXT))
+            markup = f"[{link_text}]({url})"
+            start = text.index(markup, pos)
+            if start > pos:
+                new_nodes.append(TextNode(text[pos:start], TextType.TEXT))
             new_nodes.append(TextNode(link_text, TextType.LINK, url))
-            old_node.text = sections[1]
+            pos = start + len(markup)
+        old_node.text = text[pos:]
         if old_node.text:
             new_nodes.append(TextNode(old_node.text, TextType.TEXT))
     return new_nodes
 
-def text_to_text_nodes(text):
-    nodes = [TextNode(text, TextType.TEXT)]
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+DELIMITER_PATTERN = re.compile(r"\*\*|_|`")
+DELIMITER_TYPES = {"**": TextType.BOLD, "_": TextType.ITALIC, "`": TextType.CODE}
+# images and links in one alternation; group 1/2 is an image, 3/4 a link
+IMAGE_OR_LINK_PATTERN = re.compile(
+    r"!\[([^\[\]]*)\]\(([^\(\)]*)\)|(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
+)
+
+def _append_plain_text(nodes, text):
+    # split a run of unformatted text into text, image and link nodes
+    pos = 0
+    for match in IMAGE_OR_LINK_PATTERN.finditer(text):
+        if match.start() > pos:
+            nodes.append(TextNode(text[pos:match.start()], TextType.TEXT))
+        if match.group(2) is not None:
+            # the split pipeline drops images with empty alt text (the link
+            # pass skips every node whose text is empty), so we do too
+            if match.group(1):
+                nodes.append(TextNode(match.group(1), TextType.IMAGE, match.group(2)))
+        else:
+            nodes.append(TextNode(match.group(3), TextType.LINK, match.group(4)))
+        pos = match.end()
+    if pos < len(text):
+        nodes.append(TextNode(text[pos:], TextType.TEXT))
+
+def tokenize_inline(text):
+    # Single left-to-right scan producing the same nodes as running
+    # split_nodes_delimiter for **, _ and ` followed by split_nodes_image and
+    # split_nodes_link. That pipeline gives ** precedence over _ over `, so
+    # inside bold the other delimiters are literal, inside italic backticks
+    # are literal, and a higher-precedence delimiter that shows up while a
+    # lower one is still open leaves the lower one unclosed.
+    nodes = []
+    open_delimiter = None
+    start = 0
+    for match in DELIMITER_PATTERN.finditer(text):
+        delimiter = match.group()
+        if open_delimiter is None:
+            if match.start() > start:
+                _append_plain_text(nodes, text[start:match.start()])
+            open_delimiter = delimiter
+            start = match.end()
+        elif delimiter == open_delimiter:
+            if match.start() > start:
+                nodes.append(TextNode(text[start:match.start()], DELIMITER_TYPES[delimiter]))
+            open_delimiter = None
+            start = match.end()
+        elif delimiter == "**" or (delimiter == "_" and open_delimiter == "`"):
+            raise ValueError("invalid markdown, formatted section not closed")
+    if open_delimiter is not None:
+        raise ValueError("invalid markdown, formatted section not closed")
+    if start < len(text):
+        _append_plain_text(nodes, text[start:])
     return nodes
+
+def text_to_text_nodes(text):
+    return tokenize_inline(text)
+
+def node_markup(node):
+    # the source text a node was parsed from; None for plain text
+    match node.text_type:
+        case TextType.BOLD:
+            return f"**{node.text}**"
+        case TextType.ITALIC:
+            return f"_{node.text}_"
+        case TextType.CODE:
+            return f"`{node.text}`"
+        case TextType.LINK:
+            return f"[{node.text}]({node.url})"
+        case TextType.IMAGE:
+            return f"![{node.text}]({node.url})"
+    return None
+
+def node_refs(lines, nodes):
+    # [url, line, is_image] for the link and image nodes parsed from a
+    # block's lines, line counted from 0. Each node's markup is looked for
+    # in the joined lines from where the last one ended; markup that isn't
+    # there as written (it wraps across quote lines, say) puts the rest of
+    # the block's refs on its first line rather than searching on.
+    if not any(node.text_type is TextType.LINK or node.text_type is TextType.IMAGE for node in nodes):
+        return []
+    text = " ".join(lines)
+    ends = list(accumulate(len(line) + 1 for line in lines))
+    refs = []
+    pos = 0
+    for node in nodes:
+        if node.text_type is TextType.TEXT:
+            continue
+        line = 0
+        if pos is not None:
+            markup = node_markup(node)
+            start = text.find(markup, pos)
+            if start == -1:
+                pos = None
+            else:
+                pos = start + len(markup)
+                line = bisect_right(ends, start)
+        if node.text_type is TextType.LINK or node.text_type is TextType.IMAGE:
+            refs.append([node.url, line, node.text_type is TextType.IMAGE])
+    return refs
         
\ No newline at end of file
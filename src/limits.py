@@ -0,0 +1,121 @@
+import contextlib
+import os
+import signal
+import threading
+
+# Per-page resource limits, so one huge or pathological page fails on its
+# own instead of stalling the build. The time limit is a SIGALRM watchdog;
+# signals only reach the main thread, so off it (and where setitimer is
+# missing) only the size limit applies. Worker processes run their tasks
+# on their main thread.
+
+DEFAULT_MAX_PAGE_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_PAGE_SECONDS = 30.0
+
+# the stage a page build was in, by the module of the innermost frame that
+# has one; textnode is left out since both parsing and rendering use it
+MODULE_STAGES = {
+    'frontmatter': 'front matter',
+    'block_markdown': 'block parsing',
+    'inline_markdown': 'inline parsing',
+    'htmlnode': 'rendering',
+    'template': 'template',
+    'depgraph': 'link extraction',
+    'output': 'write',
+}
+
+class PageLimitError(Exception):
+    pass
+
+class Watchdog:
+    # the clock of one page's time limit, as handed out by
+    # PageLimits.watchdog. paused() stops it while output is written or the
+    # cache updated, so the alarm can't go off halfway through either, and
+    # running() restarts it, inside paused(), while a streamed page's next
+    # fragments are produced. Unarmed, both do nothing.
+    def __init__(self, armed=False):
+        self.armed = armed
+        self.stopped = False
+        self.remaining = 0
+
+    def _stop(self):
+        self.remaining, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+        self.stopped = True
+
+    def _start(self):
+        self.stopped = False
+        if self.remaining:
+            signal.setitimer(signal.ITIMER_REAL, self.remaining)
+
+    @contextlib.contextmanager
+    def paused(self):
+        if not self.armed or self.stopped:
+            yield
+            return
+        self._stop()
+        try:
+            yield
+        finally:
+            self._start()
+
+    def running(self, fragments, chunk_chars=64 * 1024):
+        # fragments are passed on joined into chunks of about chunk_chars,
+        # so the clock isn't started and stopped for every one; outside
+        # paused() the clock is already running
+        if not self.armed or not self.stopped:
+            yield from fragments
+            return
+        fragments = iter(fragments)
+        while True:
+            chunk = []
+            size = 0
+            self._start()
+            try:
+                for fragment in fragments:
+                    chunk.append(fragment)
+                    size += len(fragment)
+                    if size >= chunk_chars:
+                        break
+            finally:
+                self._stop()
+            if not chunk:
+                return
+            yield ''.join(chunk)
+
+def stage_of(frame):
+    while frame is not None:
+        stage = MODULE_STAGES.get(frame.f_globals.get('__name__'))
+        if stage is not None:
+            return stage
+        frame = frame.f_back
+    return 'page build'
+
+class PageLimits:
+    # 0 turns a limit off
+    def __init__(self, max_bytes=DEFAULT_MAX_PAGE_BYTES, max_seconds=DEFAULT_MAX_PAGE_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+    def check_size(self, path):
+        size = os.path.getsize(path)
+        if self.max_bytes and size > self.max_bytes:
+            raise PageLimitError(f"{size} bytes is over the {self.max_bytes} byte page size limit (stage: read)")
+
+    @contextlib.contextmanager
+    def watchdog(self):
+        if (not self.max_seconds or not hasattr(signal, 'setitimer')
+                or threading.current_thread() is not threading.main_thread()):
+            yield Watchdog()
+            return
+
+        def expired(signum, frame):
+            raise PageLimitError(f"took longer than the {self.max_seconds:g}s page time limit "
+                                 f"(stage: {stage_of(frame)})")
+
+        previous = signal.signal(signal.SIGALRM, expired)
+        signal.setitimer(signal.ITIMER_REAL, self.max_seconds)
+        try:
+            yield Watchdog(True)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
@@ -0,0 +1,145 @@
+import os
+import posixpath
+import re
+from urllib.parse import unquote, urlsplit
+
+# Checks every link and image of the built site against an index of the
+# output's URL paths. Page references come from the 'refs' the build
+# already extracted into the manifest, so unchanged pages aren't read
+# again; only the template files and static CSS sources are scanned here.
+# What each page's refs came to is kept in manifest['linkcheck']: its
+# broken refs, and the static files it uses, for the orphan report.
+#
+#   {"blog/tom/index.md": {"broken": [[2, "/missing.png", "no such page or file"]],
+#                          "uses": ["images/a.png"]}}
+#
+# Pages that use no static file and have nothing broken aren't listed. The
+# next build only checks a page again when its refs or output changed, a
+# static file it used went away, or something new appeared while it had
+# broken refs; the page links themselves aren't kept, so every page is
+# checked again when a page goes away.
+
+URL_ATTRIBUTE_PATTERN = re.compile(r'\b(?:href|src)="([^"]*)"')
+CSS_URL_PATTERN = re.compile(r'url\(\s*[\'"]?([^\'")]+)')
+
+def output_index(manifest):
+    # URL path -> output file, for every page and static file; a page at
+    # blog/tom/index.html also answers to /blog/tom
+    index = {}
+    for section in ('assets', 'pages'):
+        for record in manifest[section].values():
+            output = '/' + record['output'].replace(os.sep, '/')
+            index[output] = record['output']
+            if posixpath.basename(output) == 'index.html':
+                index[posixpath.dirname(output)] = record['output']
+    return index
+
+def resolve(url, base_dir):
+    # the URL path a reference from a file in base_dir points at, or None
+    # when it leaves the site or only has a fragment or query
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    return posixpath.normpath(posixpath.join(base_dir, unquote(parts.path)))
+
+def _scan(path, pattern):
+    # (line number, url) for each match in a text file
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            for match in pattern.finditer(line):
+                yield number, match.group(1)
+
+class LinkChecker:
+    def __init__(self, manifest, basepath='/'):
+        self.index = output_index(manifest)
+        self.assets = {record['output'] for record in manifest['assets'].values()}
+        self.basepath = basepath
+        self.used = set()
+        self.broken = []
+
+    def follow(self, url, base_dir):
+        # (output, None) for a URL that leads to a page or file of the
+        # site, (None, reason) for one that leads nowhere and (None, None)
+        # for one that leaves the site
+        if url.startswith('//') and self.basepath != '/':
+            # rewrite_basepath turns href="//host/..." into a site path too
+            return None, f"rewritten to {self.basepath}{url[1:]}"
+        target = resolve(url, base_dir)
+        if target is None:
+            return None, None
+        if target in self.index:
+            return self.index[target], None
+        return None, "no such page or file"
+
+    def check(self, source, line, url, base_dir):
+        output, reason = self.follow(url, base_dir)
+        if output is not None:
+            self.used.add(output)
+        elif reason is not None:
+            self.broken.append((source, line, url, reason))
+
+    def check_page(self, record):
+        # a page's entry for manifest['linkcheck']
+        base_dir = posixpath.dirname('/' + record['output'].replace(os.sep, '/'))
+        broken, uses = [], set()
+        for url, line, _ in record.get('refs', ()):
+            output, reason = self.follow(url, base_dir)
+            if output in self.assets:
+                uses.add(output)
+            elif reason is not None:
+                broken.append([line, url, reason])
+        return {'broken': broken, 'uses': sorted(uses)}
+
+NOTHING_CHECKED = {'broken': [], 'uses': []}
+
+def _recheck(record, old_record, result, appeared, gone_assets):
+    return (old_record is None or old_record['output'] != record['output']
+            or old_record.get('refs') != record.get('refs')
+            or (appeared and result['broken']) or not gone_assets.isdisjoint(result['uses']))
+
+def check_site(manifest, content_dir, static_dir, template_files, basepath='/', previous=None):
+    # returns (broken, orphans, results): broken is a list of (source file,
+    # line, url, reason), orphans the static files nothing refers to and
+    # results the pages' entries for manifest['linkcheck']. previous is
+    # the manifest of the last build; its entries are reused where they
+    # still hold.
+    checker = LinkChecker(manifest, basepath)
+    old_results = None
+    if previous is not None and previous.get('basepath') == basepath:
+        old_results = previous.get('linkcheck')
+    if old_results is not None:
+        old_index = output_index(previous)
+        appeared = checker.index.keys() - old_index.keys()
+        gone = set(old_index.values()) - set(checker.index.values())
+        gone_assets = gone & {record['output'] for record in previous['assets'].values()}
+        if gone - gone_assets:
+            old_results = None
+    results = {}
+    for rel_path, record in sorted(manifest['pages'].items()):
+        result = None
+        if old_results is not None:
+            result = old_results.get(rel_path, NOTHING_CHECKED)
+            if _recheck(record, previous['pages'].get(rel_path), result, appeared, gone_assets):
+                result = None
+        if result is None:
+            result = checker.check_page(record)
+        if result['broken'] or result['uses']:
+            results[rel_path] = result
+        source = os.path.join(content_dir, rel_path)
+        checker.broken.extend((source, line, url, reason) for line, url, reason in result['broken'])
+        checker.used.update(result['uses'])
+    for path in template_files:
+        for line, url in _scan(path, URL_ATTRIBUTE_PATTERN):
+            # a relative URL in the template means something else on every
+            # page, and slots are filled in per page
+            if url.startswith('/') and '{{' not in url:
+                checker.check(path, line, url, '/')
+    for rel_path, record in sorted(manifest['assets'].items()):
+        if rel_path.endswith('.css'):
+            base_dir = posixpath.dirname('/' + record['output'].replace(os.sep, '/'))
+            source = os.path.join(static_dir, rel_path)
+            for line, url in _scan(source, CSS_URL_PATTERN):
+                checker.check(source, line, url.strip(), base_dir)
+    orphans = [os.path.join(static_dir, rel_path) for rel_path, record in sorted(manifest['assets'].items())
+               if record['output'] not in checker.used]
+    return checker.broken, orphans, results
@@ -1,10 +1,33 @@
+import argparse
+import asyncio
+import contextlib
 import os
 import sys
-from block_markdown import markdown_to_html_node
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from assets import changed_files, copy_file, remove_output, sync_directory, walk_files
+from cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, RenderCache
+from compress import DEFAULT_MIN_RATIO, compress_outputs, remove_compressed
+from block_markdown import (PageFacts, block_memo, block_type_from_lines, create_html_node_from_lines,
+                            iter_markdown_html, iter_numbered_block_lines)
+from inline_markdown import node_refs
+from depgraph import explain
+from frontmatter import page_slots, read_front_matter, split_front_matter
+from htmlnode import ParentNode
+from limits import DEFAULT_MAX_PAGE_BYTES, DEFAULT_MAX_PAGE_SECONDS, PageLimits, Watchdog
+from linkcheck import check_site
+from minify import MINIFY_VERSION, Minifier
+from manifest import empty_manifest, file_record, load_manifest, record_changed, save_manifest
+from output import write_output
+from publish import PREVIOUS_SUFFIX, prepare_staging, rollback, sibling, swap_in
+from pageindex import DEFAULT_INDEX_PATH, PageIndex
+from search import LEGACY_STATE_NAME, SearchIndex, node_terms, remove_search_index
+from profiling import BuildProfile, StageTimer, profile_call
+from template import Template, rewrite_basepath
 from textnode import TextNode, TextType
+from watch import LiveReload, serve, watch
 
-def copy_directory(src, dest):
-    # we want to write a recursive copy function that first deletes all existing files in the destination directory and then copy all files, subdirectories, nested files, etc. And also log out each file path that is copied for debugging
+def clear_directory(dest):
     if os.path.exists(dest):
         for root, dirs, files in os.walk(dest, topdown=False):
             for name in files:
@@ -15,6 +38,10 @@ def copy_directory(src, dest):
                 dir_path = os.path.join(root, name)
                 os.rmdir(dir_path)
                 print(f"Deleted directory: {dir_path}")
+
+def copy_directory(src, dest):
+    # we want to write a recursive copy function that first deletes all existing files in the destination directory and then copy all files, subdirectories, nested files, etc. And also log out each file path that is copied for debugging
+    clear_directory(dest)
     os.makedirs(dest, exist_ok=True)
     for root, dirs, files in os.walk(src):
         relative_path = os.path.relpath(root, src)
@@ -23,40 +50,225 @@ def copy_directory(src, dest):
         for name in files:
             src_file = os.path.join(root, name)
             dest_file = os.path.join(dest_dir, name)
-            with open(src_file, 'rb') as fsrc:
-                with open(dest_file, 'wb') as fdst:
-                    fdst.write(fsrc.read())
+            copy_file(src_file, dest_file)
             print(f"Copied file: {src_file} to {dest_file}")
-            
+
 def extract_title(markdown):
-    lines = markdown.splitlines()
+    # markdown may be a string or an iterable of lines such as an open file
+    lines = markdown.splitlines() if isinstance(markdown, str) else markdown
     for line in lines:
         if line.startswith('# '):
             return line[2:].strip()
     raise ValueError("No title found in markdown")
 
+def page_title(meta, body):
+    # a front matter title wins over the first heading
+    return meta.get('title') or extract_title(body)
+
+def _kept(fragments, kept):
+    for fragment in fragments:
+        kept.append(fragment)
+        yield fragment
+
+def page_fragments(markdown, title, template, meta=None, kept=None, facts=None):
+    # the page as a stream of HTML fragments; blocks are parsed and rendered
+    # one at a time as the template pulls on the Content slot. kept, a
+    # list, collects the content fragments before the basepath is applied,
+    # and facts, a PageFacts, the links and images rendered.
+    content = iter_markdown_html(markdown, block_memo, facts)
+    if kept is not None:
+        content = _kept(content, kept)
+    if template.basepath != '/':
+        content = (rewrite_basepath(fragment, template.basepath) for fragment in content)
+    return template.stream(Title=title, Content=content, **page_slots(meta or {}))
+
+def read_markdown(from_path):
+    with open(from_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def render_page(from_path, template):
+    meta, body = split_front_matter(read_markdown(from_path))
+    return ''.join(page_fragments(body, page_title(meta, body), template, meta))
+
+def write_page(dest_path, html):
+    # write to dest_path and create directories as needed; html may be a
+    # string or an iterable of fragments. Returns False, leaving the file
+    # and its mtime alone, when it already holds this page.
+    return write_output(dest_path, html)
+
+def _written(written):
+    # (unchanged, written) counts for the build stats
+    return (0, 1) if written else (1, 0)
+
+def body_first_line(markdown, body):
+    # line number in the source file of the first line of the body
+    return markdown.count('\n', 0, len(markdown) - len(body)) + 1
+
+def render_content(markdown, terms=False):
+    # the cacheable part of a page: title, content HTML before the basepath
+    # is applied, its links and images and its front matter; with terms,
+    # also its search term counts
+    meta, body = split_front_matter(markdown)
+    facts = PageFacts(body_first_line(markdown, body), node_terms if terms else None)
+    entry = {'title': page_title(meta, body), 'content': ''.join(iter_markdown_html(body, block_memo, facts)),
+             'refs': facts.refs, 'meta': meta}
+    if terms:
+        entry['terms'] = facts.term_counts()
+    return entry
+
+def _usable(entry, terms):
+    # an entry cached by a build without search has no terms
+    return entry is not None and (not terms or 'terms' in entry)
+
+def _search_info(entry):
+    return {'title': entry['title'], 'terms': entry['terms']}
+
+def load_page(from_path, cache=None, source_hash=None, terms=False):
+    # the reading half of a page build: (cache entry, None) on a render cache
+    # hit, otherwise (None, markdown source)
+    if cache is not None and source_hash is not None:
+        entry = cache.get(source_hash)
+        if _usable(entry, terms):
+            return entry, None
+    return None, read_markdown(from_path)
+
+def render_loaded(template, entry, markdown, terms=False):
+    # the CPU half: returns the page HTML and the cacheable entry
+    if entry is None:
+        entry = render_content(markdown, terms)
+    content = rewrite_basepath(entry['content'], template.basepath)
+    return template.render(Title=entry['title'], Content=content, **page_slots(entry['meta'])), entry
+
+def build_page(from_path, dest_path, template, cache=None, source_hash=None, terms=False, watchdog=None):
+    # returns a dict of facts about the build: the page's refs (its links
+    # and images),
+    # with terms its title and search terms, and e.g. render cache (hits,
+    # misses). The page time limit's watchdog, if any, is paused while the
+    # output is written and the cache updated.
+    watchdog = watchdog or Watchdog()
+    info = {}
+    caching = cache is not None and source_hash is not None
+    if caching:
+        entry = cache.get(source_hash)
+        usable = _usable(entry, terms)
+        info['render_cache'] = (1, 0) if usable else (0, 1)
+        if usable:
+            html, _ = render_loaded(template, entry, None)
+            with watchdog.paused():
+                info['unchanged_output'] = _written(write_page(dest_path, html))
+            info['refs'] = entry['refs']
+            if terms:
+                info['search'] = _search_info(entry)
+            return info
+    # several passes over the open source file rather than reading it into
+    # memory; on a cache miss the content is kept as it streams by, for the
+    # cache entry
+    kept = [] if caching else None
+    with open(from_path, 'r', encoding='utf-8') as f:
+        meta = read_front_matter(f)
+        body_start = f.tell()
+        # the header is a few lines; count them for the refs' line numbers
+        f.seek(0)
+        first_line = 1
+        while f.tell() != body_start and f.readline():
+            first_line += 1
+        title = page_title(meta, f)
+        f.seek(body_start)
+        facts = PageFacts(first_line, node_terms if terms else None)
+        # the clock only runs while the next fragment is rendered
+        with watchdog.paused():
+            fragments = watchdog.running(page_fragments(f, title, template, meta, kept, facts))
+            info['unchanged_output'] = _written(write_page(dest_path, fragments))
+        if 'Content' not in template.slot_names:
+            # the template never pulled on the content; its refs, terms
+            # and the cache entry need it
+            f.seek(body_start)
+            content = ''.join(iter_markdown_html(f, block_memo, facts))
+            if caching:
+                kept.append(content)
+        info['refs'] = facts.refs
+        if terms:
+            info['search'] = {'title': title, 'terms': facts.term_counts()}
+    if caching:
+        entry = {'title': title, 'content': ''.join(kept), 'refs': info['refs'], 'meta': meta}
+        if terms:
+            entry['terms'] = info['search']['terms']
+        with watchdog.paused():
+            cache.put(source_hash, entry)
+    return info
+
+def build_page_profiled(from_path, dest_path, template, cache=None, source_hash=None, terms=False,
+                        watchdog=None):
+    # same output as build_page, but run stage by stage (the streaming path
+    # interleaves them) so each one can be timed
+    watchdog = watchdog or Watchdog()
+    timer = StageTimer()
+    info = {'stages': timer.stages}
+    entry = None
+    if cache is not None and source_hash is not None:
+        with timer.stage('cache'):
+            entry = cache.get(source_hash)
+            if not _usable(entry, terms):
+                entry = None
+        info['render_cache'] = (0, 1) if entry is None else (1, 0)
+    if entry is None:
+        with timer.stage('read'):
+            source = read_markdown(from_path)
+            meta, markdown = split_front_matter(source)
+        with timer.stage('blocks'):
+            blocks = list(iter_numbered_block_lines(markdown, body_first_line(source, markdown)))
+        with timer.stage('inline'):
+            title = page_title(meta, markdown)
+            find_terms = node_terms if terms else None
+            # memoized blocks are already HTML, refs and terms; the rest are
+            # parsed here, with their text nodes, and rendered in the next
+            # stage
+            parts = []
+            for start, lines in blocks:
+                key = "\n".join(lines)
+                entry = block_memo.get(key, find_terms)
+                nodes = None
+                if entry is None:
+                    nodes = []
+                    entry = create_html_node_from_lines(block_type_from_lines(lines), lines, nodes)
+                parts.append((key, start, lines, entry, nodes))
+        with timer.stage('render'):
+            facts = PageFacts(find_terms=find_terms)
+            fragments = []
+            for key, start, lines, entry, nodes in parts:
+                if nodes is not None:
+                    entry = (entry.to_html(), node_refs(lines, nodes),
+                             find_terms(nodes) if terms else None)
+                    block_memo.put(key, entry)
+                facts.add(start, entry[1], entry[2])
+                fragments.append(entry[0])
+            # the memoized fragments go in as plain string children
+            content = ParentNode("div", children=fragments).to_html()
+            refs = facts.refs
+            page_search = {'title': title, 'terms': facts.term_counts()} if terms else None
+        if cache is not None and source_hash is not None:
+            with timer.stage('cache'):
+                entry = {'title': title, 'content': content, 'refs': refs, 'meta': meta}
+                if terms:
+                    entry['terms'] = page_search['terms']
+                with watchdog.paused():
+                    cache.put(source_hash, entry)
+    else:
+        title, content, refs, meta = entry['title'], entry['content'], entry['refs'], entry['meta']
+        page_search = _search_info(entry) if terms else None
+    info['refs'] = refs
+    if terms:
+        info['search'] = page_search
+    with timer.stage('template'):
+        html = template.render(Title=title, Content=rewrite_basepath(content, template.basepath),
+                               **page_slots(meta))
+    with timer.stage('write'), watchdog.paused():
+        info['unchanged_output'] = _written(write_page(dest_path, html))
+    return info
+
 def generate_page(basepath, from_path, template_path, dest_path):
     print(f"Generating page from {from_path} to {dest_path} using template {template_path}")
-    # read markdown at from_path
-    with open(from_path, 'r', encoding='utf-8') as f:
-        markdown = f.read()
-    # read template at template_path
-    with open(template_path, 'r', encoding='utf-8') as f:
-        template = f.read()
-    # convert markdown to html node
-    content = markdown_to_html_node(markdown).to_html()
-    title = extract_title(markdown)
-    
-    template = template.replace('{{ Title }}', title)
-    template = template.replace('{{ Content }}', content)
-    
-    template = template.replace('href="/', f'href="{basepath}')
-    template = template.replace('src="/', f'src="{basepath}')
-    
-    # write to dest_path and create directories as needed
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    with open(dest_path, 'w', encoding='utf-8') as f:
-        f.write(template)
+    build_page(from_path, dest_path, Template.from_file(template_path, basepath))
 
 def generate_page_recursive(basepath, from_path, template_path, dest_path):
     if os.path.isdir(from_path):
@@ -68,10 +280,618 @@ def generate_page_recursive(basepath, from_path, template_path, dest_path):
         dest_file_path = dest_path[:-3] + '.html'  # change .md to .html
         generate_page(basepath,from_path, template_path, dest_file_path)
 
-def main():
-    basepath = sys.argv[1] if len(sys.argv) > 1 else '/'
-    copy_directory('static', 'docs')
-    generate_page_recursive(basepath, 'content', 'template.html', 'docs')
+def page_output_path(rel_path):
+    return rel_path[:-3] + '.html'  # change .md to .html
+
+def _no_phase(name):
+    return contextlib.nullcontext()
+
+class BuildError(Exception):
+    # failures maps each file that failed to its error
+    def __init__(self, failures, manifest=None, message=None):
+        self.failures = failures
+        self.manifest = manifest
+        super().__init__(message or f"{len(failures)} page(s) failed to build")
+
+class PageContext:
+    # everything needed to build a page besides the page itself; handed to
+    # each worker process once. limits is an optional PageLimits; terms
+    # collects each page's search terms.
+    def __init__(self, template, cache=None, profile=False, limits=None, terms=False):
+        self.template = template
+        self.cache = cache
+        self.profile = profile
+        self.limits = limits
+        self.terms = terms
+
+def _watchdog(limits):
+    return limits.watchdog() if limits is not None else contextlib.nullcontext(Watchdog())
+
+def _try_build(task, context):
+    # returns (error, info); errors are returned rather than raised so one
+    # bad page doesn't take down the rest of the batch
+    from_path, dest_path, source_hash = task
+    build_function = build_page_profiled if context.profile else build_page
+    hits, misses = block_memo.hits, block_memo.misses
+    try:
+        if context.limits is not None:
+            context.limits.check_size(from_path)
+        with _watchdog(context.limits) as watchdog:
+            info = build_function(from_path, dest_path, context.template, context.cache, source_hash,
+                                  context.terms, watchdog)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", {}
+    info['block_memo'] = (block_memo.hits - hits, block_memo.misses - misses)
+    return None, info
+
+_worker_context = None
+
+def _init_worker(context):
+    global _worker_context
+    _worker_context = context
+
+def _build_task(task):
+    return _try_build(task, _worker_context)
+
+def _render_with_stats(template, entry, markdown, limits=None, terms=False):
+    hits, misses = block_memo.hits, block_memo.misses
+    with _watchdog(limits):
+        html, entry = render_loaded(template, entry, markdown, terms)
+    return html, entry, (block_memo.hits - hits, block_memo.misses - misses)
+
+def _render_task(loaded):
+    return _render_with_stats(_worker_context.template, *loaded, _worker_context.limits, _worker_context.terms)
+
+def _store_page(dest_path, html, cache, source_hash, entry):
+    if cache is not None and source_hash is not None:
+        cache.put(source_hash, entry)
+    return write_page(dest_path, html)
+
+async def _build_page_async(task, context, in_flight, render):
+    # reads and writes run in threads, so while one page is being parsed
+    # the next ones are read and finished ones written
+    from_path, dest_path, source_hash = task
+    async with in_flight:
+        try:
+            if context.limits is not None:
+                context.limits.check_size(from_path)
+            entry, markdown = await asyncio.to_thread(load_page, from_path, context.cache, source_hash,
+                                                      context.terms)
+            html, new_entry, memo = await render(entry, markdown)
+            written = await asyncio.to_thread(_store_page, dest_path, html, context.cache,
+                                              source_hash if entry is None else None, new_entry)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}", {}
+    info = {'refs': new_entry['refs'], 'block_memo': memo,
+            'unchanged_output': _written(written)}
+    if context.cache is not None:
+        info['render_cache'] = (0, 1) if entry is None else (1, 0)
+    if context.terms:
+        info['search'] = _search_info(new_entry)
+    return None, info
+
+async def build_pages_async(tasks, context, jobs=1, concurrency=8):
+    # at most concurrency pages are in flight at once; parsing runs on the
+    # event loop thread, or in a process pool when jobs > 1
+    in_flight = asyncio.Semaphore(concurrency)
+    if jobs == 1:
+        async def render(entry, markdown):
+            return _render_with_stats(context.template, entry, markdown, context.limits, context.terms)
+        return await asyncio.gather(*(_build_page_async(task, context, in_flight, render) for task in tasks))
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(context,)) as executor:
+        async def render(entry, markdown):
+            return await loop.run_in_executor(executor, _render_task, (entry, markdown))
+        return await asyncio.gather(*(_build_page_async(task, context, in_flight, render) for task in tasks))
+
+def build_page_list(tasks, context, jobs=1, io_concurrency=0):
+    # tasks are (from_path, dest_path, source_hash); yields (task, (error,
+    # info)) in order. Workers write their own output so pages never cross
+    # process boundaries. io_concurrency > 0 selects the asyncio driver,
+    # which doesn't support profiling.
+    if io_concurrency > 0 and not context.profile and tasks:
+        yield from zip(tasks, asyncio.run(build_pages_async(tasks, context, jobs, io_concurrency)))
+        return
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield task, _try_build(task, context)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(context,)) as executor:
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        yield from zip(tasks, executor.map(_build_task, tasks, chunksize=chunksize))
+
+# per-page (hits, misses) counters summed into the build stats
+HIT_STATS = ('render_cache', 'block_memo', 'unchanged_output')
+
+def format_stats(stats):
+    parts = []
+    for name, (hits, misses) in sorted(stats.items()):
+        if hits + misses:
+            parts.append(f"{name} {hits}/{hits + misses} hits ({hits / (hits + misses):.0%})")
+    return ", ".join(parts)
+
+def collect_pages(content_dir):
+    return [rel_path for rel_path in walk_files(content_dir) if rel_path.endswith('.md')]
+
+def page_is_dirty(record, old, deps, changed_inputs):
+    # a page is rebuilt when its source, its output or anything in its
+    # template changed, or its last build failed; pages it links to only
+    # contribute their URL, which doesn't depend on their content
+    if record_changed(record, old) or old.get('failed') or old.get('deps') != deps:
+        return True
+    return any(path in changed_inputs for path in deps)
+
+def build_pages(context, content_dir, template_path, dest_dir, previous, rebuild_all, jobs=1,
+                profile=None, changed_inputs=(), io_concurrency=0, changed=None):
+    # changed_inputs are the template files and partials that differ from
+    # the previous build. changed, when the caller knows them (see
+    # changed_files), are the only files in content_dir that may differ
+    # from previous; the directory isn't walked and the other pages keep
+    # their records. Also returns the {'title', 'terms'} of each page
+    # built when the context collects search terms.
+    pages = {}
+    dirty = []
+    if changed is None:
+        sources = collect_pages(content_dir)
+    else:
+        sources = [rel_path for rel_path in previous if rel_path not in changed]
+        sources.extend(sorted(rel_path for rel_path in changed
+                              if rel_path.endswith('.md') and os.path.isfile(os.path.join(content_dir, rel_path))))
+    deps = context.template.dependencies
+    for rel_path in sources:
+        old = previous.get(rel_path)
+        if changed is not None and rel_path not in changed and not old.get('failed'):
+            pages[rel_path] = old
+            continue
+        src_file = os.path.join(content_dir, rel_path)
+        record = file_record(src_file, old)
+        record['output'] = page_output_path(rel_path)
+        record['deps'] = deps
+        dest_file = os.path.join(dest_dir, record['output'])
+        if (rebuild_all or page_is_dirty(record, old, deps, changed_inputs)
+                or not os.path.exists(dest_file)):
+            dirty.append(rel_path)
+        else:
+            record['refs'] = old.get('refs', [])
+        pages[rel_path] = record
+
+    failures = {}
+    stats = {}
+    searched = {}
+    tasks = [(os.path.join(content_dir, rel_path), os.path.join(dest_dir, pages[rel_path]['output']),
+              pages[rel_path]['hash'])
+             for rel_path in dirty]
+    for rel_path, ((src_file, dest_file, _), (error, info)) in zip(dirty, build_page_list(tasks, context, jobs, io_concurrency)):
+        if 'stages' in info:
+            profile.add_page(src_file, info['stages'])
+        for name in HIT_STATS:
+            if name in info:
+                hits, misses = stats.get(name, (0, 0))
+                stats[name] = (hits + info[name][0], misses + info[name][1])
+        if error is not None:
+            print(f"Error generating page {src_file}: {error}", file=sys.stderr)
+            failures[src_file] = error
+            if rel_path in previous:
+                # its last good output is still live, so the index, search
+                # and link check go on from that page's record; marked, so
+                # the next build retries it
+                pages[rel_path] = dict(previous[rel_path], failed=True)
+            else:
+                del pages[rel_path]
+            continue
+        pages[rel_path]['refs'] = info['refs']
+        if 'search' in info:
+            searched[rel_path] = info['search']
+        print(f"Generating page from {src_file} to {dest_file} using template {template_path}")
+
+    sources = set(sources)
+    for rel_path, old in previous.items():
+        if rel_path not in sources:
+            remove_output(dest_dir, old['output'])
+    return pages, failures, stats, searched
+
+# compiled templates kept between builds by a long-running process (watch
+# mode, the build daemon), by template path, basepath and minification
+_templates = {}
+
+def load_template(template_path, basepath, minify, previous_inputs):
+    # returns the template and the file records of everything it was read
+    # from; the template is compiled at most once per build, and not at all
+    # while a kept one's files are unchanged
+    key = (template_path, basepath, minify is not None)
+    if key in _templates:
+        template, records = _templates[key]
+        current = {path: file_record(path, record) for path, record in records.items()}
+        if not any(record_changed(current[path], records[path]) for path in records):
+            return template, current
+    template = Template.from_file(template_path, basepath, minify.html if minify is not None else None)
+    records = {path: file_record(path, previous_inputs.get(path)) for path in template.dependencies}
+    _templates[key] = (template, records)
+    return template, records
+
+def links_unchanged(manifest, previous, content_changed, static_changed, changed_inputs):
+    # whether the link check would find what it did last time: it reads the
+    # pages' refs, which pages and static files there are, the template and
+    # the stylesheets
+    if content_changed is None or static_changed is None or changed_inputs or 'linkcheck' not in previous:
+        return False
+    if any(os.path.splitext(rel_path)[1] == '.css' for rel_path in static_changed):
+        return False
+    if (manifest['pages'].keys() != previous['pages'].keys()
+            or manifest['assets'].keys() != previous['assets'].keys()):
+        return False
+    return all(manifest['pages'][rel_path].get('refs') == previous['pages'][rel_path].get('refs')
+               for rel_path in content_changed if rel_path in manifest['pages'])
+
+def build(basepath='/', static_dir='static', content_dir='content',
+          template_path='template.html', dest_dir='docs', clean=False, jobs=1,
+          checksum=False, link_assets=False, previous=None, profile=None, cache=None,
+          io_concurrency=0, publish=False, compress=False, compress_ratio=DEFAULT_MIN_RATIO,
+          minify=None, index=None, search=None, check_links=True, limits=None, changed=None, save=True):
+    # previous is the manifest of the last build when the caller still has it
+    # in memory, e.g. in watch mode; otherwise it is read from dest_dir.
+    # profile is an optional BuildProfile that collects per-stage timings and
+    # cache an optional RenderCache for parsed page content. io_concurrency
+    # > 0 overlaps page reads and writes with parsing, that many pages at once.
+    # publish builds into a staging copy of dest_dir and swaps it in only if
+    # every page built. compress writes .gz siblings of text outputs that
+    # shrink to at most compress_ratio of their size. minify is an optional
+    # Minifier for the template and static CSS. index is an optional
+    # PageIndex brought up to date with the pages' front matter. search is
+    # an optional SearchIndex, written sharded under dest_dir/search.
+    # check_links reports links and images that lead nowhere in the output
+    # and static files nothing refers to. limits is an optional PageLimits;
+    # a page over them fails like any other broken page. changed are the
+    # paths that changed since previous when the caller knows them (watch
+    # mode): only those sources are looked at, and the passes over the
+    # whole site are skipped when nothing they depend on changed. save=False
+    # leaves the manifest to a caller that keeps it in memory and writes it
+    # later; one left behind on disk only makes the next build redo work.
+    if publish:
+        staging = prepare_staging(dest_dir, seed=not clean)
+        # the staged manifest, not one kept in memory: it matches the live site
+        manifest = build(basepath, static_dir, content_dir, template_path, staging, jobs=jobs,
+                         checksum=checksum, link_assets=link_assets, profile=profile, cache=cache,
+                         io_concurrency=io_concurrency, compress=compress,
+                         compress_ratio=compress_ratio, minify=minify, index=index,
+                         search=search, check_links=check_links, limits=limits)
+        swap_in(staging, dest_dir)
+        return manifest
+    phase = profile.phase if profile is not None else _no_phase
+    if clean:
+        clear_directory(dest_dir)
+        previous = empty_manifest()
+    elif previous is None:
+        previous = load_manifest(dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
+
+    manifest = empty_manifest()
+    manifest['basepath'] = basepath
+    # the minifier's version, so a change to its output counts like turning
+    # it on or off (manifests from before the version was kept hold True)
+    manifest['minify'] = MINIFY_VERSION if minify is not None else False
+    minify_changed = previous.get('minify', False) != manifest['minify']
+    # a new basepath or a minification change touches every page
+    rebuild_all = previous['basepath'] != basepath or minify_changed
+    # the changed files under content_dir and static_dir; None where the
+    # directory is walked
+    content_changed = static_changed = None
+    if changed is not None and not rebuild_all:
+        content_changed = changed_files(content_dir, changed, previous['pages'])
+        static_changed = changed_files(static_dir, changed, previous['assets'])
+
+    with phase('assets'):
+        transforms = {'.css': minify.css_bytes} if minify is not None else None
+        previous_assets = previous['assets']
+        if minify_changed and minify is not None:
+            # outputs of an older minifier are redone too
+            previous_assets = {rel_path: dict(record, transformed=False)
+                               for rel_path, record in previous_assets.items()}
+        manifest['assets'] = sync_directory(static_dir, dest_dir, previous_assets, checksum=checksum,
+                                            link=link_assets, transforms=transforms, changed=static_changed)
+    with phase('pages'):
+        try:
+            template, manifest['inputs'] = load_template(template_path, basepath, minify, previous['inputs'])
+        except (OSError, ValueError) as e:
+            # e.g. a missing partial or an include cycle; nothing can be
+            # rendered, and the last good build stays the reference
+            error = f"{type(e).__name__}: {e}"
+            raise BuildError({template_path: error}, previous,
+                             f"template {template_path} failed to load: {error}")
+        changed_inputs = {path for path, record in manifest['inputs'].items()
+                          if record_changed(record, previous['inputs'].get(path))}
+        context = PageContext(template, cache, profile is not None, limits, search is not None)
+        manifest['pages'], failures, stats, searched = build_pages(
+            context, content_dir, template_path, dest_dir, previous['pages'], rebuild_all, jobs, profile,
+            changed_inputs, io_concurrency, None if changed_inputs else content_changed)
+    # nothing changed that the index and search read (page sources; pages
+    # that failed last time were built again), or that anything at all reads
+    pages_unchanged = (content_changed is not None and not content_changed
+                       and not any(record.get('failed') for record in previous['pages'].values()))
+    unchanged = pages_unchanged and static_changed is not None and not static_changed and not changed_inputs
+    if index is not None and not pages_unchanged:
+        with phase('index'):
+            index.update(content_dir, manifest['pages'])
+    if check_links and not links_unchanged(manifest, previous, content_changed, static_changed, changed_inputs):
+        with phase('links'):
+            broken, orphans, manifest['linkcheck'] = check_site(manifest, content_dir, static_dir,
+                                                                template.dependencies, basepath, previous)
+        for source, line, url, reason in broken:
+            print(f"Broken link in {source}:{line}: {url} ({reason})", file=sys.stderr)
+        for path in orphans:
+            print(f"Orphan asset: {path} (nothing links to it)")
+    elif check_links:
+        # the last build's report stands
+        manifest['linkcheck'] = previous['linkcheck']
+    if search is not None:
+        manifest['search'] = True
+        if not pages_unchanged or not previous.get('search'):
+            with phase('search'):
+                indexed, written = search.update(dest_dir, content_dir, manifest['pages'], basepath, searched)
+            if indexed or written:
+                print(f"Search index: {indexed} page(s) indexed, {written} shard(s) written")
+    elif previous.get('search') or os.path.exists(os.path.join(dest_dir, LEGACY_STATE_NAME)):
+        remove_search_index(dest_dir)
+    if compress:
+        if unchanged and 'compressed' in previous:
+            manifest['compressed'] = previous['compressed']
+        else:
+            with phase('compress'):
+                manifest['compressed'] = compress_outputs(dest_dir, previous.get('compressed'), compress_ratio)
+    else:
+        remove_compressed(dest_dir, previous.get('compressed', {}))
+    if unchanged:
+        # nothing was rendered or copied, and the manifest is the last one
+        if failures:
+            raise BuildError(failures, manifest)
+        return manifest
+    if cache is not None:
+        cache.prune()
+    if minify is not None and minify.cache is not None:
+        minify.cache.prune()
+    summary = format_stats(stats)
+    if summary:
+        print(f"Build stats: {summary}")
+    if save:
+        save_manifest(dest_dir, manifest)
+    if failures:
+        raise BuildError(failures, manifest)
+    return manifest
+
+def build_targets(targets, previous=None, **kwargs):
+    # targets are (basepath, dest_dir) pairs built from the same sources.
+    # Render cache entries are stored before the basepath is applied, so
+    # every page is parsed for the first target only and the rest just
+    # redo the basepath rewrite; without a cache a temporary one is used.
+    # previous and the result map dest_dir to its manifest.
+    previous = previous or {}
+    manifests = {}
+    failures = {}
+    messages = set()
+    with contextlib.ExitStack() as stack:
+        if len(targets) > 1 and kwargs.get('cache') is None:
+            kwargs['cache'] = RenderCache(stack.enter_context(tempfile.TemporaryDirectory()))
+        for basepath, dest_dir in targets:
+            if len(targets) > 1:
+                print(f"Building {dest_dir} with basepath {basepath}")
+            try:
+                manifests[dest_dir] = build(basepath, dest_dir=dest_dir,
+                                            previous=previous.get(dest_dir), **kwargs)
+            except BuildError as e:
+                manifests[dest_dir] = e.manifest
+                failures.update(e.failures)
+                messages.add(str(e))
+    if failures:
+        # the same message everywhere (one target, or one template error
+        # for all of them) is passed on; otherwise it's recounted
+        raise BuildError(failures, manifests, messages.pop() if len(messages) == 1 else None)
+    return manifests
+
+def watch_and_serve(targets, build_kwargs, port, host):
+    # serves the first target
+    state = {'manifests': None, 'failed': False}
+
+    def rebuild(changed=None):
+        # changed are the paths the watcher saw change; only those are
+        # looked at, unless the last build failed and may not have taken
+        # in everything before it stopped. Only the first build writes
+        # the manifests; the rest are written when the watch stops.
+        # Returns whether the build succeeded, so a failed one doesn't
+        # reload the browser.
+        if state['failed']:
+            changed = None
+        try:
+            state['manifests'] = build_targets(targets, previous=state['manifests'], changed=changed,
+                                               save=state['manifests'] is None, **build_kwargs)
+        except BuildError as e:
+            state['manifests'] = e.manifest
+            state['failed'] = True
+            print(f"Build failed: {e}", file=sys.stderr)
+            return False
+        state['failed'] = False
+        return True
+
+    rebuild()
+    build_kwargs['clean'] = False
+    livereload = LiveReload()
+    dest_dir = targets[0][1]
+    server = serve(dest_dir, port, livereload, host)
+    print(f"Serving {dest_dir} at http://{host}:{port}/")
+    paths = [build_kwargs.get(key, default) for key, default in
+             (('content_dir', 'content'), ('static_dir', 'static'), ('template_path', 'template.html'))]
+    # partials too; ones added to the template later need a restart
+    paths.extend(path for path in state['manifests'][dest_dir]['inputs'] if path not in paths)
+    try:
+        watch(rebuild, paths, livereload)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        for target_dir, manifest in state['manifests'].items():
+            save_manifest(target_dir, manifest)
+
+DEFAULT_PROFILE_REPORT = 'build-profile.json'
+
+def profile_page(from_path, template, report_path):
+    prof_path = os.path.splitext(report_path)[0] + '.prof'
+    print(f"Profiling {from_path} (cProfile stats in {prof_path})")
+    print(profile_call(lambda: render_page(from_path, template), prof_path))
+
+def list_pages(index, tag=None):
+    for page in index.pages(tag):
+        print(f"{page['date'] or '-':<12}{page['title'] or '(untitled)'}  {page['url']}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site from content/ and static/")
+    parser.add_argument('basepath', nargs='?', default='/')
+    parser.add_argument('--target', action='append', metavar='BASEPATH=DIR', dest='targets',
+                        help="build the site for BASEPATH into DIR; repeat to produce several "
+                             "variants from one parse (default: BASEPATH=docs)")
+    parser.add_argument('--clean', action='store_true',
+                        help="ignore the build manifest and rebuild everything")
+    parser.add_argument('--checksum', action='store_true',
+                        help="compare static assets by content hash, not just size and mtime")
+    parser.add_argument('--link-assets', action='store_true',
+                        help="hardlink static assets into the output instead of copying them")
+    parser.add_argument('--watch', action='store_true',
+                        help="rebuild on changes and serve the output with live reload")
+    parser.add_argument('--port', type=int, default=8888, help="port for --watch (default 8888)")
+    parser.add_argument('--host', default='127.0.0.1', help="address for --watch")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of worker processes for page generation (0 = one per CPU)")
+    parser.add_argument('--io-concurrency', type=int, default=0, metavar='N',
+                        help="overlap reading and writing pages with parsing, up to N pages in flight "
+                             "(asyncio driver; 0 = off)")
+    parser.add_argument('--publish', action='store_true',
+                        help="build into a staging copy of the output and swap it in atomically, "
+                             "keeping the previous generation for --rollback")
+    parser.add_argument('--rollback', action='store_true',
+                        help="swap the previous published generation back in, then exit")
+    parser.add_argument('--gzip', action='store_true',
+                        help="write max-level .gz siblings of HTML, CSS and other text outputs")
+    parser.add_argument('--gzip-min-ratio', type=float, default=DEFAULT_MIN_RATIO, metavar='RATIO',
+                        help="only keep a .gz at most RATIO times the original size "
+                             f"(default {DEFAULT_MIN_RATIO})")
+    parser.add_argument('--minify', action='store_true',
+                        help="strip insignificant whitespace and comments from pages and static CSS")
+    parser.add_argument('--max-page-size', type=float, default=DEFAULT_MAX_PAGE_BYTES / (1024 * 1024),
+                        metavar='MB', help="fail pages whose source is larger than this (0 = no limit)")
+    parser.add_argument('--page-timeout', type=float, default=DEFAULT_MAX_PAGE_SECONDS, metavar='SECONDS',
+                        help="fail pages that take longer than this to build (0 = no limit)")
+    parser.add_argument('--no-link-check', dest='check_links', action='store_false',
+                        help="don't report broken internal links and images or unused static files")
+    parser.add_argument('--search', action='store_true',
+                        help="write a full-text search index, sharded by term prefix, under search/")
+    parser.add_argument('--no-index', dest='index', action='store_false',
+                        help="don't update the SQLite index of page titles and front matter")
+    parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH,
+                        help=f"page index location (default {DEFAULT_INDEX_PATH})")
+    parser.add_argument('--list', nargs='?', const='', metavar='TAG',
+                        help="list indexed pages, newest first, optionally only those tagged TAG, then exit")
+    parser.add_argument('--explain', metavar='PATH',
+                        help="show what a page (source, output or URL) or template file depends on "
+                             "and what depends on it, as of the last build, then exit")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="don't use the on-disk render cache")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f"render cache location (default {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), metavar='MB',
+                        help="evict least recently used cache entries beyond this size")
+    parser.add_argument('--profile', nargs='?', metavar='REPORT', const=DEFAULT_PROFILE_REPORT,
+                        default=os.environ.get('BUILD_PROFILE') or None,
+                        help="time each stage of each generated page and write a JSON report "
+                             f"(default {DEFAULT_PROFILE_REPORT}; also enabled by BUILD_PROFILE=path). "
+                             "Combine with --clean to profile every page.")
+    parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                        help="number of slowest pages to print with --profile")
+    parser.add_argument('--profile-page', metavar='PATH',
+                        help="also run cProfile and tracemalloc on this markdown file")
+    args = parser.parse_args(argv)
+    if args.profile == '1':
+        args.profile = DEFAULT_PROFILE_REPORT
+    if args.profile_page and not args.profile:
+        args.profile = DEFAULT_PROFILE_REPORT
+    if args.targets:
+        if args.basepath != '/':
+            parser.error("give the basepath in each --target instead")
+        targets = []
+        for target in args.targets:
+            basepath, sep, dest_dir = target.partition('=')
+            if not sep or not basepath or not dest_dir:
+                parser.error(f"--target must look like BASEPATH=DIR, got {target!r}")
+            targets.append((basepath, dest_dir))
+        if len({dest_dir for _, dest_dir in targets}) != len(targets):
+            parser.error("each --target needs its own output directory")
+        args.targets = targets
+    else:
+        args.targets = [(args.basepath, 'docs')]
+    if args.explain and len(args.targets) > 1:
+        parser.error("--explain reads one output's manifest; give a single --target")
+    if args.max_page_size < 0 or args.page_timeout < 0:
+        parser.error("--max-page-size and --page-timeout must be >= 0")
+    if args.io_concurrency < 0:
+        parser.error("--io-concurrency must be >= 0")
+    if args.jobs < 0:
+        parser.error("--jobs must be >= 0")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+def build_options(args):
+    # the build() keyword arguments the command line asks for
+    cache = RenderCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache else None
+    minifier = None
+    if args.minify:
+        minify_cache = None
+        if args.cache:
+            minify_cache = RenderCache(os.path.join(os.path.dirname(args.cache_dir), 'minify'),
+                                       args.cache_size * 1024 * 1024, MINIFY_VERSION)
+        minifier = Minifier(minify_cache)
+    # the search index state lives next to the render cache
+    search = SearchIndex(os.path.join(os.path.dirname(args.cache_dir), 'search')) if args.search else None
+    return dict(clean=args.clean, jobs=args.jobs,
+                checksum=args.checksum, link_assets=args.link_assets, cache=cache,
+                io_concurrency=args.io_concurrency, publish=args.publish,
+                compress=args.gzip, compress_ratio=args.gzip_min_ratio, minify=minifier,
+                index=PageIndex(args.index_path) if args.index else None,
+                search=search, check_links=args.check_links,
+                limits=PageLimits(int(args.max_page_size * 1024 * 1024), args.page_timeout))
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.explain:
+        basepath, dest_dir = args.targets[0]
+        print(explain(load_manifest(dest_dir), args.explain, dest_dir=dest_dir, basepath=basepath))
+        return
+    if args.rollback:
+        # all targets or none, so the variants of the site stay in step
+        for _, dest_dir in args.targets:
+            if not os.path.isdir(sibling(dest_dir, PREVIOUS_SUFFIX)):
+                sys.exit(f"No previous generation of {dest_dir} to roll back to")
+        for _, dest_dir in args.targets:
+            rollback(dest_dir)
+        return
+    if args.list is not None:
+        return list_pages(PageIndex(args.index_path), args.list or None)
+    build_kwargs = build_options(args)
+    if args.watch:
+        return watch_and_serve(args.targets, build_kwargs, args.port, args.host)
+    profile = BuildProfile() if args.profile else None
+    try:
+        build_targets(args.targets, profile=profile, **build_kwargs)
+    except BuildError as e:
+        print(f"Build failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if profile is not None:
+            profile.write(args.profile)
+            print(profile.summary(args.profile_top))
+            print(f"Profile report written to {args.profile}")
+    if args.profile_page:
+        profile_page(args.profile_page, Template.from_file('template.html', args.targets[0][0]),
+                     args.profile)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.manifest.json'
+MANIFEST_VERSION = 4
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_record(path, previous=None):
+    # reuse the previous hash when size and mtime are unchanged so that a
+    # rebuild only reads the files that were actually touched
+    stat = os.stat(path)
+    if (previous is not None
+            and previous.get('size') == stat.st_size
+            and previous.get('mtime_ns') == stat.st_mtime_ns):
+        digest = previous['hash']
+    else:
+        digest = hash_file(path)
+    return {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def record_changed(record, previous):
+    return previous is None or previous.get('hash') != record['hash']
+
+def empty_manifest():
+    return {
+        'version': MANIFEST_VERSION,
+        'basepath': None,
+        'minify': False,
+        # template files and partials -> file record
+        'inputs': {},
+        'pages': {},
+        'assets': {},
+        # text output -> size, mtime and whether a .gz sibling was kept
+        'compressed': {},
+    }
+
+def manifest_path(dest_dir):
+    return os.path.join(dest_dir, MANIFEST_NAME)
+
+def load_manifest(dest_dir):
+    try:
+        with open(manifest_path(dest_dir), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty_manifest()
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return empty_manifest()
+    return manifest
+
+def save_manifest(dest_dir, manifest):
+    path = manifest_path(dest_dir)
+    tmp_path = path + '.tmp'
+    os.makedirs(dest_dir, exist_ok=True)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # one write of the whole text: json.dump hands the file a
+            # small piece at a time
+            f.write(json.dumps(manifest, separators=(',', ':'), sort_keys=True))
+        os.replace(tmp_path, path)
+    except BaseException:
+        # e.g. a full disk, or a value json can't encode
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
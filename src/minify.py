@@ -0,0 +1,91 @@
+import re
+from manifest import hash_bytes
+
+# bump whenever a change here changes the minified output
+MINIFY_VERSION = 2
+
+# elements whose content is whitespace-sensitive or not HTML at all
+PROTECTED_HTML = re.compile(r'(<(pre|code|textarea|script|style)\b.*?</\2\s*>)', re.DOTALL | re.IGNORECASE)
+HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+# whitespace that contains a line break is source formatting; next to a
+# block-level tag it goes entirely, elsewhere (between inline elements, as
+# in "<b>a</b>\n<i>b</i>") it is significant and becomes one space
+TAG_GAP = re.compile(r'(?<=>)\s*\n\s*(?=<)')
+TAG_NAME = re.compile(r'</?([a-zA-Z][\w-]*|!)')
+PLACEHOLDER = re.compile(r'<\0(\d+)\0>')
+BLOCK_TAGS = frozenset('''
+    ! address article aside base blockquote body dd details dialog div dl dt fieldset figcaption
+    figure footer form h1 h2 h3 h4 h5 h6 head header hgroup hr html li link main menu meta nav
+    noscript ol p pre script section style summary table tbody td tfoot th thead title tr ul
+'''.split())
+WHITESPACE = re.compile(r'\s+')
+
+# string literals, unquoted url() values and comments; split out so the
+# code in between can be minified without touching them
+CSS_TOKEN = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\((?!\s*[\'"])[^)]*\)|/\*.*?\*/)',
+                       re.DOTALL | re.IGNORECASE)
+# a space before ':' is significant in selectors ("a :hover"), so only the
+# space after it is dropped
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*|:\s+')
+
+def minify_html(html):
+    # protected elements are swapped for tag-like placeholders, so the
+    # whitespace around them is treated like the whitespace around any tag
+    protected = []
+
+    def hold(match):
+        protected.append((match.group(1), match.group(2).lower()))
+        return f"<\0{len(protected) - 1}\0>"
+
+    def tag_name(pos):
+        placeholder = PLACEHOLDER.match(html, pos)
+        if placeholder:
+            return protected[int(placeholder.group(1))][1]
+        name = TAG_NAME.match(html, pos)
+        return name.group(1).lower() if name else None
+
+    def gap(match):
+        before = tag_name(html.rfind('<', 0, match.start()))
+        return '' if before in BLOCK_TAGS or tag_name(match.end()) in BLOCK_TAGS else ' '
+
+    html = HTML_COMMENT.sub('', PROTECTED_HTML.sub(hold, html))
+    html = WHITESPACE.sub(' ', TAG_GAP.sub(gap, html)).strip()
+    return PLACEHOLDER.sub(lambda match: protected[int(match.group(1))][0], html)
+
+def _minify_css_code(css):
+    css = WHITESPACE.sub(' ', css)
+    css = CSS_PUNCTUATION.sub(lambda match: match.group(1) or ':', css)
+    return css.replace(';}', '}')
+
+def minify_css(css):
+    parts = CSS_TOKEN.split(css)
+    # odd indexes are strings, url() values and comments: the first two are
+    # kept as they are, comments dropped
+    out = [('' if part.startswith('/*') else part) if index % 2 else _minify_css_code(part)
+           for index, part in enumerate(parts)]
+    return ''.join(out).strip()
+
+class Minifier:
+    # minify_html/minify_css with an optional RenderCache keyed on a hash of
+    # the input, so unchanged files aren't minified again
+    def __init__(self, cache=None):
+        self.cache = cache
+
+    def _cached(self, kind, function, text):
+        if self.cache is None:
+            return function(text)
+        key = f"{kind}:{hash_bytes(text.encode('utf-8'))}"
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = {'text': function(text)}
+            self.cache.put(key, entry)
+        return entry['text']
+
+    def html(self, text):
+        return self._cached('html', minify_html, text)
+
+    def css(self, text):
+        return self._cached('css', minify_css, text)
+
+    def css_bytes(self, data):
+        return self.css(data.decode('utf-8')).encode('utf-8')
@@ -0,0 +1,72 @@
+import hashlib
+import os
+from manifest import hash_file
+
+# Generated files are only replaced when their contents change, so
+# unchanged outputs keep their mtime and a deploy (rsync, CDN upload) only
+# sends what actually changed. Real writes go to a temporary file that is
+# renamed over the old one, so readers never see a half-written file.
+
+def _tmp_path(path):
+    return f"{path}.tmp{os.getpid()}"
+
+def same_contents(path, size, digest):
+    # size first, so most changed files are caught without reading them
+    try:
+        if os.stat(path).st_size != size:
+            return False
+    except FileNotFoundError:
+        return False
+    return hash_file(path) == digest
+
+def discard(tmp_path):
+    # a failed write's temporary file, which may not have been created
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+def replace_file(tmp_path, path):
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard(tmp_path)
+        raise
+
+def write_output(path, content):
+    # content is str, bytes or an iterable of str fragments; returns True if
+    # the file was written, False if it already had these contents
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    if isinstance(content, bytes):
+        if same_contents(path, len(content), hashlib.sha256(content).hexdigest()):
+            return False
+        tmp_path = _tmp_path(path)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+        except BaseException:
+            discard(tmp_path)
+            raise
+        replace_file(tmp_path, path)
+        return True
+    # a stream is written out as it comes and compared afterwards
+    tmp_path = _tmp_path(path)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for fragment in content:
+                data = fragment.encode('utf-8')
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+    except BaseException:
+        discard(tmp_path)
+        raise
+    if same_contents(path, size, digest.hexdigest()):
+        os.remove(tmp_path)
+        return False
+    replace_file(tmp_path, path)
+    return True
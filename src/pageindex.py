@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+from frontmatter import read_front_matter
+
+DEFAULT_INDEX_PATH = os.path.join('.cache', 'pages.sqlite')
+# bump when the tables change; an index with another version is rebuilt
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE pages (
+    path TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    date TEXT NOT NULL DEFAULT '',
+    summary TEXT NOT NULL DEFAULT '',
+    meta TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE tags (
+    path TEXT NOT NULL REFERENCES pages(path) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (path, tag)
+);
+CREATE INDEX tags_by_tag ON tags(tag);
+CREATE INDEX pages_by_date ON pages(date);
+"""
+
+def read_page_meta(path):
+    # front matter and title without parsing the body: the header, and then
+    # lines only up to the first heading when there is no title in it
+    with open(path, 'r', encoding='utf-8') as f:
+        meta = read_front_matter(f)
+        title = meta.get('title')
+        if not title:
+            for line in f:
+                if line.startswith('# '):
+                    title = line[2:].strip()
+                    break
+    return meta, title
+
+def page_url(output):
+    url = '/' + output.replace(os.sep, '/')
+    return url[:-len('index.html')] if url.endswith('/index.html') else url
+
+class PageIndex:
+    # Title and front matter of every page under content/, kept in SQLite
+    # and updated by size and mtime, so listing, tag and archive pages are a
+    # query rather than a pass over every source.
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self.db:
+                self.db.execute("DROP TABLE IF EXISTS tags")
+                self.db.execute("DROP TABLE IF EXISTS pages")
+                self.db.executescript(SCHEMA)
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def update(self, content_dir, pages):
+        # pages is the 'pages' section of a build manifest, whose records
+        # already carry size and mtime; returns (updated, removed) counts
+        known = {row['path']: (row['size'], row['mtime_ns'])
+                 for row in self.db.execute("SELECT path, size, mtime_ns FROM pages")}
+        updated = 0
+        with self.db:
+            for rel_path, record in pages.items():
+                if known.get(rel_path) == (record['size'], record['mtime_ns']):
+                    continue
+                meta, title = read_page_meta(os.path.join(content_dir, rel_path))
+                self.db.execute("DELETE FROM pages WHERE path = ?", (rel_path,))
+                self.db.execute(
+                    "INSERT INTO pages (path, url, title, date, summary, meta, size, mtime_ns)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (rel_path, page_url(record['output']), title, meta.get('date', ''),
+                     meta.get('summary', ''), json.dumps(meta), record['size'], record['mtime_ns']))
+                self.db.executemany("INSERT OR IGNORE INTO tags (path, tag) VALUES (?, ?)",
+                                    [(rel_path, tag) for tag in meta.get('tags', ())])
+                updated += 1
+            removed = [(rel_path,) for rel_path in known if rel_path not in pages]
+            self.db.executemany("DELETE FROM pages WHERE path = ?", removed)
+        return updated, len(removed)
+
+    def _page(self, row):
+        page = dict(row)
+        page['meta'] = json.loads(page['meta'])
+        page['tags'] = page['meta'].get('tags', [])
+        return page
+
+    def pages(self, tag=None, limit=None):
+        # newest first; pages without a date come last
+        query = "SELECT pages.* FROM pages"
+        params = []
+        if tag is not None:
+            query += " JOIN tags ON tags.path = pages.path WHERE tags.tag = ?"
+            params.append(tag)
+        query += " ORDER BY date = '', date DESC, title"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [self._page(row) for row in self.db.execute(query, params)]
+
+    def tags(self):
+        # (tag, page count), most used first
+        return [(row['tag'], row['count']) for row in self.db.execute(
+            "SELECT tag, COUNT(*) AS count FROM tags GROUP BY tag ORDER BY count DESC, tag")]
+
+    def archive(self):
+        # year -> pages, newest year first; undated pages are left out
+        years = {}
+        for page in self.pages():
+            if page['date']:
+                years.setdefault(page['date'][:4], []).append(page)
+        return years
+
+    def close(self):
+        self.db.close()
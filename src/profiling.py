@@ -0,0 +1,97 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+PAGE_STAGES = ('cache', 'read', 'blocks', 'inline', 'render', 'template', 'write')
+
+class StageTimer:
+    # Wall time and net allocated blocks (sys.getallocatedblocks) per stage.
+    # Cheap enough to run on every page, and picklable so process-pool
+    # workers can send their numbers back.
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {'seconds': 0.0, 'allocated_blocks': 0})
+            entry['seconds'] += time.perf_counter() - start
+            entry['allocated_blocks'] += sys.getallocatedblocks() - blocks
+
+class BuildProfile:
+    def __init__(self):
+        self.phases = StageTimer()
+        self.pages = {}
+
+    def phase(self, name):
+        return self.phases.stage(name)
+
+    def add_page(self, path, stages):
+        self.pages[path] = stages
+
+    def page_seconds(self, path):
+        return sum(stage['seconds'] for stage in self.pages[path].values())
+
+    def report(self):
+        totals = {}
+        for stages in self.pages.values():
+            for name, stage in stages.items():
+                total = totals.setdefault(name, {'seconds': 0.0, 'allocated_blocks': 0})
+                total['seconds'] += stage['seconds']
+                total['allocated_blocks'] += stage['allocated_blocks']
+        return {
+            'phases': self.phases.stages,
+            'page_stage_totals': totals,
+            'pages': {path: {'seconds': self.page_seconds(path), 'stages': stages}
+                      for path, stages in self.pages.items()},
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+
+    def summary(self, top=10):
+        lines = []
+        for name, stage in self.phases.stages.items():
+            lines.append(f"{name:>8}: {stage['seconds'] * 1000:9.2f} ms")
+        slowest = sorted(self.pages, key=self.page_seconds, reverse=True)[:top]
+        if slowest:
+            lines.append(f"Slowest {len(slowest)} page(s):")
+            header = ''.join(f"{name:>10}" for name in PAGE_STAGES)
+            lines.append(f"{'total ms':>10}{header}  page")
+        for path in slowest:
+            stages = self.pages[path]
+            cells = ''.join(f"{stages.get(name, {}).get('seconds', 0) * 1000:10.2f}" for name in PAGE_STAGES)
+            lines.append(f"{self.page_seconds(path) * 1000:10.2f}{cells}  {path}")
+        return '\n'.join(lines)
+
+def profile_call(function, prof_path, top=15):
+    # run function() once under cProfile and tracemalloc; the cProfile stats
+    # are dumped to prof_path and both summaries are returned as text
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        profiler.runcall(function)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    os.makedirs(os.path.dirname(prof_path) or '.', exist_ok=True)
+    profiler.dump_stats(prof_path)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+    out.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+    for stat in snapshot.statistics('lineno')[:top]:
+        out.write(f"{stat}\n")
+    return out.getvalue()
@@ -0,0 +1,98 @@
+import ctypes
+import ctypes.util
+import errno
+import glob
+import os
+import shutil
+import sys
+import threading
+
+# Publishing builds into a sibling staging directory and swaps it with the
+# live one, so whatever serves dest_dir sees either the old site or the new
+# one, never a half-built tree. The previous generation is kept next to it
+# for rollback; anything older is deleted in the background.
+
+STAGING_SUFFIX = '.staging'
+PREVIOUS_SUFFIX = '.prev'
+TRASH_SUFFIX = '.trash'
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+def _renameat2():
+    libc_name = ctypes.util.find_library('c')
+    if not sys.platform.startswith('linux') or libc_name is None:
+        return None
+    try:
+        return ctypes.CDLL(libc_name, use_errno=True).renameat2
+    except AttributeError:
+        return None
+
+def exchange_paths(a, b):
+    # atomically swap two directories with renameat2(RENAME_EXCHANGE); where
+    # that's missing, fall back to two renames with a short gap between them
+    renameat2 = _renameat2()
+    if renameat2 is not None:
+        if renameat2(_AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE) == 0:
+            return
+        error = ctypes.get_errno()
+        if error not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+            raise OSError(error, os.strerror(error), a)
+    tmp = f"{a}.swap{os.getpid()}"
+    os.rename(a, tmp)
+    os.rename(b, a)
+    os.rename(tmp, b)
+
+def sibling(dest_dir, suffix):
+    return os.path.normpath(dest_dir) + suffix
+
+def remove_tree_later(path):
+    # rename out of the way first so the name is free immediately, then
+    # delete off the critical path
+    trash = f"{sibling(path, TRASH_SUFFIX)}{os.getpid()}-{threading.get_ident()}"
+    os.rename(path, trash)
+    thread = threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={'ignore_errors': True})
+    thread.start()
+    return thread
+
+def _link_or_copy(src, dest):
+    # outputs are always replaced, never rewritten in place, so the staging
+    # tree can share files with the live one
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+def prepare_staging(dest_dir, seed=True):
+    # a fresh staging directory, seeded with the live site (manifest
+    # included) so the build into it stays incremental
+    staging = sibling(dest_dir, STAGING_SUFFIX)
+    for leftover in glob.glob(glob.escape(sibling(dest_dir, TRASH_SUFFIX)) + '*'):
+        shutil.rmtree(leftover, ignore_errors=True)
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    if seed and os.path.isdir(dest_dir):
+        shutil.copytree(dest_dir, staging, symlinks=True, copy_function=_link_or_copy)
+    else:
+        os.makedirs(staging)
+    return staging
+
+def swap_in(staging, dest_dir):
+    # make staging live; the old live tree becomes the rollback generation
+    previous = sibling(dest_dir, PREVIOUS_SUFFIX)
+    if not os.path.exists(dest_dir):
+        os.rename(staging, dest_dir)
+        return None
+    exchange_paths(staging, dest_dir)
+    cleanup = remove_tree_later(previous) if os.path.exists(previous) else None
+    os.rename(staging, previous)
+    print(f"Published {dest_dir} (previous generation kept in {previous})")
+    return cleanup
+
+def rollback(dest_dir):
+    # swap back to the previous generation; rolling back twice undoes it
+    previous = sibling(dest_dir, PREVIOUS_SUFFIX)
+    if not os.path.isdir(previous):
+        raise FileNotFoundError(f"no previous generation at {previous}")
+    exchange_paths(previous, dest_dir)
+    print(f"Rolled back {dest_dir} to the previous generation")
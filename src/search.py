@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import shutil
+from block_markdown import PageFacts, iter_block_html
+from frontmatter import read_front_matter
+from manifest import hash_bytes
+from output import write_output
+from pageindex import page_url, read_page_meta
+
+# A full-text search index written next to the site, for a client-side
+# search box. The inverted index (term -> [[doc id, count], ...]) is split
+# into shards by the first PREFIX_LENGTH characters of the term, so a query
+# fetches docs.json and only the shards of its own terms:
+#
+#   search/docs.json   {"prefix_length": 2, "docs": {"0": [url, title], ...}}
+#   search/th.json     {"the": [[0, 12], [3, 1]], "thorin": [[3, 2]]}
+#   search/eä.json     {"eärendil": [[7, 3]]}
+#
+# The client asks for search/ + encodeURIComponent(prefix) + .json; servers
+# decode the request path, so shard files are named by the prefix itself.
+#
+# Per-page term counts are kept in a state file under SearchIndex's
+# state_dir, outside the published site, so only pages whose source
+# changed are tokenized again and only the shards their terms fall in are
+# rewritten. Terms of the pages a build renders are collected while they
+# render; a source is only read here for a page the state doesn't have
+# yet but the build didn't render, e.g. right after the index is turned on.
+# Doc ids are never reused while the state file lives.
+
+SEARCH_DIR = 'search'
+DEFAULT_STATE_DIR = os.path.join('.cache', 'search')
+# where the state used to be kept, inside the site; removed when found
+LEGACY_STATE_NAME = '.search.json'
+# bump when tokenizing or the shard layout changes; a state file with
+# another version is dropped, and the shards with it
+SEARCH_VERSION = 2
+PREFIX_LENGTH = 2
+MIN_TERM_LENGTH = 2
+TERM_PATTERN = re.compile(r'\w+')
+
+def node_terms(nodes):
+    # each occurrence of the words a reader sees in a block's text nodes:
+    # link and image text but not their URLs, and code as written. A word
+    # never runs across two nodes, so their text is joined with spaces and
+    # read once.
+    text = " ".join(node.text for node in nodes).lower()
+    return [term for term in TERM_PATTERN.findall(text) if len(term) >= MIN_TERM_LENGTH]
+
+def page_terms(markdown):
+    # a build collects these as it renders the page; this renders it only
+    # for them
+    facts = PageFacts(find_terms=node_terms)
+    for _ in iter_block_html(markdown, None, facts):
+        pass
+    return facts.term_counts()
+
+def shard_key(term):
+    return term[:PREFIX_LENGTH]
+
+def shard_name(key):
+    # terms are \w+, so a prefix is always a valid file name
+    return key + '.json'
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+def load_state(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = None
+    if not state or state.get('version') != SEARCH_VERSION:
+        state = {'version': SEARCH_VERSION, 'next_id': 0, 'pages': {}}
+    return state
+
+def read_terms(path):
+    # (title, terms) of a page source, for pages not rendered by this build
+    _, title = read_page_meta(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        read_front_matter(f)
+        return title, page_terms(f)
+
+def update_search_index(dest_dir, state_path, content_dir, pages, basepath='/', rendered=None):
+    # pages is the 'pages' section of a build manifest and rendered maps the
+    # pages built this time to their {'title', 'terms'}; returns the number
+    # of pages (re)indexed and of shard files written or removed
+    rendered = rendered or {}
+    state = load_state(state_path)
+    indexed = state['pages']
+    search_dir = os.path.join(dest_dir, SEARCH_DIR)
+    if not indexed:
+        # shards left by a lost or older state can't be updated from it
+        shutil.rmtree(search_dir, ignore_errors=True)
+    changed = set()
+    updated = 0
+    for rel_path, record in pages.items():
+        old = indexed.get(rel_path)
+        if old is not None and old['hash'] == record['hash']:
+            old['url'] = page_url(record['output'])
+            continue
+        if rel_path in rendered:
+            title, terms = rendered[rel_path]['title'], rendered[rel_path]['terms']
+        else:
+            title, terms = read_terms(os.path.join(content_dir, rel_path))
+        if old is None:
+            doc_id = state['next_id']
+            state['next_id'] += 1
+        else:
+            doc_id = old['id']
+            changed.update(shard_key(term) for term in old['terms'])
+        changed.update(shard_key(term) for term in terms)
+        indexed[rel_path] = {'id': doc_id, 'hash': record['hash'], 'url': page_url(record['output']),
+                             'title': title, 'terms': terms}
+        updated += 1
+    for rel_path in [rel_path for rel_path in indexed if rel_path not in pages]:
+        changed.update(shard_key(term) for term in indexed.pop(rel_path)['terms'])
+    if not os.path.isdir(search_dir):
+        # a state file without its shards: write them all
+        changed.update(shard_key(term) for page in indexed.values() for term in page['terms'])
+
+    # one pass over the postings of every page, keeping the changed shards
+    shards = {key: {} for key in changed}
+    for page in indexed.values():
+        for term, count in page['terms'].items():
+            shard = shards.get(shard_key(term))
+            if shard is not None:
+                shard.setdefault(term, []).append([page['id'], count])
+    os.makedirs(search_dir, exist_ok=True)
+    written = 0
+    for key, shard in shards.items():
+        path = os.path.join(search_dir, shard_name(key))
+        if shard:
+            for postings in shard.values():
+                postings.sort()
+            written += write_output(path, _dumps(shard))
+        elif os.path.exists(path):
+            os.remove(path)
+            written += 1
+    prefix = basepath.rstrip('/')
+    docs = {page['id']: [prefix + page['url'], page['title']] for page in indexed.values()}
+    write_output(os.path.join(search_dir, 'docs.json'),
+                 _dumps({'prefix_length': PREFIX_LENGTH, 'docs': docs}))
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    write_output(state_path, _dumps(state))
+    legacy_path = os.path.join(dest_dir, LEGACY_STATE_NAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    return updated, written
+
+def shard_sizes(dest_dir):
+    # bytes per shard file, docs.json included
+    search_dir = os.path.join(dest_dir, SEARCH_DIR)
+    return {name: os.path.getsize(os.path.join(search_dir, name)) for name in sorted(os.listdir(search_dir))}
+
+def remove_search_index(dest_dir):
+    # when the index is turned off; the caller checks that a build wrote
+    # one. The state is left behind like any cache: the shards are written
+    # again in full when the index is turned back on.
+    shutil.rmtree(os.path.join(dest_dir, SEARCH_DIR), ignore_errors=True)
+    legacy_path = os.path.join(dest_dir, LEGACY_STATE_NAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+class SearchIndex:
+    # the build's handle on the search index: where its state is kept, one
+    # file per output directory
+    def __init__(self, state_dir=DEFAULT_STATE_DIR):
+        self.state_dir = state_dir
+
+    def state_path(self, dest_dir):
+        return os.path.join(self.state_dir, hash_bytes(os.path.abspath(dest_dir).encode('utf-8'))[:16] + '.json')
+
+    def update(self, dest_dir, content_dir, pages, basepath='/', rendered=None):
+        return update_search_index(dest_dir, self.state_path(dest_dir), content_dir, pages, basepath, rendered)
@@ -0,0 +1,104 @@
+import os
+import re
+
+SLOT_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+# {{> partials/nav.html }} includes another file, relative to the including one
+INCLUDE_PATTERN = re.compile(r'\{\{>\s*([^\s}]+)\s*\}\}')
+URL_ATTRIBUTES = ('href="', 'src="')
+
+def rewrite_basepath(html, basepath):
+    if basepath == '/':
+        return html
+    html = html.replace('href="/', f'href="{basepath}')
+    return html.replace('src="/', f'src="{basepath}')
+
+def expand_includes(path, dependencies=None, _stack=()):
+    # the text of path with every include replaced by the included file;
+    # every file read is appended to dependencies
+    if path in _stack:
+        raise ValueError(f"template include cycle: {' -> '.join(_stack + (path,))}")
+    if dependencies is not None:
+        dependencies.append(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    directory = os.path.dirname(path)
+
+    def include(match):
+        return expand_includes(os.path.join(directory, match.group(1)), dependencies, _stack + (path,))
+    return INCLUDE_PATTERN.sub(include, text)
+
+class Template:
+    # A template is compiled once into literal segments and named slots so
+    # that rendering a page is a single join. The basepath is applied to the
+    # literal segments up front; slot values are inserted as given.
+    def __init__(self, text, basepath='/'):
+        self.basepath = basepath
+        # the template file and its partials, when loaded with from_file
+        self.dependencies = []
+        self.parts = []
+        self.slots = []
+        pos = 0
+        for match in SLOT_PATTERN.finditer(text):
+            literal = text[pos:match.start()]
+            self.parts.append(rewrite_basepath(literal, basepath))
+            # a slot used as an attribute value, e.g. href="{{ Url }}", gets
+            # the same basepath treatment the literal URLs got
+            is_url = literal.endswith(URL_ATTRIBUTES)
+            self.slots.append((len(self.parts), match.group(1), is_url))
+            self.parts.append('')
+            pos = match.end()
+        self.parts.append(rewrite_basepath(text[pos:], basepath))
+
+    @classmethod
+    def from_file(cls, path, basepath='/', transform=None):
+        # transform, e.g. a minifier, is applied to the text with partials
+        # included, before it is compiled
+        dependencies = []
+        text = expand_includes(path, dependencies)
+        template = cls(transform(text) if transform is not None else text, basepath)
+        template.dependencies = list(dict.fromkeys(dependencies))
+        return template
+
+    @property
+    def slot_names(self):
+        return [name for _, name, _ in self.slots]
+
+    def _slot_value(self, name, is_url, values):
+        # slots without a value render empty, so optional slots like Date or
+        # Description can be added to the template before every page has them
+        value = values.get(name, '')
+        if is_url and isinstance(value, str) and value.startswith('/'):
+            value = self.basepath + value[1:]
+        return value
+
+    def render(self, **values):
+        parts = self.parts.copy()
+        for index, name, is_url in self.slots:
+            value = self._slot_value(name, is_url, values)
+            if not isinstance(value, str):
+                return ''.join(self.stream(**values))
+            parts[index] = value
+        return ''.join(parts)
+
+    def stream(self, **values):
+        # like render, but yields fragments; a slot value may itself be an
+        # iterable of fragments, such as HTMLNode.iter_html()
+        slots = iter(self.slots)
+        next_slot = next(slots, None)
+        for index, part in enumerate(self.parts):
+            if next_slot is not None and next_slot[0] == index:
+                _, name, is_url = next_slot
+                value = self._slot_value(name, is_url, values)
+                if isinstance(value, str):
+                    yield value
+                else:
+                    yield from value
+                next_slot = next(slots, None)
+            elif part:
+                yield part
+
+    def write(self, stream, **values):
+        stream.writelines(self.stream(**values))
+
+    def __repr__(self):
+        return f"Template(slots={self.slot_names}, basepath={self.basepath})"
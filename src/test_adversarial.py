@@ -0,0 +1,90 @@
+import time
+import unittest
+from block_markdown import block_memo, iter_markdown_html, markdown_to_html_node
+from depgraph import extract_refs
+from inline_markdown import split_nodes_delimiter, split_nodes_image, split_nodes_link
+from search import page_terms
+from textnode import TextNode, TextType
+
+# Hostile or accidental inputs that could make a parser go quadratic. Each
+# one is parsed at two sizes; the time must grow about linearly, with room
+# for noise (quadratic growth would be 16x for 4x the input).
+SCALE = 4
+MAX_RATIO = 9
+
+ADVERSARIAL = {
+    'many_links': lambda n: " ".join(f"[a{i}](/u{i})" for i in range(n)),
+    'repeated_link': lambda n: "[a](/u) " * n,
+    'many_images': lambda n: " ".join(f"![a{i}](/u{i}.png)" for i in range(n)),
+    'open_brackets': lambda n: "[" * (n * 8),
+    'bracket_paren_runs': lambda n: "[](" * (n * 3),
+    'image_openers': lambda n: "![" * (n * 4),
+    'unclosed_link': lambda n: "[a](" + "x" * (n * 8),
+    'nested_brackets': lambda n: "[" * n + "a" + "]" * n + "(" * n + ")" * n,
+    'unterminated_emphasis': lambda n: "_" + "a " * (n * 4),
+    'emphasis_runs': lambda n: "_a_ " * (n * 2),
+    'delimiter_runs': lambda n: "**" * (n * 4),
+    'wrapped_paragraph': lambda n: "\n".join("word " * 10 for _ in range(n)),
+    'many_blocks': lambda n: "\n\n".join("para" for _ in range(n * 2)),
+    'long_list': lambda n: "\n".join(f"- item {i}" for i in range(n)),
+    'long_ordered_list': lambda n: "\n".join(f"{i + 1}. item" for i in range(n)),
+    'long_quote': lambda n: "\n".join("> q" for _ in range(n * 2)),
+    'heading_hashes': lambda n: "#" * (n * 8) + " x",
+    'long_code_block': lambda n: "```\n" + "[x](/y) _\n" * n + "```",
+    'html_escapes': lambda n: "<&>\"" * (n * 2),
+}
+
+def best_time(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def parse_page(markdown):
+    # the work a page build does on its source; invalid markdown may fail,
+    # it just has to fail in linear time too. The build renders through
+    # the block memo, which starts empty so no timing is a memo hit.
+    block_memo.clear()
+    for function in (lambda: markdown_to_html_node(markdown).to_html(),
+                     lambda: ''.join(iter_markdown_html(markdown, block_memo)),
+                     lambda: extract_refs(markdown),
+                     lambda: page_terms(markdown)):
+        try:
+            function()
+        except ValueError:
+            pass
+
+class TestLinearTime(unittest.TestCase):
+    def assertLinear(self, function, n=100):
+        # a warm-up run, then the smallest input is grown until it takes
+        # long enough to time reliably
+        function(n)
+        while best_time(lambda: function(n), 1) < 0.002 and n < 10 ** 6:
+            n *= 2
+        small = best_time(lambda: function(n))
+        large = best_time(lambda: function(n * SCALE))
+        self.assertLess(large / small, MAX_RATIO, f"{large:.4f}s for {SCALE}x the input of {small:.4f}s")
+
+    def test_pages(self):
+        for name, generate in ADVERSARIAL.items():
+            with self.subTest(name):
+                self.assertLinear(lambda n: parse_page(generate(n)))
+
+    def test_split_functions(self):
+        cases = {
+            'split_nodes_link': lambda n: split_nodes_link([TextNode("[]()" * n, TextType.TEXT)]),
+            'split_nodes_image': lambda n: split_nodes_image([TextNode("![]()" * n, TextType.TEXT)]),
+            'split_nodes_delimiter': lambda n: split_nodes_delimiter(
+                [TextNode("_a_ " * n, TextType.TEXT)], "_", TextType.ITALIC),
+        }
+        for name, function in cases.items():
+            with self.subTest(name):
+                # many short matches, so that copying the rest of the text
+                # for every one of them would show
+                self.assertLinear(function, 40000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import os
+import unittest
+from unittest import mock
+import assets
+from assets import changed_files, copy_file, needs_copy, sync_directory
+from testutil import TempDirTestCase
+
+class TestAssets(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = self.path('static')
+        self.dest = self.path('docs')
+        self.write('static/index.css', b'body {}')
+        self.write('static/images/a.png', os.urandom(3 * 1024 * 1024))
+
+    def sync(self, previous=None, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            records = sync_directory(self.src, self.dest, previous, **kwargs)
+        return records, out.getvalue()
+
+    def test_copy_file_large(self):
+        dest_file = os.path.join(self.dest, 'copy.png')
+        copy_file(os.path.join(self.src, 'images/a.png'), dest_file)
+        self.assertEqual(self.read('docs/copy.png', binary=True), self.read('static/images/a.png', binary=True))
+        self.assertFalse(needs_copy(os.path.join(self.src, 'images/a.png'), dest_file))
+
+    def test_short_kernel_copy_falls_back(self):
+        # as when the source shrinks mid-copy: the in-kernel copies stop early
+        def short_copy(src_fd, dest_fd, offset, count):
+            if offset:
+                return 0
+            os.pwrite(dest_fd, os.pread(src_fd, 1024, 0), 0)
+            return 1024
+        dest_file = os.path.join(self.dest, 'copy.png')
+        with mock.patch.object(assets, '_copy_file_range', short_copy), \
+                mock.patch.object(assets, '_sendfile', short_copy):
+            copy_file(os.path.join(self.src, 'images/a.png'), dest_file)
+        self.assertEqual(self.read('docs/copy.png', binary=True), self.read('static/images/a.png', binary=True))
+
+    def test_unchanged_files_not_copied(self):
+        records, out = self.sync()
+        self.assertEqual(sorted(records), ['images/a.png', 'index.css'])
+        self.assertEqual(out.count('Copied file'), 2)
+        records, out = self.sync(records)
+        self.assertEqual(out, '')
+
+    def test_changed_file_copied(self):
+        records, _ = self.sync()
+        self.write('static/index.css', b'body { color: red }')
+        records, out = self.sync(records)
+        self.assertEqual(out.count('Copied file'), 1)
+        self.assertEqual(self.read('docs/index.css', binary=True), b'body { color: red }')
+
+    def test_checksum_detects_same_size_edit(self):
+        records, _ = self.sync(checksum=True)
+        path = self.write('static/index.css', b'BODY {}')
+        stat = os.stat(os.path.join(self.dest, 'index.css'))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.sync(records)[1], '')
+        self.assertIn('Copied file', self.sync(records, checksum=True)[1])
+
+    def test_only_removed_sources_deleted(self):
+        records, _ = self.sync()
+        self.write('docs/index.html', b'<html></html>')
+        os.remove(os.path.join(self.src, 'index.css'))
+        records, out = self.sync(records)
+        self.assertNotIn('index.css', records)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'index.css')))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'index.html')))
+
+    def test_changed_files(self):
+        known = ['index.css', 'images/a.png']
+        elsewhere = self.path('content/index.md')
+        self.assertEqual(changed_files(self.src, [os.path.join(self.src, 'index.css'), elsewhere,
+                                                  os.path.join(self.src, 'images/b.png')], known),
+                         {'index.css', 'images/b.png'})
+        # a directory, the root itself, or a known directory gone: walk again
+        for path in ('images', '', 'gone'):
+            self.assertIsNone(changed_files(self.src, [os.path.join(self.src, path)], known + ['gone/x.png']))
+
+    def test_only_changed_files_synced(self):
+        records, _ = self.sync()
+        self.write('static/index.css', b'p {}')
+        self.write('static/new.txt', b'new')
+        os.remove(os.path.join(self.src, 'images/a.png'))
+        with mock.patch.object(assets, 'walk_files', side_effect=AssertionError):
+            records, out = self.sync(records, changed={'index.css', 'new.txt', 'images/a.png'})
+        self.assertEqual(sorted(records), ['index.css', 'new.txt'])
+        self.assertEqual(self.read('docs/index.css'), 'p {}')
+        self.assertEqual(self.read('docs/new.txt'), 'new')
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'images')))
+
+    def test_link_mode(self):
+        self.sync(link=True)
+        src_stat = os.stat(os.path.join(self.src, 'index.css'))
+        dest_stat = os.stat(os.path.join(self.dest, 'index.css'))
+        self.assertEqual(src_stat.st_ino, dest_stat.st_ino)
+        # replacing the link must never write through to the source
+        copy_file(os.path.join(self.src, 'images/a.png'), os.path.join(self.dest, 'index.css'))
+        self.assertEqual(self.read('static/index.css', binary=True), b'body {}')
+
+if __name__ == '__main__':
+    unittest.main()
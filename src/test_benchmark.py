@@ -0,0 +1,45 @@
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+import main as site
+from benchmark import best_time, compare, generate_corpus, quiet_cwd, synthetic_markdown
+from block_markdown import markdown_to_html_node
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_markdown_parses(self):
+        rng = random.Random(1)
+        for _ in range(50):
+            markdown = synthetic_markdown(rng, paragraphs=5, list_density=0.5, links=3, images=1)
+            self.assertTrue(markdown_to_html_node(markdown).to_html().startswith("<div><h1>"))
+
+    def test_generate_corpus(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = generate_corpus(root, pages=12, paragraphs=2, depth=3)
+            self.assertEqual(len(paths), 12)
+            self.assertTrue(all(os.path.exists(path) for path in paths))
+            self.assertTrue(os.path.exists(os.path.join(root, 'template.html')))
+            self.assertTrue(os.path.exists(os.path.join(root, 'static', 'index.css')))
+
+    def test_corpus_links_resolve(self):
+        with tempfile.TemporaryDirectory() as root:
+            generate_corpus(root, pages=12, paragraphs=3, images=1)
+            stderr = io.StringIO()
+            with quiet_cwd(root), contextlib.redirect_stderr(stderr):
+                site.main(['--no-cache', '--no-index'])
+            self.assertNotIn("Broken link", stderr.getvalue())
+
+    def test_best_time_runs_setup_before_each_repeat(self):
+        calls = []
+        best_time(lambda: calls.append('run'), 3, lambda: calls.append('setup'))
+        self.assertEqual(calls, ['setup', 'run'] * 3)
+
+    def test_compare(self):
+        baseline = {'stages': {'to_html': 1.0, 'main_full': 2.0}}
+        results = {'stages': {'to_html': 1.1, 'main_full': 3.0, 'new_stage': 5.0}}
+        self.assertEqual(compare(results, baseline, 1.25), [('main_full', 2.0, 3.0)])
+
+if __name__ == '__main__':
+    unittest.main()
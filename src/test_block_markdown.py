@@ -1,11 +1,22 @@
+import io
+import mmap
+import random
+import tempfile
 import unittest
 from block_markdown import (
     markdown_to_blocks,
     block_to_block_type,
+    BlockMemo,
     BlockType,
+    iter_blocks,
+    iter_markdown_html,
     markdown_to_html_node
 )
 
+def split_blocks(markdown):
+    # the original whole-document implementation of markdown_to_blocks
+    return [b.strip() for b in markdown.split("\n\n") if b.strip()]
+
 class TestBlockMarkdown(unittest.TestCase):
     def test_markdown_to_blocks(self):
         md = """
@@ -49,6 +60,59 @@ This is a paragraph
         blocks = markdown_to_blocks(md)
         self.assertEqual(blocks, [])
         
+    def test_markdown_to_blocks_matches_split(self):
+        rng = random.Random(0)
+        pieces = ["a", "b c", " ", "\t", "\n", "\n", "\n\n", "- x", "> q", "```", "\x0c"]
+        for _ in range(2000):
+            md = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+            self.assertEqual(markdown_to_blocks(md), split_blocks(md), repr(md))
+
+    def test_iter_blocks_from_file_object(self):
+        md = "# Title\n\n- one\n- two\n\n\n```\ncode\n```\n"
+        expected = [
+            (BlockType.HEADING, ["# Title"]),
+            (BlockType.UNORDERED_LIST, ["- one", "- two"]),
+            (BlockType.CODE, ["```", "code", "```"]),
+        ]
+        self.assertEqual(list(iter_blocks(io.StringIO(md))), expected)
+        self.assertEqual(list(iter_blocks(io.BytesIO(md.encode()))), expected)
+        self.assertEqual(list(iter_blocks(md)), expected)
+
+    def test_iter_blocks_from_mmap(self):
+        md = "Para _one_\nstill one\n\n> quote ü\n"
+        with tempfile.TemporaryFile() as f:
+            f.write(md.encode("utf-8"))
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.assertEqual(
+                    list(iter_blocks(mm)),
+                    [(BlockType.PARAGRAPH, ["Para _one_", "still one"]), (BlockType.QUOTE, ["> quote ü"])],
+                )
+                self.assertEqual(markdown_to_html_node(mm).to_html(), markdown_to_html_node(md).to_html())
+
+    def test_iter_markdown_html_matches_tree(self):
+        md = "# Head\n\n1. a\n2. **b**\n\n> q\n> r\n\ntext [l](/x)"
+        self.assertEqual("".join(iter_markdown_html(md)), markdown_to_html_node(md).to_html())
+        with self.assertRaises(ValueError):
+            list(iter_markdown_html("\n\n"))
+
+    def test_block_memo_reuses_repeated_blocks(self):
+        memo = BlockMemo()
+        md = "> disclaimer\n\n# A\n\n![img](/a.png)\n\n> disclaimer"
+        expected = markdown_to_html_node(md).to_html()
+        self.assertEqual("".join(iter_markdown_html(md, memo)), expected)
+        self.assertEqual((memo.hits, memo.misses), (1, 3))
+        self.assertEqual("".join(iter_markdown_html(md, memo)), expected)
+        self.assertEqual((memo.hits, memo.misses), (5, 3))
+
+    def test_block_memo_is_bounded(self):
+        memo = BlockMemo(max_entries=2, max_block_chars=10)
+        for text in ["a", "b", "a", "c", "x" * 11]:
+            memo.render(BlockType.PARAGRAPH, [text])
+        self.assertEqual(list(memo.entries), ["a", "c"])
+        self.assertEqual(memo.render(BlockType.PARAGRAPH, ["x" * 11]), (f"<p>{'x' * 11}</p>", [], None))
+        self.assertEqual(memo.hits, 1)
+
     def test_block_to_block_type(self):
         self.assertEqual(
             block_to_block_type("# Heading 1"),
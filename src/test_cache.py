@@ -0,0 +1,74 @@
+import os
+import pickle
+import tempfile
+import unittest
+from cache import MemoryCache, RenderCache
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_miss_then_hit(self):
+        self.assertIsNone(self.cache.get('abc'))
+        self.cache.put('abc', {'title': 'T', 'content': '<div></div>'})
+        self.assertEqual(self.cache.get('abc'), {'title': 'T', 'content': '<div></div>'})
+
+    def test_parser_version_in_key(self):
+        self.cache.put('abc', {'title': 'T', 'content': ''})
+        self.assertIsNone(RenderCache(self.tmp.name, version=-1).get('abc'))
+
+    def test_corrupt_entry_is_a_miss(self):
+        self.cache.put('abc', {'title': 'T', 'content': ''})
+        with open(self.cache._path('abc'), 'w') as f:
+            f.write('{')
+        self.assertIsNone(self.cache.get('abc'))
+
+    def test_prune_evicts_least_recently_used(self):
+        for i, name in enumerate(['old', 'use', 'new']):
+            self.cache.put(name, {'title': name, 'content': 'x' * 100})
+            os.utime(self.cache._path(name), ns=(i * 10**9, i * 10**9))
+        self.cache.get('use')
+        size = os.path.getsize(self.cache._path('old'))
+        self.cache.max_bytes = size * 2
+        self.assertEqual(self.cache.prune(), 1)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertIsNotNone(self.cache.get('use'))
+        self.assertIsNotNone(self.cache.get('new'))
+
+class TestMemoryCache(unittest.TestCase):
+    def test_in_front_of_render_cache(self):
+        with tempfile.TemporaryDirectory() as root:
+            backing = RenderCache(root)
+            backing.put('disk', {'title': 'D'})
+            cache = MemoryCache(backing, max_entries=2)
+            self.assertEqual(cache.get('disk'), {'title': 'D'})
+            cache.put('a', {'title': 'A'})
+            self.assertEqual(backing.get('a'), {'title': 'A'})
+            os.remove(backing._path('disk'))
+            self.assertEqual(cache.get('disk'), {'title': 'D'})
+            # least recently used first out
+            cache.put('b', {'title': 'B'})
+            self.assertEqual(list(cache.kept), ['disk', 'b'])
+
+    def test_without_backing(self):
+        cache = MemoryCache()
+        self.assertIsNone(cache.get('x'))
+        cache.put('x', {'title': 'X'})
+        self.assertEqual(cache.get('x'), {'title': 'X'})
+        self.assertEqual(cache.prune(), 0)
+
+    def test_pickles_without_kept_entries(self):
+        with tempfile.TemporaryDirectory() as root:
+            cache = MemoryCache(RenderCache(root))
+            cache.put('a', {'title': 'A'})
+            copy = pickle.loads(pickle.dumps(cache))
+            self.assertEqual(len(copy.kept), 0)
+            self.assertEqual(len(cache.kept), 1)
+            self.assertEqual(copy.get('a'), {'title': 'A'})
+
+if __name__ == '__main__':
+    unittest.main()
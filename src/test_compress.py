@@ -0,0 +1,56 @@
+import contextlib
+import gzip
+import io
+import os
+import unittest
+from unittest import mock
+import compress
+from compress import compress_outputs, gzip_file, remove_compressed
+from testutil import TempDirTestCase
+
+class TestCompress(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write('index.html', b'<p>hello</p>' * 100)
+        self.write('css/index.css', b'body { margin: 0 }\n' * 50)
+        self.write('tiny.txt', b'x')
+        self.write('image.png', os.urandom(1000))
+
+    def compress(self, previous=None, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return compress_outputs(self.root, previous, **kwargs)
+
+    def test_gzip_file(self):
+        path = os.path.join(self.root, 'index.html')
+        self.assertTrue(gzip_file(path))
+        with gzip.open(path + '.gz') as f:
+            self.assertEqual(f.read(), b'<p>hello</p>' * 100)
+        # compression that doesn't pay off removes the stale .gz
+        self.assertFalse(gzip_file(path, min_ratio=0.001))
+        self.assertFalse(os.path.exists(path + '.gz'))
+
+    def test_compress_outputs(self):
+        records = self.compress()
+        self.assertEqual(sorted(records), ['css/index.css', 'index.html', 'tiny.txt'])
+        self.assertEqual({rel: record['gzip'] for rel, record in records.items()},
+                         {'css/index.css': True, 'index.html': True, 'tiny.txt': False})
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'image.png.gz')))
+
+    def test_unchanged_outputs_skipped(self):
+        records = self.compress()
+        with mock.patch.object(compress, 'gzip_file', side_effect=AssertionError):
+            self.assertEqual(self.compress(records), records)
+        self.write('index.html', b'<p>changed</p>' * 100)
+        os.remove(os.path.join(self.root, 'css/index.css.gz'))
+        with mock.patch.object(compress, 'gzip_file', wraps=gzip_file) as gz:
+            self.compress(records)
+        self.assertEqual(sorted(os.path.relpath(call.args[0], self.root) for call in gz.call_args_list),
+                         ['css/index.css', 'index.html'])
+
+    def test_remove_compressed(self):
+        records = self.compress()
+        remove_compressed(self.root, records)
+        self.assertFalse(any(name.endswith('.gz') for _, _, names in os.walk(self.root) for name in names))
+
+if __name__ == '__main__':
+    unittest.main()
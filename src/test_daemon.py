@@ -0,0 +1,68 @@
+import contextlib
+import io
+import os
+import threading
+import unittest
+from cache import MemoryCache
+from daemon import BuildServer, format_reply, request
+from testutil import SiteTestCase
+
+class TestBuildServer(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        build_kwargs = dict(static_dir=self.path('static'), content_dir=self.path('content'),
+                            template_path=self.path('template.html'), cache=MemoryCache(), check_links=False)
+        self.socket_path = self.path('build.sock')
+        self.server = BuildServer(self.socket_path, [('/', self.path('docs'))], build_kwargs)
+        self.thread = None
+
+    def tearDown(self):
+        if self.thread is not None:
+            request(self.socket_path, {'command': 'stop'})
+            self.thread.join()
+
+    def start(self):
+        listener = self.server.listen()
+        self.thread = threading.Thread(target=self.server.serve, args=(listener,))
+        self.thread.start()
+
+    def build(self, **message):
+        # the server thread prints its build log to the same sys.stdout
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return request(self.socket_path, dict(message, command='build'))
+
+    def test_rebuild_summary(self):
+        self.start()
+        first = self.build()
+        self.assertTrue(first['ok'])
+        self.assertEqual(first['changes'][self.path('docs')]['pages']['added'],
+                         ['blog/post/index.md', 'index.md'])
+        self.write('content/blog/post/index.md', "# Post\n\nHello again")
+        self.write('content/new.md', "# New")
+        os.remove(self.path('static/index.css'))
+        summary = self.build()['changes'][self.path('docs')]
+        self.assertEqual(summary['pages'], {'added': ['new.md'], 'removed': [], 'changed': ['blog/post/index.md']})
+        self.assertEqual(summary['assets']['removed'], ['index.css'])
+        self.assertEqual(summary['inputs'], [])
+        self.assertIn("pages 0 changed, 0 added, 0 removed", format_reply(self.build()))
+        self.assertEqual(request(self.socket_path, {'command': 'status'})['builds'], 3)
+
+    def test_failures_and_errors(self):
+        self.start()
+        self.write('content/bad.md', "# Bad\n\n**open")
+        reply = self.build()
+        self.assertFalse(reply['ok'])
+        self.assertIn(self.path('content/bad.md'), reply['failures'])
+        self.assertIn("1 page(s) failed", format_reply(reply))
+        self.assertIn('error', request(self.socket_path, {'command': 'nope'}))
+
+    def test_stale_socket_is_replaced(self):
+        with open(self.socket_path, 'w'):
+            pass
+        self.start()
+        self.assertEqual(request(self.socket_path, {'command': 'status'})['builds'], 0)
+        with self.assertRaises(RuntimeError):
+            BuildServer(self.socket_path, [], {}).listen()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from depgraph import dependents, explain, extract_links, extract_refs, find_page, linked_from, resolve_url, url_index
+
+def page(output, links=(), deps=('template.html',)):
+    return {'output': output, 'refs': [[url, 1, False] for url in links], 'deps': list(deps)}
+
+class TestDepGraph(unittest.TestCase):
+    def setUp(self):
+        self.manifest = {
+            'inputs': {'template.html': {}, 'partials/nav.html': {}},
+            'pages': {
+                'index.md': page('index.html', ['/blog/tom', '/missing']),
+                'blog/tom/index.md': page('blog/tom/index.html', ['/'],
+                                          ('template.html', 'partials/nav.html')),
+                'about.md': page('about.html', ['/blog/tom/#top']),
+            },
+        }
+
+    def test_extract_links(self):
+        md = "# T\n\n[a](/a) and ![img](/i.png)\n[wrapped\nlink](/b) [ext](https://x.org) [a](/a)\n\n```\ncode\n```"
+        self.assertEqual(extract_links(md), ['/a', '/b'])
+
+    def test_extract_refs(self):
+        md = "\n  \n[a](/a) and\n![img](i.png)\n\n```\n[c](/c)\n```"
+        self.assertEqual(extract_refs(md, 4), [['/a', 6, False], ['i.png', 7, True]])
+        self.assertEqual(extract_refs("[wrapped\nlink](/b)"), [['/b', 1, False]])
+        # only what renders as a link or an image: not code spans, nor
+        # images without alt text, which the tokenizer drops
+        md = "`[c](/c)` and ![](e.png)\n\n- `x` [a](/a)\n- ![](/b) `[d](/d)` ![b](/b)"
+        self.assertEqual(extract_refs(md), [['/a', 3, False], ['/b', 4, True]])
+
+    def test_resolve_url(self):
+        index = url_index(self.manifest['pages'])
+        self.assertEqual(resolve_url('/', index), 'index.md')
+        self.assertEqual(resolve_url('/blog/tom/', index), 'blog/tom/index.md')
+        self.assertEqual(resolve_url('/blog/tom/index.html?x=1', index), 'blog/tom/index.md')
+        self.assertEqual(resolve_url('/about.html', index), 'about.md')
+        self.assertIsNone(resolve_url('/about', index))
+
+    def test_dependents_and_links(self):
+        self.assertEqual(dependents(self.manifest, 'partials/nav.html'), ['blog/tom/index.md'])
+        self.assertEqual(len(dependents(self.manifest, 'template.html')), 3)
+        self.assertEqual(linked_from(self.manifest, 'blog/tom/index.md'), ['about.md', 'index.md'])
+
+    def test_find_page(self):
+        for target in ('content/blog/tom/index.md', 'docs/blog/tom/index.html', '/blog/tom',
+                       'blog/tom/index.md'):
+            self.assertEqual(find_page(self.manifest, target, 'content', 'docs'), 'blog/tom/index.md')
+        self.assertIsNone(find_page(self.manifest, 'nope.md', 'content', 'docs'))
+        for target in ('out/blog/tom/index.html', '/x/blog/tom', '/blog/tom'):
+            self.assertEqual(find_page(self.manifest, target, 'content', 'out', '/x/'), 'blog/tom/index.md')
+        self.assertEqual(find_page(self.manifest, '/x', 'content', 'out', '/x/'), 'index.md')
+
+    def test_explain(self):
+        text = explain(self.manifest, 'content/index.md')
+        self.assertIn('/missing -> no such page', text)
+        self.assertIn('linked from 1 page(s):\n    content/blog/tom/index.md', text)
+        self.assertIn('used by 1 page(s)', explain(self.manifest, 'partials/nav.html'))
+
+if __name__ == '__main__':
+    unittest.main()
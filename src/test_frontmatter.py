@@ -0,0 +1,41 @@
+import io
+import unittest
+from frontmatter import page_slots, parse_front_matter, read_front_matter, split_front_matter
+
+MARKDOWN = """---
+title: "Hello: World"
+Date: 2024-05-01
+tags: [a, 'b c']
+summary: Short
+---
+# Heading
+
+Body"""
+
+class TestFrontMatter(unittest.TestCase):
+    def test_split_front_matter(self):
+        meta, body = split_front_matter(MARKDOWN)
+        self.assertEqual(meta, {'title': 'Hello: World', 'date': '2024-05-01', 'tags': ['a', 'b c'],
+                                'summary': 'Short'})
+        self.assertEqual(body, "# Heading\n\nBody")
+
+    def test_no_front_matter(self):
+        for markdown in ("# Title\n\n---\nx: y\n---", "---\ntitle: never closed\n\n# T", "----\n"):
+            self.assertEqual(split_front_matter(markdown), ({}, markdown))
+
+    def test_read_front_matter_stops_at_body(self):
+        f = io.StringIO(MARKDOWN)
+        self.assertEqual(read_front_matter(f)['tags'], ['a', 'b c'])
+        self.assertEqual(f.read(), "# Heading\n\nBody")
+        f = io.StringIO("---\nunclosed: yes\n# T")
+        self.assertEqual(read_front_matter(f), {})
+        self.assertEqual(f.tell(), 0)
+
+    def test_parse_values(self):
+        self.assertEqual(parse_front_matter(["tags: x, y ,", "# comment: no", "  nested: no"]),
+                         {'tags': ['x', 'y']})
+        self.assertEqual(page_slots({'tags': ['x', 'y'], 'date': 'd'}),
+                         {'Date': 'd', 'Tags': 'x, y', 'Summary': ''})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
+import io
 import unittest
-from htmlnode import HTMLNode, LeafNode, ParentNode
+from htmlnode import HTMLNode, LeafNode, ParentNode, text_leaf
 
 class TestHTMLNode(unittest.TestCase):
     def test_eq(self):
@@ -27,6 +28,17 @@ class TestHTMLNode(unittest.TestCase):
         node2 = HTMLNode("div", {})
         self.assertNotEqual(node, node2)
         
+    def test_eq_empty_children_and_props(self):
+        self.assertEqual(HTMLNode("div", children=[], props={}), HTMLNode("div"))
+
+    def test_slots(self):
+        for node in (HTMLNode("div"), LeafNode("b", "x"), ParentNode("p", [LeafNode(None, "x")])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_text_leaf_empties_are_shared(self):
+        self.assertIs(text_leaf("x").props, text_leaf("y").props)
+        self.assertIs(text_leaf("x").children, text_leaf("y").children)
+
     def test_props_to_html(self):
         node = HTMLNode("a", {}, props={"href": "https://example.com", "target": "_blank"})
         self.assertEqual(node.props_to_html(), ' href="https://example.com" target="_blank"')
@@ -44,6 +56,12 @@ class TestLeafNode(unittest.TestCase):
         leaf = LeafNode(None, "Just some text")
         self.assertEqual(leaf.to_html(), 'Just some text')
         
+    def test_text_leaf(self):
+        leaf = text_leaf("plain")
+        self.assertIsInstance(leaf, LeafNode)
+        self.assertEqual(leaf, LeafNode(None, "plain"))
+        self.assertEqual(leaf.to_html(), "plain")
+
     def test_to_html_no_value_raises(self):
         leaf = LeafNode("p", None)
         with self.assertRaises(ValueError):
@@ -96,6 +114,42 @@ class TestParentNode(unittest.TestCase):
             parent_node.to_html(),
             "<div><span><b>grandchild</b></span></div>",
         )
+
+    def test_iter_html_fragments(self):
+        parent = ParentNode("p", [LeafNode(None, "a "), LeafNode("a", "b", {"href": "/x"})])
+        self.assertEqual(
+            list(parent.iter_html()),
+            ["<p>", "a ", '<a href="/x">b</a>', "</p>"],
+        )
+
+    def test_write_html_to_stream(self):
+        parent = ParentNode("ul", [ParentNode("li", [LeafNode("i", "x")]), ParentNode("li", [LeafNode(None, "y")])])
+        stream = io.StringIO()
+        parent.write_html(stream)
+        self.assertEqual(stream.getvalue(), "<ul><li><i>x</i></li><li>y</li></ul>")
+
+    def test_deep_nesting(self):
+        node = LeafNode(None, "x")
+        for _ in range(5000):
+            node = ParentNode("blockquote", [node])
+        html = node.to_html()
+        self.assertEqual(html, "<blockquote>" * 5000 + "x" + "</blockquote>" * 5000)
+
+    def test_nested_no_children_raises(self):
+        parent = ParentNode("div", [ParentNode("span", [])])
+        with self.assertRaises(ValueError):
+            parent.to_html()
+
+    def test_default_children_and_props_are_mutable(self):
+        parent = ParentNode("ul", None)
+        parent.children.append(LeafNode("li", "one"))
+        parent.props["class"] = "list"
+        leaf = LeafNode("a", "link")
+        leaf.props["href"] = "/"
+        self.assertEqual(parent.to_html(), '<ul class="list"><li>one</li></ul>')
+        self.assertEqual(leaf.to_html(), '<a href="/">link</a>')
+        self.assertEqual(LeafNode("b", "x").props, {})
+        self.assertEqual(text_leaf("x"), LeafNode(None, "x"))
         
         
 if __name__ == "__main__":
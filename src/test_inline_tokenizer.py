@@ -0,0 +1,89 @@
+import glob
+import os
+import random
+import unittest
+from textnode import TextNode, TextType
+from inline_markdown import (
+    split_nodes_delimiter,
+    split_nodes_image,
+    split_nodes_link,
+    tokenize_inline,
+)
+
+def split_pipeline(text):
+    # the original five-pass implementation of text_to_text_nodes
+    nodes = [TextNode(text, TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+def outcome(function, text):
+    try:
+        return function(text)
+    except ValueError as e:
+        return ("error", str(e))
+
+CASES = [
+    "Here is an ![image1](http://image1.png) and a [link1](http://link1.com). Also, ![image2](http://image2.png) with [link2](http://link2.com).",
+    "This text has no markdown links or images.",
+    "This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)",
+    "Just some plain text without any formatting.",
+    "**bold** _italic_ `code` ![alt](url) [link](url)",
+    "**bold and _italic_**",
+    "This is **bold text with no end",
+    "",
+    "****",
+    "***bold***",
+    "_italic with `code` inside_",
+    "`code with _underscore_ inside`",
+    "`code with _underscore inside`",
+    "_italic **bold** italic_",
+    "![](empty-alt.png) and [](empty-text)",
+    "[a](b)![c](d)[e](f)",
+    "!![a](b) ![not [an](image)",
+    "[a](x![c](d)",
+    "![a](http://x_y.png)",
+    "**[bold link](/x)** and ![img](/y.png)",
+    "[same](u) and [same](u) again",
+]
+
+TOKENS = [
+    "word", " ", "  ", "**", "_", "`", "*", "!", "[", "]", "(", ")",
+    "![alt](img.png)", "[text](/url)", "![](x)", "[](y)", "[a](b_c)", "x_y",
+]
+
+def generated_cases(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 16)))
+
+class TestInlineTokenizerCompatibility(unittest.TestCase):
+    def assertSameAsPipeline(self, text):
+        self.assertEqual(outcome(tokenize_inline, text), outcome(split_pipeline, text), repr(text))
+
+    def test_known_cases(self):
+        for text in CASES:
+            self.assertSameAsPipeline(text)
+
+    def test_generated_cases(self):
+        for text in generated_cases(3000):
+            self.assertSameAsPipeline(text)
+
+    def test_content_tree(self):
+        root = os.path.join(os.path.dirname(__file__), "..", "content")
+        for path in glob.glob(os.path.join(root, "**", "*.md"), recursive=True):
+            with open(path, encoding="utf-8") as f:
+                for line in f.read().splitlines():
+                    self.assertSameAsPipeline(line)
+
+    def test_many_links_is_linear(self):
+        text = " ".join(f"[link{i}](/page/{i})" for i in range(20000))
+        nodes = tokenize_inline(text)
+        self.assertEqual(len(nodes), 39999)
+        self.assertEqual(nodes[-1], TextNode("link19999", TextType.LINK, "/page/19999"))
+
+if __name__ == "__main__":
+    unittest.main()
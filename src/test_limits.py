@@ -0,0 +1,71 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from inline_markdown import text_to_text_nodes
+from limits import PageLimitError, PageLimits
+
+def parse_forever():
+    # each call is long, so the alarm all but always lands inside the parser
+    # rather than in this loop
+    while True:
+        text_to_text_nodes("_a_ [b](/c) " * 5000)
+
+class TestPageLimits(unittest.TestCase):
+    def test_check_size(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'page.md')
+            with open(path, 'w') as f:
+                f.write('x' * 11)
+            PageLimits(max_bytes=11).check_size(path)
+            PageLimits(max_bytes=0).check_size(path)
+            with self.assertRaisesRegex(PageLimitError, r'11 bytes is over the 10 byte .* \(stage: read\)'):
+                PageLimits(max_bytes=10).check_size(path)
+
+    def test_watchdog(self):
+        start = time.perf_counter()
+        with self.assertRaisesRegex(PageLimitError, r'0.05s page time limit \(stage: inline parsing\)'):
+            with PageLimits(max_seconds=0.05).watchdog():
+                parse_forever()
+        self.assertLess(time.perf_counter() - start, 2)
+        # the alarm is cancelled on the way out
+        with PageLimits(max_seconds=0.05).watchdog():
+            pass
+        time.sleep(0.1)
+
+    def test_watchdog_paused(self):
+        with PageLimits(max_seconds=0.05).watchdog() as watchdog:
+            with watchdog.paused():
+                time.sleep(0.1)
+            # the clock runs for the fragments, not for what is done with them
+            fragments = []
+            with watchdog.paused():
+                for fragment in watchdog.running(iter('abc'), chunk_chars=1):
+                    time.sleep(0.03)
+                    fragments.append(fragment)
+            self.assertEqual(fragments, ['a', 'b', 'c'])
+            with watchdog.paused():
+                self.assertEqual(list(watchdog.running(iter('abc'), chunk_chars=2)), ['ab', 'c'])
+            # outside paused() the fragments are passed on as they come
+            self.assertEqual(list(watchdog.running(iter('abc'), chunk_chars=2)), ['a', 'b', 'c'])
+            with self.assertRaisesRegex(PageLimitError, r'stage: inline parsing'):
+                with watchdog.paused():
+                    for _ in watchdog.running(iter(parse_forever, None)):
+                        pass
+
+    def test_watchdog_off_main_thread(self):
+        done = []
+
+        def run():
+            with PageLimits(max_seconds=0.01).watchdog():
+                time.sleep(0.05)
+            done.append(True)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual(done, [True])
+
+if __name__ == '__main__':
+    unittest.main()
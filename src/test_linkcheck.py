@@ -0,0 +1,97 @@
+import copy
+import os
+import unittest
+from unittest import mock
+from linkcheck import LinkChecker, check_site, output_index, resolve
+from testutil import TempDirTestCase
+
+def record(output, refs=()):
+    return {'output': output, 'refs': [list(ref) for ref in refs]}
+
+class TestLinkCheck(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write('template.html', '<link href="/index.css">\n<a href="/about">{{ Content }}</a>\n'
+                                    '<img src="{{ Logo }}"><a href="//cdn.org/x">')
+        self.write('static/index.css', 'body {}\nh1 { background: url("images/bg.png") }')
+        self.manifest = {
+            'assets': {'index.css': record('index.css'), 'images/bg.png': record('images/bg.png'),
+                       'images/a.png': record('images/a.png'), 'unused.txt': record('unused.txt')},
+            'pages': {
+                'index.md': record('index.html', [('/blog/tom', 3, False), ('blog/gone', 4, False),
+                                                  ('https://x.org/', 5, False), ('#top', 5, False)]),
+                'blog/tom/index.md': record('blog/tom/index.html', [('../../images/a.png?v=1', 1, True),
+                                                                    ('/missing.png', 2, True)]),
+            },
+        }
+
+    def check(self, basepath='/', previous=None):
+        return check_site(self.manifest, 'content', self.path('static'), [self.path('template.html')], basepath,
+                          previous)
+
+    def checked_pages(self, previous):
+        # the outputs of the pages checked again, and check_site's result
+        with mock.patch.object(LinkChecker, 'check_page', autospec=True,
+                               side_effect=LinkChecker.check_page) as check_page:
+            result = self.check(previous=previous)
+        return sorted(call.args[1]['output'] for call in check_page.call_args_list), result
+
+    def test_resolve(self):
+        index = output_index(self.manifest)
+        self.assertEqual(index['/blog/tom'], 'blog/tom/index.html')
+        self.assertEqual(index['/'], 'index.html')
+        self.assertEqual(resolve('/blog/tom/', '/x'), '/blog/tom')
+        self.assertEqual(resolve('../a%20b.png#x', '/blog/tom'), '/blog/a b.png')
+        self.assertIsNone(resolve('mailto:a@b.org', '/'))
+        self.assertIsNone(resolve('?page=2', '/'))
+
+    def test_check_site(self):
+        broken, orphans, results = self.check()
+        self.assertEqual(broken, [
+            ('content/blog/tom/index.md', 2, '/missing.png', 'no such page or file'),
+            ('content/index.md', 4, 'blog/gone', 'no such page or file'),
+            (self.path('template.html'), 2, '/about', 'no such page or file'),
+        ])
+        self.assertEqual(orphans, [os.path.join(self.path('static'), 'unused.txt')])
+        self.assertEqual(results, {
+            'index.md': {'broken': [[4, 'blog/gone', 'no such page or file']], 'uses': []},
+            'blog/tom/index.md': {'broken': [[2, '/missing.png', 'no such page or file']],
+                                  'uses': ['images/a.png']},
+        })
+
+    def test_only_affected_pages_checked_again(self):
+        self.manifest['pages']['about.md'] = record('about.html', [('/', 1, False)])
+        self.manifest['basepath'] = '/'
+        first = self.check()
+        self.manifest['linkcheck'] = first[2]
+        previous = copy.deepcopy(self.manifest)
+        self.assertEqual(self.checked_pages(previous), ([], first))
+        self.assertEqual(self.checked_pages(dict(previous, basepath='/site/'))[0],
+                         ['about.html', 'blog/tom/index.html', 'index.html'])
+        # a new page: only pages with broken refs might now reach it
+        self.manifest['pages']['blog/gone/index.md'] = record('blog/gone/index.html')
+        checked, (broken, _, self.manifest['linkcheck']) = self.checked_pages(previous)
+        self.assertEqual(checked, ['blog/gone/index.html', 'blog/tom/index.html', 'index.html'])
+        self.assertNotIn(('content/index.md', 4, 'blog/gone', 'no such page or file'), broken)
+        # a removed file: only the pages that used it
+        previous = copy.deepcopy(self.manifest)
+        del self.manifest['assets']['images/a.png']
+        checked, (broken, _, _) = self.checked_pages(previous)
+        self.assertEqual(checked, ['blog/tom/index.html'])
+        self.assertIn(('content/blog/tom/index.md', 1, '../../images/a.png?v=1', 'no such page or file'), broken)
+        # changed refs
+        self.manifest['pages']['about.md'] = record('about.html', [('/about', 1, False)])
+        self.assertEqual(self.checked_pages(previous)[0], ['about.html', 'blog/tom/index.html'])
+        # a removed page: every page
+        previous = copy.deepcopy(self.manifest)
+        del self.manifest['pages']['blog/gone/index.md']
+        checked, (broken, _, _) = self.checked_pages(previous)
+        self.assertEqual(checked, ['about.html', 'blog/tom/index.html', 'index.html'])
+        self.assertIn(('content/index.md', 4, 'blog/gone', 'no such page or file'), broken)
+
+    def test_protocol_relative_under_basepath(self):
+        broken, _, _ = self.check('/site/')
+        self.assertIn((self.path('template.html'), 3, '//cdn.org/x', 'rewritten to /site//cdn.org/x'), broken)
+
+if __name__ == '__main__':
+    unittest.main()
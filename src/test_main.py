@@ -1,5 +1,21 @@
+import contextlib
+import json
+import io
+import os
+import time
 import unittest
-from main import extract_title
+from unittest import mock
+from block_markdown import block_memo
+from cache import RenderCache
+from minify import MINIFY_VERSION, Minifier
+from limits import PageLimits
+from pageindex import PageIndex
+from main import BuildError, build, build_targets, extract_title, load_template, parse_args
+from manifest import load_manifest
+from profiling import BuildProfile
+from search import SearchIndex
+from testutil import SiteTestCase
+import main
 
 class TestMain(unittest.TestCase):
     def test_extract_title(self):
@@ -11,6 +27,476 @@ class TestMain(unittest.TestCase):
         markdown = "No title here."
         with self.assertRaises(ValueError):
             extract_title(markdown)
-            
+
+class TestIncrementalBuild(SiteTestCase):
+    def build(self, basepath='/', **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return build(basepath, self.path('static'), self.path('content'),
+                         self.path('template.html'), self.path('docs'), **kwargs)
+
+    def mark(self, rel_path):
+        # overwrite an output so we can tell whether the next build touched it
+        with open(self.path(rel_path), 'w', encoding='utf-8') as f:
+            f.write('stale')
+
+    def test_full_build(self):
+        manifest = self.build()
+        self.assertEqual(sorted(manifest['pages']), ['blog/post/index.md', 'index.md'])
+        self.assertEqual(manifest['pages']['index.md']['output'], 'index.html')
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+        self.assertEqual(self.read('docs/index.css'), "body {}")
+
+    def test_only_dirty_pages_rebuilt(self):
+        self.build()
+        self.mark('docs/index.html')
+        css_stat = os.stat(self.path('docs/index.css'))
+        self.write('content/blog/post/index.md', "# Post\n\nChanged")
+        self.build()
+        self.assertEqual(self.read('docs/index.html'), 'stale')
+        self.assertEqual(os.stat(self.path('docs/index.css')).st_ino, css_stat.st_ino)
+        self.assertIn('<p>Changed</p>', self.read('docs/blog/post/index.html'))
+
+    def test_changed_paths_only(self):
+        # as in watch mode: the previous manifest is at hand, and the paths
+        # that changed are all a build looks at
+        manifest = self.build()
+        self.mark('docs/index.html')
+        self.write('content/blog/post/index.md', "# Post\n\nChanged")
+        self.write('content/new.md', "# New\n\n[home](/)")
+        os.remove(self.path('static/index.css'))
+        changed = {self.path(rel_path) for rel_path in ('content/blog/post/index.md', 'content/new.md',
+                                                        'static/index.css')}
+        with mock.patch('main.walk_files', side_effect=AssertionError), \
+             mock.patch('assets.walk_files', side_effect=AssertionError):
+            manifest = self.build(previous=manifest, changed=changed)
+        self.assertEqual(self.read('docs/index.html'), 'stale')
+        self.assertIn('<p>Changed</p>', self.read('docs/blog/post/index.html'))
+        self.assertIn('<a href="/">home</a>', self.read('docs/new.html'))
+        self.assertFalse(os.path.exists(self.path('docs/index.css')))
+        self.assertEqual(sorted(manifest['pages']), ['blog/post/index.md', 'index.md', 'new.md'])
+        self.assertEqual(manifest['assets'], {})
+        # the same as a build that walks everything
+        self.assertEqual(load_manifest(self.path('docs')), manifest)
+        self.assertEqual(self.build(), manifest)
+
+    def test_changed_paths_skip_whole_site_passes(self):
+        index = PageIndex(self.path('index.db'))
+        self.addCleanup(index.close)
+        manifest = self.build(index=index)
+        # nothing the build reads: not even the manifest is written again
+        with mock.patch('main.check_site', side_effect=AssertionError), \
+             mock.patch.object(index, 'update', side_effect=AssertionError), \
+             mock.patch('main.save_manifest', side_effect=AssertionError):
+            self.assertEqual(self.build(previous=manifest, index=index, changed={self.path('notes.txt')}),
+                             manifest)
+        # a page whose links stay the same: no link check
+        self.write('content/blog/post/index.md', "# Post\n\nChanged")
+        with mock.patch('main.check_site', side_effect=AssertionError):
+            manifest = self.build(previous=manifest, index=index,
+                                  changed={self.path('content/blog/post/index.md')})
+        self.assertIn('<p>Changed</p>', self.read('docs/blog/post/index.html'))
+        # a new directory is walked, and the new page's link checked
+        self.write('content/blog/new/index.md', "# New\n\n[gone](/gone)")
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr):
+            build('/', self.path('static'), self.path('content'), self.path('template.html'),
+                  self.path('docs'), previous=manifest, index=index, changed={self.path('content/blog/new')})
+        self.assertIn("Broken link in", stderr.getvalue())
+        self.assertEqual(sorted(page['title'] for page in index.pages()), ['Home', 'New', 'Post'])
+
+    def test_template_change_rebuilds_all(self):
+        self.build()
+        self.mark('docs/index.html')
+        self.write('template.html', '<h1>{{ Title }}</h1>{{ Content }}')
+        self.build()
+        self.assertTrue(self.read('docs/index.html').startswith('<h1>Home</h1>'))
+
+    def test_basepath_change_rebuilds_all(self):
+        self.build()
+        self.build('/site/')
+        self.assertIn('href="/site/blog/post"', self.read('docs/index.html'))
+
+    def test_deleted_sources_removed(self):
+        self.build()
+        os.remove(self.path('content/blog/post/index.md'))
+        os.remove(self.path('static/index.css'))
+        manifest = self.build()
+        self.assertNotIn('blog/post/index.md', manifest['pages'])
+        self.assertFalse(os.path.exists(self.path('docs/blog')))
+        self.assertFalse(os.path.exists(self.path('docs/index.css')))
+
+    def test_missing_output_regenerated(self):
+        self.build()
+        os.remove(self.path('docs/index.html'))
+        self.build()
+        self.assertIn('<title>Home</title>', self.read('docs/index.html'))
+
+    def test_parallel_build_matches_serial(self):
+        for i in range(6):
+            self.write(f'content/blog/p{i}/index.md', f"# Post {i}\n\nBody **{i}**")
+        self.build()
+        serial = {rel: self.read(os.path.join('docs', rel)) for rel in
+                  [f'blog/p{i}/index.html' for i in range(6)] + ['index.html']}
+        self.build(clean=True, jobs=3)
+        for rel, html in serial.items():
+            self.assertEqual(self.read(os.path.join('docs', rel)), html)
+
+    def test_page_errors_reported_per_page(self):
+        self.write('content/broken/index.md', "# Broken\n\nan **unclosed bold")
+        with self.assertRaises(BuildError) as cm:
+            self.build(jobs=2)
+        self.assertEqual(list(cm.exception.failures), [self.path('content/broken/index.md')])
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+        # the failed page stays dirty for the next build
+        self.write('content/broken/index.md', "# Broken\n\nfixed")
+        manifest = self.build()
+        self.assertIn('broken/index.md', manifest['pages'])
+
+    def test_failed_page_keeps_its_last_good_record(self):
+        index = PageIndex(':memory:')
+        search = SearchIndex(self.path('.cache/search'))
+        self.build(index=index, search=search)
+        self.write('content/blog/post/index.md', "# Post\n\nan **unclosed bold")
+        stderr = io.StringIO()
+        for _ in range(2):
+            with self.assertRaises(BuildError) as cm, contextlib.redirect_stderr(stderr):
+                build('/', self.path('static'), self.path('content'), self.path('template.html'),
+                      self.path('docs'), index=index, search=search)
+            record = cm.exception.manifest['pages']['blog/post/index.md']
+            self.assertTrue(record['failed'])
+        # the live page is still listed, searchable and linked to
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+        self.assertEqual(sorted(page['title'] for page in index.pages()), ['Home', 'Post'])
+        with open(self.path('docs/search/he.json'), encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)['hello']), 1)
+        self.assertNotIn('Broken link', stderr.getvalue())
+        self.write('content/blog/post/index.md', "# Post\n\nFixed")
+        manifest = self.build(index=index, search=search)
+        self.assertNotIn('failed', manifest['pages']['blog/post/index.md'])
+        index.close()
+
+    def test_profiled_build_matches_plain(self):
+        self.build()
+        expected = self.read('docs/index.html')
+        profile = BuildProfile()
+        self.build(clean=True, profile=profile)
+        self.assertEqual(self.read('docs/index.html'), expected)
+        self.assertEqual(sorted(profile.pages), [self.path('content/blog/post/index.md'),
+                                                 self.path('content/index.md')])
+        stages = profile.pages[self.path('content/index.md')]
+        self.assertEqual(list(stages), ['read', 'blocks', 'inline', 'render', 'template', 'write'])
+        self.assertIn('assets', profile.report()['phases'])
+
+    def test_cached_render_matches_uncached(self):
+        self.build('/site/')
+        expected = {rel: self.read(rel) for rel in ('docs/index.html', 'docs/blog/post/index.html')}
+        cache = RenderCache(self.path('cache'))
+        self.build('/site/', clean=True, cache=cache)
+        for profile in (None, BuildProfile()):
+            self.mark('docs/index.html')
+            # served from the cache: no source is parsed
+            with mock.patch('main.iter_markdown_html', side_effect=AssertionError), \
+                 mock.patch('main.iter_numbered_block_lines', side_effect=AssertionError):
+                self.build('/site/', clean=True, cache=cache, profile=profile)
+            for rel, html in expected.items():
+                self.assertEqual(self.read(rel), html)
+
+    def test_cache_miss_streams_and_fills_cache(self):
+        source = self.read('content/index.md')
+        for template in ('<title>{{ Title }}</title>{{ Content }}', '<title>{{ Title }}</title>'):
+            self.write('template.html', template)
+            cache = RenderCache(self.path(f'cache{len(template)}'))
+            # a miss streams the page, without reading the source in one piece
+            with mock.patch('main.read_markdown', side_effect=AssertionError), \
+                 mock.patch('main.render_content', side_effect=AssertionError):
+                manifest = self.build(cache=cache)
+            entry = cache.get(manifest['pages']['index.md']['hash'])
+            self.assertEqual(entry, main.render_content(source))
+
+    def test_cache_survives_template_change(self):
+        cache = RenderCache(self.path('cache'))
+        self.build(cache=cache)
+        self.write('template.html', '<h1>{{ Title }}</h1><a href="/x">x</a>{{ Content }}')
+        with mock.patch('main.iter_markdown_html', side_effect=AssertionError):
+            self.build('/site/', cache=cache)
+        self.assertEqual(self.read('docs/index.html'),
+                         '<h1>Home</h1><a href="/site/x">x</a>'
+                         '<div><h1>Home</h1><p><a href="/site/blog/post">Post</a></p></div>')
+
+    def test_block_memo_stats(self):
+        block_memo.clear()
+        for i in range(3):
+            self.write(f'content/p{i}/index.md', f"# P{i}\n\n> Shared disclaimer\n\nBody {i}")
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            build('/', self.path('static'), self.path('content'), self.path('template.html'),
+                  self.path('docs'))
+        # the quote is parsed for the first page only
+        self.assertIn("block_memo 2/", out.getvalue())
+        self.assertIn('<blockquote>Shared disclaimer</blockquote>', self.read('docs/p2/index.html'))
+
+    def test_partial_change_rebuilds_dependents_only(self):
+        self.write('template.html', '{{> nav.html }}<title>{{ Title }}</title>{{ Content }}')
+        self.write('nav.html', '<nav>v1</nav>')
+        manifest = self.build()
+        self.assertEqual(manifest['pages']['index.md']['deps'],
+                         [self.path('template.html'), self.path('nav.html')])
+        self.mark('docs/index.html')
+        self.build()
+        self.assertEqual(self.read('docs/index.html'), 'stale')
+        self.write('nav.html', '<nav>v2</nav>')
+        self.build()
+        self.assertTrue(self.read('docs/index.html').startswith('<nav>v2</nav>'))
+
+    def test_refs_recorded(self):
+        for kwargs in ({}, {'cache': RenderCache(self.path('cache'))}, {'profile': BuildProfile()}):
+            manifest = self.build(clean=True, **kwargs)
+            self.assertEqual(manifest['pages']['index.md']['refs'], [['/blog/post', 3, False]])
+            self.assertNotIn('links', manifest['pages']['index.md'])
+        # unchanged pages keep their refs
+        self.write('content/blog/post/index.md', "# Post\n\n[home](/)")
+        manifest = self.build()
+        self.assertEqual(manifest['pages']['index.md']['refs'], [['/blog/post', 3, False]])
+        self.assertEqual(manifest['pages']['blog/post/index.md']['refs'], [['/', 3, False]])
+
+    def test_async_driver_matches_serial(self):
+        for i in range(6):
+            self.write(f'content/blog/p{i}/index.md', f"# P{i}\n\n> shared\n\n[home](/) **{i}**")
+        self.build()
+        serial = {rel: self.read(os.path.join('docs', rel)) for rel in
+                  [f'blog/p{i}/index.html' for i in range(6)] + ['index.html']}
+        cache = RenderCache(self.path('cache'))
+        for kwargs in ({}, {'jobs': 2}, {'cache': cache}, {'cache': cache, 'jobs': 2}):
+            manifest = self.build(clean=True, io_concurrency=3, **kwargs)
+            for rel, html in serial.items():
+                self.assertEqual(self.read(os.path.join('docs', rel)), html)
+            self.assertEqual(manifest['pages']['blog/p0/index.md']['refs'], [['/', 5, False]])
+
+    def test_async_driver_reports_page_errors(self):
+        self.write('content/broken/index.md', "# Broken\n\nan **unclosed bold")
+        with self.assertRaises(BuildError) as cm:
+            self.build(io_concurrency=2)
+        self.assertEqual(list(cm.exception.failures), [self.path('content/broken/index.md')])
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+
+    def test_unchanged_outputs_keep_mtime(self):
+        self.build()
+        os.utime(self.path('docs/index.html'), ns=(0, 0))
+        # the source changed but renders to the same page
+        self.write('content/index.md', self.read('content/index.md') + "\n\n")
+        self.build()
+        self.assertEqual(os.stat(self.path('docs/index.html')).st_mtime_ns, 0)
+        self.write('content/index.md', "# Home\n\nNew")
+        self.build()
+        self.assertNotEqual(os.stat(self.path('docs/index.html')).st_mtime_ns, 0)
+
+    def test_publish_swaps_only_complete_builds(self):
+        self.build(publish=True)
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+        self.write('content/blog/post/index.md', "# Post\n\nan **unclosed bold")
+        with self.assertRaises(BuildError):
+            self.build(publish=True)
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+        self.write('content/blog/post/index.md', "# Post\n\nFixed")
+        self.build(publish=True)
+        self.assertIn('<p>Fixed</p>', self.read('docs/blog/post/index.html'))
+        self.assertIn('<p>Hello</p>', self.read('docs.prev/blog/post/index.html'))
+        self.assertEqual(self.read('docs/index.css'), "body {}")
+
+    def test_targets_parse_once(self):
+        self.build()
+        with contextlib.redirect_stdout(io.StringIO()):
+            build('/site/', self.path('static'), self.path('content'), self.path('template.html'),
+                  self.path('site'))
+        expected = {rel: self.read(rel) for rel in ('docs/index.html', 'site/index.html')}
+        self.assertIn('href="/site/blog/post"', expected['site/index.html'])
+        targets = [('/', self.path('docs')), ('/site/', self.path('site'))]
+        with mock.patch('main.iter_markdown_html', wraps=main.iter_markdown_html) as render, \
+             contextlib.redirect_stdout(io.StringIO()):
+            manifests = build_targets(targets, static_dir=self.path('static'), content_dir=self.path('content'),
+                                      template_path=self.path('template.html'), clean=True)
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(sorted(manifests), [self.path('docs'), self.path('site')])
+        for rel, html in expected.items():
+            self.assertEqual(self.read(rel), html)
+
+    def test_target_arguments(self):
+        args = parse_args(['--target', '/a/=out/a', '--target', '/=out/b'])
+        self.assertEqual(args.targets, [('/a/', 'out/a'), ('/', 'out/b')])
+        self.assertEqual(parse_args(['/p/']).targets, [('/p/', 'docs')])
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in (['--target', '/a/'], ['--target', '/=x', '--target', '/a/=x'],
+                         ['--target', '/=x', '--target', '/a/=y', '--explain', 'index.md']):
+                with self.assertRaises(SystemExit):
+                    parse_args(argv)
+
+    def test_explain_and_rollback_use_targets(self):
+        self.build()
+        site, docs = self.path('site'), self.path('docs')
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main.main(['--target', f'/={docs}', '--explain', 'index.md'])
+        self.assertIn('blog/post/index.md', stdout.getvalue())
+        out = self.path('out')
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            build('/x/', self.path('static'), self.path('content'), self.path('template.html'), out)
+        for target in (os.path.join(out, 'blog', 'post', 'index.html'), '/x/blog/post/'):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                main.main(['--target', f'/x/={out}', '--explain', target])
+            self.assertIn(f"output: {os.path.join(out, 'blog', 'post', 'index.html')}", stdout.getvalue())
+        self.write('site/index.html', 'site')
+        self.write('site.prev/index.html', 'site, before')
+        targets = ['--target', f'/={docs}', '--target', f'/site/={site}', '--rollback']
+        with self.assertRaises(SystemExit):
+            main.main(targets)
+        self.assertEqual(self.read('site/index.html'), 'site')
+        self.write('docs.prev/index.html', 'docs, before')
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.main(targets)
+        self.assertEqual(self.read('site/index.html'), 'site, before')
+        self.assertEqual(self.read('docs/index.html'), 'docs, before')
+
+    def test_gzip_outputs(self):
+        self.write('content/index.md', "# Home\n\n" + "Some text that repeats. " * 50)
+        self.build(compress=True)
+        self.assertTrue(os.path.exists(self.path('docs/index.html.gz')))
+        os.remove(self.path('content/index.md'))
+        self.build(compress=True)
+        self.assertFalse(os.path.exists(self.path('docs/index.html.gz')))
+        self.build()
+        self.assertFalse(os.path.exists(self.path('docs/blog/post/index.html.gz')))
+
+    def test_minify(self):
+        self.write('template.html', '<html>\n  <body>\n    {{ Content }}\n  </body>\n</html>\n')
+        self.write('content/blog/post/index.md', "# Post\n\n```\ncode\n  stays\n```")
+        self.write('static/index.css', "body {\n  margin: 0;\n}\n")
+        self.build(minify=Minifier())
+        self.assertEqual(self.read('docs/blog/post/index.html'),
+                         '<html><body> <div><h1>Post</h1><pre><code>code\n  stays\n</code></pre></div> </body></html>')
+        self.assertEqual(self.read('docs/index.css'), "body{margin:0}")
+        # a new minifier version redoes the minified outputs
+        self.mark('docs/index.css')
+        self.mark('docs/blog/post/index.html')
+        with mock.patch('main.MINIFY_VERSION', MINIFY_VERSION + 1):
+            self.build(minify=Minifier())
+        self.assertEqual(self.read('docs/index.css'), "body{margin:0}")
+        self.assertTrue(self.read('docs/blog/post/index.html').startswith('<html><body>'))
+        # turning it off again restores the plain outputs
+        self.build()
+        self.assertEqual(self.read('docs/index.css'), "body {\n  margin: 0;\n}\n")
+        self.assertTrue(self.read('docs/index.html').startswith('<html>\n  <body>'))
+
+    def test_front_matter(self):
+        self.write('template.html', '<title>{{ Title }}</title><time>{{ Date }}</time>{{ Tags }}|{{ Content }}')
+        self.write('content/blog/post/index.md', "---\ntitle: Meta\ndate: 2024-01-01\ntags: [a, b]\n---\n# Post\n\nHello")
+        index = PageIndex(':memory:')
+        expected = ('<title>Meta</title><time>2024-01-01</time>a, b|'
+                    '<div><h1>Post</h1><p>Hello</p></div>')
+        for kwargs in ({}, {'cache': RenderCache(self.path('cache'))}, {'profile': BuildProfile()}):
+            self.build(clean=True, index=index, **kwargs)
+            self.assertEqual(self.read('docs/blog/post/index.html'), expected)
+        self.assertTrue(self.read('docs/index.html').startswith('<title>Home</title><time></time>|'))
+        self.assertEqual([page['title'] for page in index.pages('a')], ['Meta'])
+
+    def test_search_index(self):
+        index = SearchIndex(self.path('cache/search'))
+        with mock.patch('search.read_terms', side_effect=AssertionError):
+            self.build(search=index, compress=True, compress_ratio=2)
+        self.assertFalse(os.path.exists(self.path('docs/.search.json')))
+        self.assertTrue(os.path.exists(index.state_path(self.path('docs'))))
+        with open(self.path('docs/search/docs.json')) as f:
+            self.assertEqual(json.load(f)['docs'], {'0': ['/', 'Home'], '1': ['/blog/post/', 'Post']})
+        self.assertTrue(os.path.exists(self.path('docs/search/docs.json.gz')))
+        self.assertFalse(os.path.exists(self.path('docs/.search.json.gz')))
+        self.build()
+        self.assertFalse(os.path.exists(self.path('docs/search')))
+        self.assertFalse(os.path.exists(self.path('docs/.search.json')))
+
+    def test_search_terms_collected_while_rendering(self):
+        for kwargs in ({}, {'cache': RenderCache(self.path('cache'))}, {'profile': BuildProfile()}):
+            # blocks memoized by a build without search have no terms yet
+            block_memo.clear()
+            self.build(clean=True)
+            with mock.patch('search.page_terms', side_effect=AssertionError):
+                self.build(clean=True, search=SearchIndex(self.path('cache/search')), **kwargs)
+            with open(self.path('docs/search/he.json')) as f:
+                self.assertEqual(json.load(f), {'hello': [[1, 1]]})
+            with open(self.path('docs/search/po.json')) as f:
+                self.assertEqual(json.load(f), {'post': [[0, 1], [1, 1]]})
+
+    def test_link_check(self):
+        self.write('content/blog/post/index.md', "---\ntitle: Post\n---\n# Post\n\n[gone](/gone)")
+        self.write('static/unused.png', "")
+        # the last one is a rebuild, reporting what the first found
+        for kwargs in ({}, {'cache': RenderCache(self.path('cache'))}, {'profile': BuildProfile()},
+                       {'clean': False}):
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                build('/', self.path('static'), self.path('content'), self.path('template.html'),
+                      self.path('docs'), **dict({'clean': True}, **kwargs))
+            self.assertIn(f"Broken link in {self.path('content/blog/post/index.md')}:6: /gone", stderr.getvalue())
+            self.assertIn(f"Orphan asset: {self.path('static/unused.png')}", stdout.getvalue())
+            self.assertEqual(stderr.getvalue().count("Broken link"), 1)
+
+    def test_page_limits(self):
+        self.write('content/big.md', "# Big\n\n" + "word " * 100)
+        for kwargs in ({}, {'jobs': 2}, {'io_concurrency': 2}):
+            with self.assertRaises(BuildError) as e:
+                self.build(clean=True, limits=PageLimits(max_bytes=100), **kwargs)
+            error = e.exception.failures[self.path('content/big.md')]
+            self.assertIn("over the 100 byte page size limit (stage: read)", error)
+            self.assertTrue(os.path.exists(self.path('docs/blog/post/index.html')))
+            self.assertNotIn('big.md', e.exception.manifest['pages'])
+
+    def test_page_time_limit(self):
+        def slow_page(*args):
+            time.sleep(5)
+        with mock.patch('main.build_page', side_effect=slow_page):
+            with self.assertRaises(BuildError) as e:
+                self.build(limits=PageLimits(max_seconds=0.05))
+        self.assertEqual(len(e.exception.failures), 2)
+        self.assertIn("took longer than the 0.05s page time limit",
+                      e.exception.failures[self.path('content/index.md')])
+
+    def test_page_time_limit_leaves_out_writes(self):
+        def slow_write(dest_path, html):
+            time.sleep(0.1)
+            return main.write_output(dest_path, html)
+        cache = RenderCache(self.path('cache'))
+        with mock.patch('main.write_page', side_effect=slow_write), \
+             mock.patch.object(cache, 'put', side_effect=lambda *args: time.sleep(0.1)):
+            for kwargs in ({}, {'cache': cache}, {'profile': BuildProfile()}):
+                self.build(clean=True, limits=PageLimits(max_seconds=0.05), **kwargs)
+        self.assertIn('<p>Hello</p>', self.read('docs/blog/post/index.html'))
+
+    def test_template_error_fails_build(self):
+        manifest = self.build()
+        for text, error in (('{{> missing.html }}{{ Content }}', 'FileNotFoundError'),
+                            ('{{> template.html }}{{ Content }}', 'template include cycle')):
+            self.write('template.html', text)
+            with self.assertRaises(BuildError) as e:
+                self.build()
+            self.assertIn(f"template {self.path('template.html')} failed to load", str(e.exception))
+            self.assertIn(error, e.exception.failures[self.path('template.html')])
+            self.assertEqual(e.exception.manifest, manifest)
+            targets = [('/', self.path('docs')), ('/base/', self.path('site'))]
+            with self.assertRaises(BuildError) as e:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    build_targets(targets, static_dir=self.path('static'), content_dir=self.path('content'),
+                                  template_path=self.path('template.html'))
+            self.assertIn("failed to load", str(e.exception))
+
+    def test_template_kept_between_builds(self):
+        path = self.path('template.html')
+        template, inputs = load_template(path, '/', None, {})
+        with mock.patch('main.Template.from_file', side_effect=AssertionError):
+            self.assertIs(load_template(path, '/', None, inputs)[0], template)
+        self.write('template.html', '<b>{{ Content }}</b>')
+        changed, records = load_template(path, '/', None, inputs)
+        self.assertIsNot(changed, template)
+        self.assertNotEqual(records[path]['hash'], inputs[path]['hash'])
+        self.assertIsNot(load_template(path, '/base/', None, inputs)[0], changed)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from unittest import mock
+import minify
+from cache import RenderCache
+from minify import MINIFY_VERSION, Minifier, minify_css, minify_html
+
+class TestMinify(unittest.TestCase):
+    def test_minify_html(self):
+        html = ("<!doctype html>\n<html>\n  <head>\n    <!-- note -->\n    <title>{{ Title }}</title>\n"
+                "  </head>\n  <body>\n    <p>a  <b>b</b> c</p>\n"
+                "<pre><code>keep\n    indent  </code></pre>\n  </body>\n</html>\n")
+        self.assertEqual(
+            minify_html(html),
+            "<!doctype html><html><head><title>{{ Title }}</title></head><body><p>a <b>b</b> c</p>"
+            "<pre><code>keep\n    indent  </code></pre></body></html>",
+        )
+
+    def test_minify_html_keeps_inline_code_and_scripts(self):
+        html = "<p>x <code>a   b</code></p>\n<script>\n  var a = 1;\n</script>"
+        self.assertEqual(minify_html(html), "<p>x <code>a   b</code></p><script>\n  var a = 1;\n</script>")
+
+    def test_minify_html_keeps_space_between_inline_elements(self):
+        html = ("<nav>\n  <a href=\"/\">Home</a>\n  <a href=\"/blog\">Blog</a>\n</nav>\n"
+                "<p>\n  <b>bold</b>\n  <code>x</code>\n  <i>italic</i>\n</p>\n<textarea>\n a\n</textarea>")
+        self.assertEqual(minify_html(html),
+                         '<nav><a href="/">Home</a> <a href="/blog">Blog</a></nav>'
+                         '<p><b>bold</b> <code>x</code> <i>italic</i></p><textarea>\n a\n</textarea>')
+
+    def test_minify_css_leaves_strings_and_urls_alone(self):
+        css = ('a::after { content: "x;}  /* y */"; }\n'
+               'b { background: url(data:image/svg+xml;utf8,<svg>;}</svg>); }')
+        self.assertEqual(minify_css(css), 'a::after{content:"x;}  /* y */"}'
+                                          'b{background:url(data:image/svg+xml;utf8,<svg>;}</svg>)}')
+
+    def test_minify_css(self):
+        css = ('/* theme */\nbody {\n  color: #fff;\n  font-family: "A  B", serif;\n}\n\n'
+               'h1,\nh2 > a :hover {\n  margin: 0 auto;\n}\n')
+        self.assertEqual(minify_css(css), 'body{color:#fff;font-family:"A  B",serif}h1,h2>a :hover{margin:0 auto}')
+
+    def test_minifier_cache(self):
+        with tempfile.TemporaryDirectory() as root:
+            minifier = Minifier(RenderCache(root, version=MINIFY_VERSION))
+            self.assertEqual(minifier.css('a {  }'), 'a{}')
+            with mock.patch.object(minify, 'minify_css', side_effect=AssertionError):
+                self.assertEqual(Minifier(RenderCache(root, version=MINIFY_VERSION)).css('a {  }'), 'a{}')
+            self.assertEqual(minifier.css_bytes('b { }'.encode()), b'b{}')
+
+if __name__ == '__main__':
+    unittest.main()
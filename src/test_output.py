@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from manifest import load_manifest, save_manifest
+from output import write_output
+from testutil import TempDirTestCase
+
+class TestWriteOutput(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output = self.path('a/index.html')
+
+    def test_skips_identical_contents(self):
+        for content in ('<p>ü</p>', iter(['<p>', 'ü', '</p>']), '<p>ü</p>'.encode()):
+            write_output(self.output, '<p>ü</p>')
+            os.utime(self.output, ns=(0, 0))
+            self.assertFalse(write_output(self.output, content))
+            self.assertEqual(os.stat(self.output).st_mtime_ns, 0)
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), ['index.html'])
+
+    def test_writes_changed_contents(self):
+        write_output(self.output, 'old')
+        # a hardlink to the old file shows it was replaced, not rewritten in place
+        os.link(self.output, self.path('old.html'))
+        self.assertTrue(write_output(self.output, 'new'))
+        self.assertTrue(write_output(self.output, iter(['new', ' stream'])))
+        self.assertEqual(self.read(self.output, binary=True), b'new stream')
+        self.assertEqual(self.read('old.html', binary=True), b'old')
+
+    def test_failed_stream_leaves_old_file(self):
+        write_output(self.output, 'old')
+
+        def fragments():
+            yield 'half'
+            raise ValueError("parse error")
+        with self.assertRaises(ValueError):
+            write_output(self.output, fragments())
+        self.assertEqual(self.read(self.output, binary=True), b'old')
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), ['index.html'])
+
+    def test_failed_rename_cleans_up(self):
+        with mock.patch('os.replace', side_effect=OSError("disk")):
+            with self.assertRaises(OSError):
+                write_output(self.output, 'x')
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), [])
+
+    def test_failed_write_cleans_up(self):
+        write_output(self.output, 'old')
+        real_open = open
+
+        class FullDisk:
+            def __init__(self, path, mode):
+                self.f = real_open(path, mode)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.f.close()
+
+            def write(self, data):
+                self.f.write(data[:1])
+                raise OSError("No space left on device")
+        with mock.patch('output.open', FullDisk, create=True):
+            with self.assertRaises(OSError):
+                write_output(self.output, 'new')
+        self.assertEqual(self.read(self.output, binary=True), b'old')
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), ['index.html'])
+
+class TestSaveManifest(unittest.TestCase):
+    def test_failed_save_cleans_up(self):
+        with tempfile.TemporaryDirectory() as dest_dir:
+            save_manifest(dest_dir, {'pages': {}})
+            names = os.listdir(dest_dir)
+            with self.assertRaises(TypeError):
+                save_manifest(dest_dir, {'pages': {'a.md': {'deps': {'not', 'json'}}}})
+            self.assertEqual(os.listdir(dest_dir), names)
+            self.assertEqual(load_manifest(dest_dir)['pages'], {})
+
+if __name__ == '__main__':
+    unittest.main()
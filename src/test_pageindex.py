@@ -0,0 +1,54 @@
+import os
+import unittest
+from unittest import mock
+import pageindex
+from pageindex import PageIndex, page_url
+from testutil import TempDirTestCase
+
+class TestPageIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pages = {}
+        self.write('index.md', "# Home\n\nbody")
+        self.write('blog/a/index.md', "---\ndate: 2024-01-02\ntags: [x, y]\nsummary: A\n---\n# Post A")
+        self.write('blog/b/index.md', "---\ntitle: Post B\ndate: 2023-06-01\ntags: [x]\n---\nbody")
+        self.index = PageIndex(os.path.join(self.root, 'cache', 'pages.sqlite'))
+
+    def tearDown(self):
+        self.index.close()
+
+    def write(self, rel_path, text):
+        path = super().write(os.path.join('content', rel_path), text)
+        stat = os.stat(path)
+        self.pages[rel_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                'output': rel_path[:-3] + '.html'}
+
+    def update(self):
+        return self.index.update(os.path.join(self.root, 'content'), self.pages)
+
+    def test_queries(self):
+        self.assertEqual(self.update(), (3, 0))
+        self.assertEqual([page['title'] for page in self.index.pages()], ['Post A', 'Post B', 'Home'])
+        self.assertEqual([page['url'] for page in self.index.pages('y')], ['/blog/a/'])
+        self.assertEqual(self.index.pages(limit=1)[0]['summary'], 'A')
+        self.assertEqual(self.index.tags(), [('x', 2), ('y', 1)])
+        self.assertEqual({year: [page['title'] for page in pages] for year, pages in self.index.archive().items()},
+                         {'2024': ['Post A'], '2023': ['Post B']})
+
+    def test_incremental_update(self):
+        self.update()
+        with mock.patch.object(pageindex, 'read_page_meta', side_effect=AssertionError):
+            self.assertEqual(self.update(), (0, 0))
+        self.write('blog/a/index.md', "---\ntags: [z]\n---\n# Post A")
+        del self.pages['index.md']
+        self.assertEqual(self.update(), (1, 1))
+        self.assertEqual(self.index.tags(), [('x', 1), ('z', 1)])
+        self.assertEqual(len(self.index.pages()), 2)
+
+    def test_page_url(self):
+        self.assertEqual(page_url('index.html'), '/')
+        self.assertEqual(page_url('blog/a/index.html'), '/blog/a/')
+        self.assertEqual(page_url('about.html'), '/about.html')
+
+if __name__ == '__main__':
+    unittest.main()
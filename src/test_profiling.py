@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import unittest
+from profiling import BuildProfile, StageTimer, profile_call
+
+class TestProfiling(unittest.TestCase):
+    def test_stage_timer(self):
+        timer = StageTimer()
+        with timer.stage('inline'):
+            data = [object() for _ in range(1000)]
+        with timer.stage('inline'):
+            pass
+        self.assertEqual(list(timer.stages), ['inline'])
+        self.assertGreater(timer.stages['inline']['seconds'], 0)
+        self.assertGreaterEqual(timer.stages['inline']['allocated_blocks'], 1000)
+        del data
+
+    def test_report_and_summary(self):
+        profile = BuildProfile()
+        with profile.phase('assets'):
+            pass
+        profile.add_page('slow.md', {'read': {'seconds': 0.5, 'allocated_blocks': 3},
+                                     'render': {'seconds': 1.0, 'allocated_blocks': 4}})
+        profile.add_page('fast.md', {'read': {'seconds': 0.1, 'allocated_blocks': 1}})
+        report = profile.report()
+        self.assertEqual(report['page_stage_totals']['read'], {'seconds': 0.6, 'allocated_blocks': 4})
+        self.assertEqual(report['pages']['slow.md']['seconds'], 1.5)
+        self.assertIn('assets', report['phases'])
+        lines = profile.summary(top=1).splitlines()
+        self.assertTrue(lines[-1].endswith('slow.md'))
+        self.assertFalse(any(line.endswith('fast.md') for line in lines))
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'report.json')
+            profile.write(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['pages']['fast.md']['seconds'], 0.1)
+
+    def test_profile_call(self):
+        with tempfile.TemporaryDirectory() as root:
+            prof_path = os.path.join(root, 'page.prof')
+            text = profile_call(lambda: sorted(range(1000), reverse=True), prof_path)
+            self.assertTrue(os.path.exists(prof_path))
+            self.assertIn('Peak traced memory', text)
+
+if __name__ == '__main__':
+    unittest.main()
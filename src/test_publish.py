@@ -0,0 +1,58 @@
+import contextlib
+import io
+import os
+import unittest
+from unittest import mock
+import publish
+from output import write_output
+from publish import exchange_paths, prepare_staging, rollback, swap_in
+from testutil import TempDirTestCase
+
+class TestPublish(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dest = self.path('docs')
+
+    def publish(self, text):
+        staging = prepare_staging(self.dest)
+        # builds replace files rather than writing into the shared links
+        write_output(os.path.join(staging, 'index.html'), text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cleanup = swap_in(staging, self.dest)
+        if cleanup is not None:
+            cleanup.join()
+
+    def test_exchange_paths(self):
+        a, b = os.path.join(self.root, 'a'), os.path.join(self.root, 'b')
+        self.write(os.path.join(a, 'f'), 'a')
+        self.write(os.path.join(b, 'f'), 'b')
+        exchange_paths(a, b)
+        self.assertEqual(self.read(os.path.join(a, 'f')), 'b')
+        with mock.patch.object(publish, '_renameat2', return_value=None):
+            exchange_paths(a, b)
+        self.assertEqual(self.read(os.path.join(a, 'f')), 'a')
+        self.assertEqual(sorted(os.listdir(self.root)), ['a', 'b'])
+
+    def test_staging_is_seeded_with_links(self):
+        self.write(os.path.join(self.dest, 'sub/page.html'), 'live')
+        staging = prepare_staging(self.dest)
+        self.assertEqual(os.stat(os.path.join(staging, 'sub/page.html')).st_ino,
+                         os.stat(os.path.join(self.dest, 'sub/page.html')).st_ino)
+        self.assertEqual(os.listdir(prepare_staging(self.dest, seed=False)), [])
+
+    def test_generations_and_rollback(self):
+        for text in ('v1', 'v2', 'v3'):
+            self.publish(text)
+        self.assertEqual(self.read(os.path.join(self.dest, 'index.html')), 'v3')
+        self.assertEqual(self.read(os.path.join(self.dest + '.prev', 'index.html')), 'v2')
+        self.assertEqual(sorted(os.listdir(self.root)), ['docs', 'docs.prev'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            rollback(self.dest)
+        self.assertEqual(self.read(os.path.join(self.dest, 'index.html')), 'v2')
+
+    def test_rollback_without_previous(self):
+        with self.assertRaises(FileNotFoundError):
+            rollback(self.dest)
+
+if __name__ == '__main__':
+    unittest.main()
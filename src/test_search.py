@@ -0,0 +1,127 @@
+import json
+import os
+import unittest
+import urllib.request
+from unittest import mock
+from urllib.parse import quote
+import search
+from manifest import hash_bytes
+from search import SearchIndex, page_terms, remove_search_index, shard_name, update_search_index
+from testutil import TempDirTestCase
+from watch import LiveReload, serve
+
+class TestPageTerms(unittest.TestCase):
+    def test_terms(self):
+        markdown = ("# The Shire\n\nSee **the** [map](/maps/shire) and ![a hobbit](/hobbit.png)\n\n"
+                    "- `Bag End`\n- 1. a\n\n> Not all who _wander_\n\n```\nrun(shire)\n```")
+        self.assertEqual(page_terms(markdown), {
+            'the': 2, 'shire': 2, 'see': 1, 'map': 1, 'and': 1, 'hobbit': 1, 'bag': 1, 'end': 1,
+            'not': 1, 'all': 1, 'who': 1, 'wander': 1, 'run': 1,
+        })
+
+    def test_shard_name(self):
+        self.assertEqual(shard_name('th'), 'th.json')
+        # a server decodes the client's encodeURIComponent('éo')
+        self.assertEqual(shard_name('éo'), 'éo.json')
+
+class TestSearchIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dest = os.path.join(self.root, 'docs')
+        self.state = os.path.join(self.root, 'cache', 'search', 'docs.json')
+        self.pages = {}
+        self.write('index.md', "# Home\n\nthe shire")
+        self.write('blog/a/index.md', "---\ntitle: Post A\n---\n# Heading\n\nthe mountain")
+
+    def write(self, rel_path, text):
+        super().write(os.path.join('content', rel_path), text)
+        self.pages[rel_path] = {'hash': hash_bytes(text.encode()), 'output': rel_path[:-3] + '.html'}
+
+    def update(self, basepath='/', rendered=None):
+        return update_search_index(self.dest, self.state, os.path.join(self.root, 'content'), self.pages,
+                                   basepath, rendered)
+
+    def read(self, name):
+        with open(os.path.join(self.dest, 'search', name)) as f:
+            return json.load(f)
+
+    def test_shards(self):
+        self.assertEqual(self.update('/site/'), (2, 5))
+        self.assertEqual(self.read('docs.json'), {'prefix_length': 2, 'docs': {
+            '0': ['/site/', 'Home'], '1': ['/site/blog/a/', 'Post A']}})
+        self.assertEqual(self.read('th.json'), {'the': [[0, 1], [1, 1]]})
+        self.assertEqual(self.read('sh.json'), {'shire': [[0, 1]]})
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dest, 'search'))),
+                         ['docs.json', 'he.json', 'ho.json', 'mo.json', 'sh.json', 'th.json'])
+
+    def test_accented_shard_served(self):
+        self.write('index.md', "# Home\n\nEärendil")
+        self.update()
+        server = serve(self.dest, 0, LiveReload())
+        try:
+            # the URL the client builds with encodeURIComponent
+            url = f"http://127.0.0.1:{server.server_address[1]}/search/{quote('eä', safe='')}.json"
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(json.load(response), {'eärendil': [[0, 1]]})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_stale_shards_removed_with_the_state(self):
+        os.makedirs(os.path.join(self.dest, 'search'))
+        with open(os.path.join(self.dest, 'search', '%C3%A9o.json'), 'w') as f:
+            f.write('{}')
+        self.update()
+        self.assertNotIn('%C3%A9o.json', os.listdir(os.path.join(self.dest, 'search')))
+
+    def test_incremental_update(self):
+        self.update()
+        with mock.patch.object(search, 'page_terms', side_effect=AssertionError):
+            self.assertEqual(self.update(), (0, 0))
+        mtime = os.stat(os.path.join(self.dest, 'search', 'ho.json')).st_mtime_ns
+        self.write('index.md', "# Home\n\nthe hills")
+        del self.pages['blog/a/index.md']
+        self.write('new.md', "# New\n\nshire")
+        # th.json and sh.json change, hi.json and ne.json are new, he.json and
+        # mo.json go with blog/a; ho.json has the same postings as before
+        self.assertEqual(self.update(), (2, 6))
+        self.assertEqual(self.read('th.json'), {'the': [[0, 1]]})
+        self.assertEqual(self.read('sh.json'), {'shire': [[2, 1]]})
+        self.assertEqual(self.read('hi.json'), {'hills': [[0, 1]]})
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'search', 'he.json')))
+        self.assertEqual(os.stat(os.path.join(self.dest, 'search', 'ho.json')).st_mtime_ns, mtime)
+        self.assertEqual(sorted(self.read('docs.json')['docs']), ['0', '2'])
+
+    def test_state_kept_outside_the_site(self):
+        # a state file where earlier builds kept it is cleaned up
+        os.makedirs(self.dest)
+        with open(os.path.join(self.dest, '.search.json'), 'w') as f:
+            f.write('{}')
+        self.update()
+        self.assertEqual(os.listdir(self.dest), ['search'])
+        self.assertTrue(os.path.exists(self.state))
+        index = SearchIndex(os.path.join(self.root, 'cache'))
+        self.assertEqual(os.path.dirname(index.state_path(self.dest)), os.path.join(self.root, 'cache'))
+        self.assertNotEqual(index.state_path(self.dest), index.state_path(os.path.join(self.root, 'site')))
+
+    def test_rendered_terms_used(self):
+        rendered = {'index.md': {'title': 'Home', 'terms': {'shire': 3}}}
+        with mock.patch.object(search, 'read_terms', wraps=search.read_terms) as read:
+            self.assertEqual(self.update(rendered=rendered), (2, 4))
+        # only the page that wasn't rendered is read from its source
+        read.assert_called_once_with(os.path.join(self.root, 'content', 'blog/a/index.md'))
+        self.assertEqual(self.read('sh.json'), {'shire': [[0, 3]]})
+
+    def test_remove(self):
+        self.update()
+        remove_search_index(self.dest)
+        self.assertEqual(os.listdir(self.dest), [])
+        # shards are written again when only the state is left behind
+        self.update()
+        remove_search_index(self.dest)
+        os.makedirs(self.dest, exist_ok=True)
+        self.update()
+        self.assertEqual(self.read('th.json'), {'the': [[0, 1], [1, 1]]})
+
+if __name__ == '__main__':
+    unittest.main()
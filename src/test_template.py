@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from template import Template, rewrite_basepath
+
+class TestTemplate(unittest.TestCase):
+    def test_render_slots(self):
+        template = Template("<title>{{ Title }}</title><article>{{ Content }}</article>")
+        self.assertEqual(template.slot_names, ['Title', 'Content'])
+        self.assertEqual(
+            template.render(Title="Hi", Content="<p>Body</p>"),
+            "<title>Hi</title><article><p>Body</p></article>",
+        )
+
+    def test_extra_and_missing_slots(self):
+        template = Template("{{ Title }}|{{Date}}|{{ Description }}")
+        self.assertEqual(template.render(Title="T", Date="2024-01-01"), "T|2024-01-01|")
+
+    def test_repeated_slot(self):
+        template = Template("{{ Title }} - {{ Title }}")
+        self.assertEqual(template.render(Title="A"), "A - A")
+
+    def test_basepath_applied_to_literals(self):
+        template = Template('<link href="/index.css" /><img src="/a.png">{{ Content }}', "/site/")
+        self.assertEqual(
+            template.render(Content='<a href="/x">x</a>'),
+            '<link href="/site/index.css" /><img src="/site/a.png"><a href="/x">x</a>',
+        )
+
+    def test_basepath_applied_to_url_slots(self):
+        template = Template('<link rel="canonical" href="{{ Url }}" />', "/site/")
+        self.assertEqual(template.render(Url="/blog/tom"), '<link rel="canonical" href="/site/blog/tom" />')
+        self.assertEqual(template.render(Url="https://x.y/"), '<link rel="canonical" href="https://x.y/" />')
+
+    def test_stream_iterable_slot(self):
+        template = Template("<article>{{ Content }}</article>{{ Title }}")
+        fragments = template.stream(Title="T", Content=iter(["<p>", "x", "</p>"]))
+        self.assertEqual(list(fragments), ["<article>", "<p>", "x", "</p>", "</article>", "T"])
+        self.assertEqual(template.render(Title="T", Content=["<p>", "</p>"]), "<article><p></p></article>T")
+
+    def test_no_slots(self):
+        self.assertEqual(Template("plain").render(Title="x"), "plain")
+
+    def test_rewrite_basepath(self):
+        html = '<a href="/a">a</a><img src="/b.png" alt="">'
+        self.assertEqual(rewrite_basepath(html, "/"), html)
+        self.assertEqual(
+            rewrite_basepath(html, "/p/"),
+            '<a href="/p/a">a</a><img src="/p/b.png" alt="">',
+        )
+
+    def test_partials(self):
+        with tempfile.TemporaryDirectory() as root:
+            files = {'page.html': '<nav>{{> partials/nav.html }}</nav>{{ Content }}',
+                     'partials/nav.html': '<a href="/">{{> link.html}}</a>',
+                     'partials/link.html': 'Home'}
+            for name, text in files.items():
+                os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+                with open(os.path.join(root, name), 'w') as f:
+                    f.write(text)
+            template = Template.from_file(os.path.join(root, 'page.html'), '/p/')
+            self.assertEqual(template.render(Content='x'), '<nav><a href="/p/">Home</a></nav>x')
+            self.assertEqual(template.dependencies,
+                             [os.path.join(root, name) for name in ('page.html', 'partials/nav.html',
+                                                                   'partials/link.html')])
+            with open(os.path.join(root, 'partials/link.html'), 'w') as f:
+                f.write('{{> nav.html }}')
+            with self.assertRaises(ValueError):
+                Template.from_file(os.path.join(root, 'page.html'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -33,6 +33,12 @@ class TestTextNode(unittest.TestCase):
         self.assertEqual(html_node.tag, None)
         self.assertEqual(html_node.value, "This is a text node")
         
+    def test_text_props_and_children_are_mutable(self):
+        html_node = text_node_to_html_node(TextNode("plain", TextType.TEXT))
+        html_node.props["class"] = "note"
+        html_node.children.append("x")
+        self.assertEqual(text_node_to_html_node(TextNode("plain", TextType.TEXT)).props, {})
+
     def test_bold(self):
         node = TextNode("This is bold text", TextType.BOLD)
         html_node = text_node_to_html_node(node)
@@ -0,0 +1,87 @@
+import json
+import os
+import struct
+import threading
+import time
+import unittest
+import urllib.request
+from unittest import mock
+from testutil import TempDirTestCase
+from watch import InotifyWatcher, LiveReload, PollingWatcher, diff_snapshots, make_watcher, serve, snapshot
+
+class TestWatch(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write('content/index.md', '# Home')
+        self.write('template.html', '{{ Content }}')
+
+    def paths(self):
+        return [os.path.join(self.root, 'content'), os.path.join(self.root, 'template.html')]
+
+    def test_diff_snapshots(self):
+        before = snapshot(self.paths())
+        self.assertEqual(len(before), 2)
+        added = self.write('content/blog/new.md', '# New')
+        os.remove(os.path.join(self.root, 'template.html'))
+        self.assertEqual(diff_snapshots(before, snapshot(self.paths())),
+                         {added, os.path.join(self.root, 'template.html')})
+
+    def test_polling_watcher(self):
+        watcher = PollingWatcher(self.paths(), interval=0.01)
+        self.assertEqual(watcher.wait(timeout=0.05), set())
+        path = self.write('content/index.md', '# Home, edited')
+        self.assertEqual(watcher.wait(timeout=1), {path})
+
+    def test_default_watcher_sees_new_directories(self):
+        watcher = make_watcher(self.paths(), interval=0.01)
+        try:
+            os.makedirs(os.path.join(self.root, 'content', 'blog'))
+            watcher.wait(timeout=1)
+            time.sleep(0.05)
+            path = self.write('content/blog/post.md', '# Post')
+            changed = set()
+            deadline = time.monotonic() + 2
+            while path not in changed and time.monotonic() < deadline:
+                changed |= watcher.wait(timeout=0.2)
+            self.assertIn(path, changed)
+        finally:
+            watcher.close()
+
+    def test_inotify_overflow_rebuilds_everything(self):
+        watcher = make_watcher(self.paths())
+        if not isinstance(watcher, InotifyWatcher):
+            self.skipTest("inotify is not available")
+        try:
+            os.makedirs(os.path.join(self.root, 'content', 'blog'))
+            overflow = struct.pack('iIII', -1, InotifyWatcher.IN_Q_OVERFLOW, 0, 0)
+            with mock.patch('watch.os.read', return_value=overflow):
+                self.assertEqual(watcher._read_events(), set(self.paths()))
+            self.assertIn(os.path.join(self.root, 'content', 'blog'),
+                          [directory for directory, _ in watcher.dirs.values()])
+        finally:
+            watcher.close()
+
+    def test_livereload_wait(self):
+        livereload = LiveReload()
+        self.assertEqual(livereload.wait(0, timeout=0.01), 0)
+        threading.Timer(0.05, livereload.bump).start()
+        self.assertEqual(livereload.wait(0, timeout=2), 1)
+
+    def test_server_injects_reload_script(self):
+        self.write('docs/index.html', '<html><body><p>hi</p></body></html>')
+        livereload = LiveReload()
+        server = serve(os.path.join(self.root, 'docs'), 0, livereload)
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            with urllib.request.urlopen(base + '/') as response:
+                html = response.read().decode()
+            self.assertIn('/__livereload', html)
+            self.assertTrue(html.endswith('</script></body></html>'))
+            with urllib.request.urlopen(base + '/__livereload?v=') as response:
+                self.assertEqual(json.load(response), {'version': 0})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+# Fixtures for the tests that work in a temporary directory.
+
+# a small site: two pages, one linking to the other, a stylesheet and a
+# template that uses it
+SITE_FILES = {
+    'content/index.md': "# Home\n\n[Post](/blog/post)",
+    'content/blog/post/index.md': "# Post\n\nHello",
+    'static/index.css': "body {}",
+    'template.html': '<title>{{ Title }}</title><link href="/index.css">{{ Content }}',
+}
+
+class TempDirTestCase(unittest.TestCase):
+    # each test gets its own directory, self.root, removed after tearDown
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+
+    def path(self, rel_path):
+        # absolute paths are left as they are
+        return os.path.join(self.root, rel_path)
+
+    def write(self, rel_path, data):
+        # text or bytes, creating directories as needed; returns the path
+        path = self.path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(data, bytes):
+            with open(path, 'wb') as f:
+                f.write(data)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(data)
+        return path
+
+    def read(self, rel_path, binary=False):
+        if binary:
+            with open(self.path(rel_path), 'rb') as f:
+                return f.read()
+        with open(self.path(rel_path), 'r', encoding='utf-8') as f:
+            return f.read()
+
+class SiteTestCase(TempDirTestCase):
+    # SITE_FILES written under self.root
+    def setUp(self):
+        super().setUp()
+        for rel_path, text in SITE_FILES.items():
+            self.write(rel_path, text)
@@ -0,0 +1,269 @@
+import ctypes
+import ctypes.util
+import functools
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+LIVERELOAD_PATH = '/__livereload'
+LIVERELOAD_SCRIPT = b"""<script>
+(function () {
+  var version = null;
+  function poll() {
+    fetch('/__livereload?v=' + (version === null ? '' : version))
+      .then(function (r) { return r.json(); })
+      .then(function (data) {
+        if (version !== null && data.version !== version) { location.reload(); return; }
+        version = data.version;
+        poll();
+      })
+      .catch(function () { setTimeout(poll, 1000); });
+  }
+  poll();
+})();
+</script>"""
+
+# settle time after the first change so an editor's save (often several
+# writes and a rename) turns into one rebuild
+DEBOUNCE_SECONDS = 0.02
+
+def snapshot(paths):
+    # (mtime_ns, size) of every file under each path; used by the polling
+    # watcher and to tell real changes from no-op events
+    state = {}
+    stack = list(paths)
+    while stack:
+        path = stack.pop()
+        try:
+            if os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            stat = entry.stat()
+                            state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            else:
+                stat = os.stat(path)
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            continue
+    return state
+
+def diff_snapshots(old, new):
+    changed = {path for path, state in new.items() if old.get(path) != state}
+    changed.update(path for path in old if path not in new)
+    return changed
+
+class PollingWatcher:
+    def __init__(self, paths, interval=0.05):
+        self.paths = paths
+        self.interval = interval
+        self.state = snapshot(paths)
+
+    def wait(self, timeout=None):
+        # blocks until something changes; returns the changed paths
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(self.interval)
+            state = snapshot(self.paths)
+            changed = diff_snapshots(self.state, state)
+            self.state = state
+            if changed:
+                return changed
+        return set()
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    # Linux inotify through ctypes, so a large tree costs nothing between
+    # edits instead of a full stat walk per poll
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM
+            | IN_MOVED_TO | IN_CREATE | IN_DELETE)
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError("inotify is not available")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # wd -> (directory, whole_tree); plain files are watched through
+        # their directory, which also sees editors that save by renaming a
+        # new file over the old one
+        self.dirs = {}
+        self.files = set()
+        self.paths = paths
+        for path in paths:
+            if os.path.isdir(path):
+                self._add_tree(path)
+            else:
+                self.files.add(os.path.normpath(path))
+                self._add_dir(os.path.dirname(path) or '.', False)
+
+    def _add_dir(self, path, whole_tree):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        if not self.dirs.get(wd, (None, False))[1]:
+            self.dirs[wd] = (path, whole_tree)
+
+    def _add_tree(self, root):
+        for dirpath, _, _ in os.walk(root):
+            self._add_dir(dirpath, True)
+
+    def _read_events(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                # events were dropped, so anything may have changed,
+                # including new directories that aren't watched yet
+                for path in self.paths:
+                    if os.path.isdir(path):
+                        self._add_tree(path)
+                changed.update(self.paths)
+                continue
+            if wd not in self.dirs:
+                continue
+            directory, whole_tree = self.dirs[wd]
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if not whole_tree:
+                if os.path.normpath(path) in self.files:
+                    changed.add(path)
+                continue
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                self._add_tree(path)
+            changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = self._read_events()
+        time.sleep(DEBOUNCE_SECONDS)
+        changed |= self._read_events()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def make_watcher(paths, interval=0.05):
+    try:
+        return InotifyWatcher(paths)
+    except (OSError, AttributeError):
+        return PollingWatcher(paths, interval)
+
+class LiveReload:
+    # a build counter that browsers long-poll; bumping it wakes every waiter
+    def __init__(self):
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def bump(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version, timeout=30):
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    livereload = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == LIVERELOAD_PATH:
+            return self.send_livereload(parse_qs(url.query).get('v', [''])[0])
+        path = self.translate_path(url.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, 'index.html')
+        if path.endswith('.html') and os.path.isfile(path) and url.path.endswith(('/', '.html')):
+            return self.send_html(path)
+        return super().do_GET()
+
+    def send_livereload(self, version):
+        if version.isdigit():
+            current = self.livereload.wait(int(version))
+        else:
+            current = self.livereload.version
+        body = json.dumps({'version': current}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_html(self, path):
+        with open(path, 'rb') as f:
+            body = f.read()
+        index = body.rfind(b'</body>')
+        if index == -1:
+            body += LIVERELOAD_SCRIPT
+        else:
+            body = body[:index] + LIVERELOAD_SCRIPT + body[index:]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.path.startswith(LIVERELOAD_PATH):
+            super().log_message(format, *args)
+
+def serve(directory, port, livereload, host='127.0.0.1'):
+    handler = functools.partial(type('Handler', (DevRequestHandler,), {'livereload': livereload}),
+                                directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def watch(rebuild, paths, livereload, interval=0.05):
+    watcher = make_watcher(paths, interval)
+    print(f"Watching {', '.join(paths)} with {type(watcher).__name__}")
+    try:
+        while True:
+            changed = watcher.wait()
+            if not changed:
+                continue
+            start = time.perf_counter()
+            built = rebuild(changed)
+            if built:
+                livereload.bump()
+            print(f"{'Rebuilt' if built else 'Rebuild failed'} in {(time.perf_counter() - start) * 1000:.1f} ms "
+                  f"({len(changed)} changed path(s))")
+    finally:
+        watcher.close()